@@ -1,14 +1,242 @@
 import warnings
 import os
+import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tools.sm_exceptions import ConvergenceWarning
+from Session import load_table
+from TableStore import series_digest
+from Trace import traced
 
 # Suppress warnings from ARIMA model for a cleaner output
-warnings.simplefilter('ignore', ConvergenceWarning)
 warnings.simplefilter('ignore', UserWarning)
 
-def arima_model(table_path, filename, column_name, order=(1, 1, 0)):
+# statsmodels class, imported on first use (see _arima_class)
+_ARIMA_CLASS = None
+
+# Defaults for persisted models: full refit after this many appended days, or when a new
+# observation's standardized one-step forecast error exceeds the drift threshold
+REFIT_EVERY = 30
+DRIFT_THRESHOLD = 4.0
+
+# Candidate (p, d, q) orders for the order search, and the growth of a series (as a fraction of
+# the length it was searched on) after which the cached choice is searched again
+ORDER_GRID = [(p, d, q) for d in (0, 1) for p in range(3) for q in range(3)]
+RESEARCH_GROWTH = 0.1
+# Order used when the configuration has no [ARIMA] section; significance level of the KPSS test
+DEFAULT_ORDER = (1, 1, 0)
+KPSS_ALPHA = 0.05
+
+def _arima_class():
+    """
+    Return the statsmodels ARIMA class, importing statsmodels on the first fit only.
+
+    statsmodels takes about a second to import, which every run paid even when it used
+    another prediction method.
+    """
+    global _ARIMA_CLASS
+    if _ARIMA_CLASS is None:
+        from statsmodels.tsa.arima.model import ARIMA
+        from statsmodels.tools.sm_exceptions import ConvergenceWarning
+        # statsmodels installs its own filters on import; ours must stay in front of them
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        _ARIMA_CLASS = ARIMA
+    return _ARIMA_CLASS
+
+def __getattr__(name):
+    # Keeps 'from ARIMA import ARIMA' working without importing statsmodels with the module
+    if name == 'ARIMA':
+        return _arima_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def arima_order(config, default=DEFAULT_ORDER):
+    """
+    Read the ARIMA order from the optional [ARIMA] section of the config ('order = auto' or 'order = 1, 1, 0').
+    """
+    order = config.get('ARIMA', {}).get('order')
+    if not order:
+        return default
+    if order.strip().lower() == 'auto':
+        return 'auto'
+    try:
+        p, d, q = (int(v) for v in order.split(','))
+    except ValueError:
+        raise ValueError(f"Invalid ARIMA order '{order}'; use 'auto' or 'p, d, q'.") from None
+    return (p, d, q)
+
+def differencing_order(time_series, alpha=KPSS_ALPHA):
+    """
+    Choose d for a series: 0 if a KPSS test does not reject level stationarity at alpha, else 1.
+    """
+    from statsmodels.tsa.stattools import kpss
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # p-values outside the table range are clipped, which is fine here
+        p_value = kpss(np.asarray(time_series, dtype=np.float64), regression='c', nlags='auto')[1]
+    return 0 if p_value > alpha else 1
+
+def _state_file(state_path, filename):
+    return os.path.join(state_path, f"{os.path.splitext(filename)[0]}_arima.pkl")
+
+def _load_state(state_file):
+    try:
+        with open(state_file, 'rb') as f:
+            return pickle.load(f)
+    # A state pickled under other statsmodels or pandas versions may not unpickle here
+    except (OSError, pickle.UnpicklingError, EOFError, ImportError, AttributeError, TypeError):
+        return None
+
+def _save_state(state_file, state):
+    try:
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        tmp_file = f"{state_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_file, state_file)
+    except OSError as e:
+        print(f"Could not save the ARIMA state: {e}")
+
+@traced
+def score_order(time_series, order, criterion='aic', holdout=14):
+    """
+    Fit one candidate order and score it; lower is better.
+
+    Parameters:
+        time_series (np.array): The time series.
+        order (tuple): Candidate (p, d, q).
+        criterion (str): 'aic', 'bic' or 'holdout' (mean absolute error of a forecast over the last holdout days).
+        holdout (int): Number of trailing observations held out for the 'holdout' criterion.
+
+    Returns:
+        dict: order, score, whether the optimizer converged, and the fitted parameters.
+    """
+    try:
+        if criterion == 'holdout':
+            results = _arima_class()(time_series[:-holdout], order=order).fit()
+            score = float(np.mean(np.abs(results.forecast(holdout) - time_series[-holdout:])))
+        else:
+            results = _arima_class()(time_series, order=order).fit()
+            score = float(getattr(results, criterion))
+        converged = bool(results.mle_retvals.get('converged', True)) if results.mle_retvals else True
+        params = [float(v) for v in results.params]
+    except (ValueError, np.linalg.LinAlgError):
+        score, converged, params = np.inf, False, []
+    return {'order': list(order), 'score': score if np.isfinite(score) else None, 'converged': converged, 'params': params}
+
+@traced
+def select_arima_order(time_series, orders=ORDER_GRID, criterion='aic', holdout=14, max_workers=None):
+    """
+    Evaluate a grid of ARIMA orders in parallel and rank them by criterion.
+
+    AIC and BIC of different d are likelihoods of differently differenced data and cannot be
+    compared, so for those criteria d is fixed per series by differencing_order and only the
+    candidates with that d are ranked; the holdout error compares the whole grid. Converged fits
+    rank ahead of fits whose optimizer did not converge, so a ConvergenceWarning no longer hides
+    a poor candidate.
+
+    Returns:
+        list: Candidate dictionaries from score_order, best first.
+    """
+    time_series = np.asarray(time_series, dtype=np.float64)
+    if criterion != 'holdout':
+        d = differencing_order(time_series)
+        orders = [order for order in orders if order[1] == d] or orders
+    args = [(time_series, tuple(order), criterion, holdout) for order in orders]
+    if max_workers == 1:
+        candidates = [score_order(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            candidates = list(executor.map(score_order, *zip(*args)))
+    return sorted(candidates, key=lambda c: (c['score'] is None, not c['converged'], c['score'] if c['score'] is not None else 0.0))
+
+@traced
+def cached_arima_order(time_series, cache_file, orders=ORDER_GRID, criterion='aic', holdout=14, max_workers=None,
+                       research_growth=RESEARCH_GROWTH):
+    """
+    Return the selected order of a series, searching again only when the series changed materially.
+
+    The cache records the chosen order and parameters, the searched length and a hash of the searched
+    history. A new search runs when the history changed, the criterion or grid changed, or the series
+    grew by more than research_growth of the searched length. The parameters serve as start values
+    when the chosen order is fitted to the longer series.
+
+    Returns:
+        tuple: (order, parameters of the chosen fit).
+    """
+    time_series = np.asarray(time_series, dtype=np.float64)
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            cached = json.load(f)
+        n_obs = cached['n_obs']
+        if (cached['criterion'] == criterion and cached['grid'] == [list(o) for o in orders]
+                and n_obs <= len(time_series) <= n_obs * (1 + research_growth)
+                and cached['digest'] == series_digest(time_series[:n_obs])):
+            return tuple(cached['order']), cached['params']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    best = select_arima_order(time_series, orders, criterion, holdout, max_workers)[0]
+    cached = {'order': best['order'], 'params': best['params'], 'criterion': criterion, 'score': best['score'],
+              'grid': [list(o) for o in orders], 'n_obs': len(time_series), 'digest': series_digest(time_series)}
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cached, f)
+    except OSError as e:
+        print(f"Could not save the ARIMA order cache: {e}")
+    return tuple(best['order']), best['params']
+
+@traced
+def update_arima(time_series, order, state=None, refit_every=REFIT_EVERY, drift_threshold=DRIFT_THRESHOLD, start_params=None):
+    """
+    Bring a fitted ARIMA model up to date with a time series, refitting only when needed.
+
+    New observations are appended through the state-space filter with the existing parameters
+    (no re-estimation). A full maximum-likelihood fit runs when there is no usable state (different
+    order, shorter series or changed history), after refit_every appended observations, or when a
+    new observation's standardized one-step forecast error exceeds drift_threshold.
+
+    Parameters:
+        time_series (np.array): The full time series.
+        order (tuple): The order of the ARIMA model (p, d, q).
+        state (dict, optional): State returned by a previous call.
+        refit_every (int, optional): Appended observations before a scheduled refit; None disables it.
+        drift_threshold (float, optional): Standardized error that triggers a refit; None disables it.
+        start_params (list, optional): Start values for a full fit.
+
+    Returns:
+        tuple: (fitted results, new state dict, whether a full fit was run).
+    """
+    time_series = np.asarray(time_series, dtype=np.float64)
+    usable = (state is not None and tuple(state['order']) == tuple(order)
+              and len(time_series) >= state['n_obs']
+              and state['digest'] == series_digest(time_series[:state['n_obs']]))
+
+    if usable:
+        results = state['results']
+        appended = state['appended']
+        new_obs = time_series[state['n_obs']:]
+        if len(new_obs):
+            results = results.append(new_obs, refit=False)
+            appended += len(new_obs)
+            errors = results.filter_results.standardized_forecasts_error[0, -len(new_obs):]
+            drifted = drift_threshold is not None and np.nanmax(np.abs(errors)) > drift_threshold
+            scheduled = refit_every is not None and appended >= refit_every
+            usable = not (drifted or scheduled)
+
+    refitted = not usable
+    if refitted:
+        results = _arima_class()(time_series, order=order).fit(start_params=start_params)
+        appended = 0
+
+    state = {'order': tuple(order), 'n_obs': len(time_series), 'digest': series_digest(time_series),
+             'appended': appended, 'results': results}
+    return results, state, refitted
+
+@traced
+def arima_model(table_path, filename, column_name, order=(1, 1, 0), session=None, state_path=None,
+                refit_every=REFIT_EVERY, drift_threshold=DRIFT_THRESHOLD):
     """
     Forecast the next value in a time series using the ARIMA model.
     
@@ -16,7 +244,13 @@ def arima_model(table_path, filename, column_name, order=(1, 1, 0)):
         table_path (str): The path to the directory containing the CSV file.
         filename (str): The name of the CSV file.
         column_name (str): The name of the column containing the time series data.
-        order (tuple): The order of the ARIMA model (p, d, q).
+        order (tuple or str): The order of the ARIMA model (p, d, q), or 'auto' to select it per series
+            from ORDER_GRID by AIC with a cached, parallel order search (see arima_order for the config setting).
+        session (TableSession, optional): Run session that shares loaded tables.
+        state_path (str, optional): Directory where the fitted model of each series is persisted.
+            Without it the model is fitted from scratch on every call.
+        refit_every (int, optional): With state_path, appended observations before a full refit.
+        drift_threshold (float, optional): With state_path, standardized forecast error that forces a refit.
         
     Returns:
         float: The forecasted next value of the time series.
@@ -26,7 +260,7 @@ def arima_model(table_path, filename, column_name, order=(1, 1, 0)):
     
     # Read the specified column from the CSV file
     try:
-        data_frame = pd.read_csv(full_path)
+        data_frame = load_table(full_path, session)
         time_series = data_frame[column_name].values
     except FileNotFoundError:
         print("The file was not found.")
@@ -38,10 +272,23 @@ def arima_model(table_path, filename, column_name, order=(1, 1, 0)):
         print(f"The column '{column_name}' does not exist in the data.")
         return None
 
-    # Fit the ARIMA model
+    # Select the order per series; the choice is cached next to the persisted model state, and its
+    # parameters start the fit
+    start_params = None
+    if order == 'auto':
+        cache_dir = state_path if state_path is not None else os.path.join(table_path, 'MODEL')
+        order, start_params = cached_arima_order(time_series, os.path.join(cache_dir, f"{os.path.splitext(filename)[0]}_order.json"))
+        start_params = start_params or None
+
+    # Fit the ARIMA model, or extend the persisted one with the new observations
     try:
-        model = ARIMA(time_series, order=order)
-        model_fit = model.fit()
+        if state_path is None:
+            model = _arima_class()(time_series, order=order)
+            model_fit = model.fit(start_params=start_params)
+        else:
+            state_file = _state_file(state_path, filename)
+            model_fit, state, _ = update_arima(time_series, order, _load_state(state_file), refit_every, drift_threshold, start_params)
+            _save_state(state_file, state)
     except ValueError as e:
         print(f"Model fitting failed: {e}")
         return None
@@ -0,0 +1,184 @@
+import os
+import numpy as np
+from TableStore import file_signature, read_table
+from FindNearest import k_nearest
+from Trace import traced
+
+# Partition key columns and setpoint columns of the TRNSYS ED table
+PARTITION_COLUMNS = ('Tem', 'RH', 'SCH')
+SETPOINT_COLUMNS = ('mSPT', 'mSPH', 'oSPhT', 'oSPcT')
+# Number of candidate settings returned below the required demand
+ADVICE_K = 3
+
+# Compiled advice indexes keyed by table file, invalidated when the file changes on disk
+_ADVICE_INDEXES = {}
+
+@traced
+def build_advice_index(df):
+    """
+    Compile an energy demand table into partitions sorted by energy demand.
+
+    Rows are grouped by (Tem, RH, schedule) and sorted by Ed inside each group, so a query
+    only touches the rows of one weather condition and finds demand ranges by binary search.
+
+    Parameters:
+        df (pd.DataFrame): The energy demand table.
+
+    Returns:
+        dict: columns, the sorted table values as a float matrix, and (start, stop) row bounds per partition key.
+    """
+    values = df.to_numpy(dtype=np.float64)
+    columns = [str(col) for col in df.columns]
+    keys = df[list(PARTITION_COLUMNS)].to_numpy(dtype=np.int64)
+    ed = values[:, columns.index('Ed')]
+
+    order = np.lexsort((ed, keys[:, 2], keys[:, 1], keys[:, 0]))
+    keys, values = keys[order], values[order]
+
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    stops = np.r_[starts[1:], len(keys)]
+    partitions = {tuple(int(k) for k in keys[start]): (int(start), int(stop)) for start, stop in zip(starts, stops)}
+    return {'columns': columns, 'values': values, 'partitions': partitions}
+
+@traced
+def load_advice_index(table_path, ed_table_fname, session=None):
+    """
+    Return the advice index of an energy demand table, compiling it once per file version.
+    With a session the index is shared with every other query in the same run.
+    """
+    full_path = f"{table_path}{ed_table_fname}"
+    if session is not None:
+        return session.get(('advice_index', os.path.abspath(full_path)), lambda: build_advice_index(session.table(full_path)))
+
+    signature = file_signature(full_path)
+
+    cached = _ADVICE_INDEXES.get(full_path)
+    if cached is None or cached[0] != signature:
+        cached = (signature, build_advice_index(read_table(full_path)))
+        _ADVICE_INDEXES[full_path] = cached
+    return cached[1]
+
+def partition_rows(index, tem_index, hum_index, sch=None):
+    """
+    Return the rows of one weather condition sorted by Ed.
+
+    Parameters:
+        index (dict): Index from build_advice_index.
+        tem_index (int): Temperature index.
+        hum_index (int): Humidity index.
+        sch (int, optional): Schedule index; all schedules are merged when omitted.
+
+    Returns:
+        np.array: Table rows of the partition, sorted by Ed.
+    """
+    if sch is not None:
+        bounds = [index['partitions'].get((int(tem_index), int(hum_index), int(sch)))]
+    else:
+        bounds = [b for key, b in index['partitions'].items() if key[:2] == (int(tem_index), int(hum_index))]
+    bounds = [b for b in bounds if b is not None]
+
+    values = index['values']
+    if len(bounds) == 1:
+        return values[bounds[0][0]:bounds[0][1]]
+    rows = np.concatenate([values[start:stop] for start, stop in bounds]) if bounds else values[:0]
+    return rows[np.argsort(rows[:, index['columns'].index('Ed')], kind='stable')]
+
+def setpoint_mask(index, rows, indices):
+    """
+    Mark the rows whose setpoints are more economical than the current ones: higher machinery
+    temperature, humidity and office heating setpoints, and a lower office cooling setpoint.
+    """
+    columns = index['columns']
+    m_t, m_h, o_ht, o_ct = (rows[:, columns.index(col)] for col in SETPOINT_COLUMNS)
+    return (m_t > indices['a']) & (m_h > indices['b']) & (o_ht > indices['c']) & (o_ct < indices['d'])
+
+def comfort_deviation(index, rows, indices):
+    """
+    Distance of each row's setpoints from the current ones: the number of setpoint steps summed
+    over SETPOINT_COLUMNS.
+    """
+    columns = index['columns']
+    current = np.array([indices[key] for key in ('a', 'b', 'c', 'd')], dtype=np.float64)
+    return np.abs(rows[:, [columns.index(col) for col in SETPOINT_COLUMNS]] - current).sum(axis=1)
+
+def pareto_mask(energy, deviation):
+    """
+    Mark the points no other point dominates, i.e. no other point has lower or equal energy and
+    deviation and is lower in one of them.
+    """
+    energy = np.asarray(energy, dtype=np.float64)
+    deviation = np.asarray(deviation, dtype=np.float64)
+    no_worse = (energy[None, :] <= energy[:, None]) & (deviation[None, :] <= deviation[:, None])
+    better = (energy[None, :] < energy[:, None]) | (deviation[None, :] < deviation[:, None])
+    return ~(no_worse & better).any(axis=1)
+
+def demand_range(index, rows, low=-np.inf, high=np.inf):
+    """
+    Return the rows of a sorted partition with low <= Ed <= high.
+    """
+    ed = rows[:, index['columns'].index('Ed')]
+    return rows[np.searchsorted(ed, low, side='left'):np.searchsorted(ed, high, side='right')]
+
+def nearest_demand(index, rows, targets, k=ADVICE_K):
+    """
+    Return the k rows of a sorted partition closest in Ed to each of many target demands.
+
+    Returns:
+        tuple: (rows of shape (m, k, n_columns), distances of shape (m, k)); missing neighbours are NaN rows.
+    """
+    positions, distances = k_nearest(rows[:, index['columns'].index('Ed')], targets, k)
+    nearest = np.full(positions.shape + (rows.shape[1],), np.nan)
+    found = positions >= 0
+    nearest[found] = rows[positions[found]]
+    return nearest, distances
+
+def nearest_below(index, rows, req_ed, k=ADVICE_K):
+    """
+    Return the k rows of a sorted partition with the highest Ed not exceeding req_ed,
+    i.e. the settings that meet the demand target with the least change.
+    """
+    candidates = demand_range(index, rows, high=req_ed)
+    return candidates[max(0, len(candidates) - k):]
+
+def advice_candidates(index, indices, tem_index, hum_index, req_ed, sch=None, k=ADVICE_K):
+    """
+    Find the candidate settings for a required energy demand.
+
+    Parameters:
+        index (dict): Index from build_advice_index.
+        indices (dict): Current setpoint indices from get_setpoints_indices.
+        tem_index (int): Temperature index of the similar weather day.
+        hum_index (int): Humidity index of the similar weather day.
+        req_ed (float): Required energy demand.
+        sch (int, optional): Schedule index; all schedules are searched when omitted.
+        k (int): Number of candidates to return.
+
+    Returns:
+        np.array: Candidate table rows, sorted by Ed.
+    """
+    rows = partition_rows(index, tem_index, hum_index, sch)
+    rows = rows[setpoint_mask(index, rows, indices)]
+    return nearest_below(index, rows, req_ed, k)
+
+def sweep_candidates(index, indices, tem_index, hum_index, req_eds, sch=None, k=1):
+    """
+    advice_candidates for many required demands at once: the partition is selected and masked
+    once, and every demand is located in it with a single np.searchsorted call.
+
+    Returns:
+        tuple: (position of the demand each row answers, candidate table rows), ordered by demand
+               and then by decreasing Ed; demands with no candidate are left out.
+    """
+    rows = partition_rows(index, tem_index, hum_index, sch)
+    rows = rows[setpoint_mask(index, rows, indices)]
+    req_eds = np.atleast_1d(np.asarray(req_eds, dtype=np.float64))
+
+    stops = np.searchsorted(rows[:, index['columns'].index('Ed')], req_eds, side='right')
+    positions = stops[:, None] - np.arange(1, k + 1)
+    found = positions >= 0
+    demand = np.broadcast_to(np.arange(len(req_eds))[:, None], positions.shape)[found]
+    return demand, rows[positions[found]]
+
+# Example usage:
+# index = load_advice_index('path/to/table/', 'ED_TABLE.csv')
+# rows = advice_candidates(index, {'a': 2, 'b': 2, 'c': 3, 'd': 3}, 1, 2, 30000.0, sch=1)
@@ -1,6 +1,122 @@
-import pandas as pd
+import os
+import numpy as np
+from TableStore import file_signature, read_table
+from Trace import traced
 
-def access_table(table_path, ed_table_fname, tem_index, hum_index, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool):
+# Setpoint grids of the TRNSYS ED table; a setpoint is stored as its 1-based position in the grid
+SET_M_T = np.arange(15, 26)  # Machinery room temperatures
+SET_M_H = np.arange(20, 70, 10)  # Machinery room humidity levels
+SET_O_HT = np.arange(18, 23)  # Office heating temperatures
+SET_O_CT = np.arange(24, 29)  # Office cooling temperatures
+
+# Compiled lookup cubes keyed by table file, invalidated when the file changes on disk
+_ED_CUBES = {}
+
+def setpoint_to_index(grid, setpoint):
+    """
+    Map setpoint values to their 1-based positions in a setpoint grid.
+
+    Parameters:
+        grid (np.array): Sorted setpoint grid.
+        setpoint (int or array-like): Setpoint value(s) to convert.
+
+    Returns:
+        np.array: 1-based grid positions with the same shape as setpoint.
+    """
+    values = np.asarray(setpoint).astype(float).astype(int)
+    pos = np.searchsorted(grid, values)
+    valid = (pos < len(grid)) & (grid[np.minimum(pos, len(grid) - 1)] == values)
+    if not np.all(valid):
+        raise ValueError(f"Setpoint {np.asarray(setpoint)[~valid].tolist()} is not in the grid {grid.tolist()}.")
+    return pos + 1
+
+@traced
+def build_ed_cube(df):
+    """
+    Compile an energy demand table into a dense N-dimensional lookup cube.
+
+    The first seven columns (Tem, RH, schedule, mSPT, mSPH, oSPhT, oSPcT) are 1-based grid
+    indices and become the cube axes; the eighth column holds the energy demand.
+    Combinations missing from the table are stored as NaN. When a combination appears more
+    than once the first row wins, matching the original row-by-row scan.
+
+    Parameters:
+        df (pd.DataFrame): The energy demand table.
+
+    Returns:
+        np.array: Cube of shape (n_tem, n_rh, n_sch, n_mspt, n_msph, n_osph, n_ospc).
+    """
+    keys = df.iloc[:, :7].to_numpy(dtype=np.int64) - 1
+    values = df.iloc[:, 7].to_numpy(dtype=np.float64)
+    if (keys < 0).any():
+        raise ValueError("Index columns of the ED table must be positive integers.")
+
+    shape = tuple(int(n) for n in keys.max(axis=0) + 1)
+    flat_keys = np.ravel_multi_index(keys.T, shape)
+    _, first = np.unique(flat_keys, return_index=True)
+
+    cube = np.full(shape, np.nan)
+    cube.flat[flat_keys[first]] = values[first]
+    return cube
+
+@traced
+def load_ed_cube(table_path, ed_table_fname, session=None):
+    """
+    Return the lookup cube for an energy demand table, compiling it once per file version.
+    With a session the cube is shared with every other lookup in the same run.
+    """
+    full_path = f"{table_path}{ed_table_fname}"
+    if session is not None:
+        return session.get(('ed_cube', os.path.abspath(full_path)), lambda: build_ed_cube(session.table(full_path)))
+
+    signature = file_signature(full_path)
+
+    cached = _ED_CUBES.get(full_path)
+    if cached is None or cached[0] != signature:
+        cached = (signature, build_ed_cube(read_table(full_path, downcast=True)))
+        _ED_CUBES[full_path] = cached
+    return cached[1]
+
+def lookup_ed(cube, keys):
+    """
+    Look up energy demands for a batch of 1-based table index tuples.
+
+    Parameters:
+        cube (np.array): Lookup cube from build_ed_cube.
+        keys (array-like): Array of shape (m, 7) with (Tem, RH, schedule, mSPT, mSPH, oSPhT, oSPcT) indices.
+
+    Returns:
+        np.array: Energy demand for each key.
+    """
+    keys = np.atleast_2d(np.asarray(keys, dtype=np.int64)) - 1
+    in_range = np.all((keys >= 0) & (keys < np.array(cube.shape)), axis=1)
+    values = np.full(len(keys), np.nan)
+    values[in_range] = cube[tuple(keys[in_range].T)]
+    if np.isnan(values).any():
+        raise ValueError("No matching settings found in the table.")
+    return values
+
+@traced
+def access_table_batch(table_path, ed_table_fname, tem_index, hum_index, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=None):
+    """
+    Vectorized access_table: arguments may be scalars or arrays and are broadcast against each other.
+
+    Returns:
+        np.array: Predicted energy demand for every broadcast combination of settings.
+    """
+    columns = np.broadcast_arrays(
+        np.asarray(tem_index), np.asarray(hum_index), np.asarray(sch),
+        setpoint_to_index(SET_M_T, set_tem_mach),
+        setpoint_to_index(SET_M_H, set_hum_mach),
+        setpoint_to_index(SET_O_HT, set_tem_oheat),
+        setpoint_to_index(SET_O_CT, set_tem_ocool)
+    )
+    keys = np.stack([np.ravel(c) for c in columns], axis=1)
+    cube = load_ed_cube(table_path, ed_table_fname, session)
+    return lookup_ed(cube, keys).reshape(columns[0].shape)
+
+@traced
+def access_table(table_path, ed_table_fname, tem_index, hum_index, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=None):
     """
     Access a data table and extract predicted energy demand based on set conditions.
 
@@ -14,38 +130,13 @@ def access_table(table_path, ed_table_fname, tem_index, hum_index, sch, set_tem_
         set_hum_mach (int): Set humidity for machinery.
         set_tem_oheat (int): Set heating temperature for office.
         set_tem_ocool (int): Set cooling temperature for office.
+        session (TableSession, optional): Run session that shares the loaded table.
 
     Returns:
         float: Predicted energy demand for the given settings.
     """
-    # Mapping setpoints to their index positions
-    set_m_t = list(range(15, 26))  # Machinery room temperatures
-    set_m_h = list(range(20, 70, 10))  # Machinery room humidity levels
-    set_o_ht = list(range(18, 23))  # Office heating temperatures
-    set_o_ct = list(range(24, 29))  # Office cooling temperatures
-
-    # Convert set points to indices used in the table
-    settings_indices = [
-        set_m_t.index(int(set_tem_mach)) + 1,
-        set_m_h.index(int(set_hum_mach)) + 1,
-        set_o_ht.index(int(set_tem_oheat)) + 1,
-        set_o_ct.index(int(set_tem_ocool)) + 1
-    ]
-
-    # Create a list of input settings to match against the table
-    input_settings = [tem_index, hum_index, sch] + settings_indices
-
-    # Load the table from the CSV file
-    df = pd.read_csv(f"{table_path}{ed_table_fname}")
-    df_array = df.to_numpy()
-
-    # Find matching row based on the input settings
-    for row in df_array:
-        if input_settings == row[:7].tolist():
-            return row[7]  # Return the predicted energy demand
-
-    # If no matching row is found, raise an error or return a default value
-    raise ValueError("No matching settings found in the table.")
+    return access_table_batch(table_path, ed_table_fname, tem_index, hum_index, sch,
+                              set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session)[()]
 
 # Example usage:
 # pred_ed = access_table('path/to/table/', 'energy_demand.csv', 1, 2, 1, 20, 40, 21, 24)
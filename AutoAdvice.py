@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 from AutoPredict import regression_analysis
-from FindNearest import find_nearest
+from AdviceIndex import load_advice_index, advice_candidates, sweep_candidates, comfort_deviation, pareto_mask
 from SimilarWD import similar_weather_days
+from Trace import traced
 
 def get_setpoints_indices(set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool):
     Set_M_T = list(range(15, 26))  # Machinery room temperatures
@@ -16,39 +18,24 @@ def get_setpoints_indices(set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_oco
         'd': Set_O_CT.index(int(set_tem_ocool)) + 1
     }
 
-def filter_ed_table(df, indices, tem_index, hum_index):
-    return df[(df['Tem'] == tem_index) & (df['RH'] == hum_index) & (df['mSPT'] > indices['a']) & 
-              (df['mSPH'] > indices['b']) & (df['oSPhT'] > indices['c']) & (df['oSPcT'] < indices['d'])]
-
-def get_nearest_indices(ed_rev, req_ed):
-    idx = find_nearest(ed_rev, req_ed)
-    all_indices = idx.to_list() + (idx - 3).to_list() + (idx + 3).to_list()
-    return sorted(set(all_indices))
-
-def get_advice_list(df, indices, req_ed):
-    list_df = df.loc[indices]
-    filtered_list = list_df[list_df['Ed'] <= req_ed].to_numpy()
-    return pd.DataFrame(filtered_list, columns=df.columns)
-
-def update_target_ec(advice, table_path, hybrid_table_fname, target):
-    for i in range(len(advice)):
-        predicted_value = regression_analysis(table_path, hybrid_table_fname, target, is_forward=True)
-        advice.at[i, 'Ed'] = predicted_value
+def update_target_ec(advice, table_path, hybrid_table_fname, target, session=None):
+    # Every advice row shares the same target, so the forward model is evaluated once
+    if len(advice):
+        advice['Ed'] = regression_analysis(table_path, hybrid_table_fname, target, is_forward=True, session=session)
     return advice
 
+@traced
 def advice_service(table_path, ed_table_fname, hybrid_table_fname, tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname,
-                   ec_col_name, ed_col_name, pred_ec, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es):
+                   ec_col_name, ed_col_name, pred_ec, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, session=None, sch=None):
 
     indices = get_setpoints_indices(set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
-    tem_index, hum_index = similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname)
+    tem_index, hum_index = similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, session)
     target = pred_ec - int(target_es)
-    req_ed = regression_analysis(table_path, hybrid_table_fname, target, is_forward=False)
+    req_ed = regression_analysis(table_path, hybrid_table_fname, target, is_forward=False, session=session)
 
-    df = pd.read_csv(f"{table_path}{ed_table_fname}")
-    ed_rev = filter_ed_table(df, indices, tem_index, hum_index)
-    nearest_indices = get_nearest_indices(ed_rev, req_ed)
-    advice = get_advice_list(df, nearest_indices, req_ed)
-    advice = update_target_ec(advice, table_path, hybrid_table_fname, target)
+    index = load_advice_index(table_path, ed_table_fname, session)
+    advice = pd.DataFrame(advice_candidates(index, indices, tem_index, hum_index, req_ed, sch), columns=index['columns'])
+    advice = update_target_ec(advice, table_path, hybrid_table_fname, target, session)
 
     # Calculate savings potential and sort
     advice['Saving Potential[%]'] = 100 - (advice['Ed'] / pred_ec * 100)
@@ -59,4 +46,55 @@ def advice_service(table_path, ed_table_fname, hybrid_table_fname, tem_storage_p
     if advice.empty:
         print("There is no suggested condition because (1) No matched condition in TRNSYS ED Table (2) Ideal setpoint control operating")
 
-    return advice
\ No newline at end of file
+    return advice
+
+@traced
+def advice_sweep(table_path, ed_table_fname, hybrid_table_fname, tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname,
+                 pred_ec, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es_values, session=None, sch=None, k=1):
+    """
+    Evaluate many energy saving targets in one pass and return the savings frontier.
+
+    The weather match runs once, the required energy demand of every target comes from one
+    vectorized inverse regression, and the ED index is queried once for all of them. A setting
+    found for several targets is reported once, under the largest target it meets. Each setting's
+    predicted EC comes from its own table Ed, and settings dominated on (predicted EC, comfort
+    deviation) by another setting are left out.
+
+    Parameters:
+        pred_ec (float): Predicted energy consumption of the next day.
+        target_es_values (array-like): Energy saving targets, e.g. range(100, 1001, 100).
+        k (int): Number of setpoint combinations considered per target, closest to its required demand first.
+        The remaining parameters are the same as for advice_service.
+
+    Returns:
+        pd.DataFrame: One row per setting on the frontier with the largest target it meets, that
+                      target's required demand, the table row of the setting, its comfort deviation
+                      (setpoint steps from the current setpoints), its predicted EC ('Ed') and the
+                      saving potential, ordered by comfort deviation; unreachable targets are left out.
+    """
+    indices = get_setpoints_indices(set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
+    tem_index, hum_index = similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, session)
+    target_es_values = np.asarray(target_es_values, dtype=float).astype(int)
+    targets = pred_ec - target_es_values
+    req_eds = regression_analysis(table_path, hybrid_table_fname, targets, is_forward=False, session=session)
+
+    index = load_advice_index(table_path, ed_table_fname, session)
+    demand, rows = sweep_candidates(index, indices, tem_index, hum_index, req_eds, sch, k)
+
+    frontier = pd.DataFrame(rows, columns=index['columns'])
+    frontier.insert(0, 'Target ES', target_es_values[demand])
+    frontier.insert(1, 'Required ED', req_eds[demand])
+    frontier = frontier.sort_values('Target ES', ascending=False, kind='stable').drop_duplicates(subset=index['columns'])
+    frontier['Comfort Deviation'] = comfort_deviation(index, frontier[index['columns']].to_numpy(dtype=np.float64), indices)
+    frontier = frontier.rename(columns={'Ed': 'Table Ed'})
+    frontier['Ed'] = regression_analysis(table_path, hybrid_table_fname, frontier['Table Ed'].to_numpy(), is_forward=True, session=session)
+
+    frontier = frontier[pareto_mask(frontier['Ed'], frontier['Comfort Deviation'])].copy()
+    frontier['Saving Potential[%]'] = 100 - (frontier['Ed'] / pred_ec * 100)
+    frontier.sort_values(['Comfort Deviation', 'Ed'], inplace=True, kind='stable')
+    frontier.index = range(1, len(frontier) + 1)
+
+    if frontier.empty:
+        print("There is no suggested condition for any target because (1) No matched condition in TRNSYS ED Table (2) Ideal setpoint control operating")
+
+    return frontier
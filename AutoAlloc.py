@@ -1,9 +1,11 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from AutoProfile import auto_profile
+from AutoProfile import fold_pending_readings, stored_profile
+from Trace import traced
 
-def allocate_energy_consumption(table_path, min_ec_table_fname, predicted_ec):
+@traced
+def allocate_energy_consumption(table_path, min_ec_table_fname, predicted_ec, session=None, profile_path=None, new_readings_file=None):
     """
     Allocates predicted energy consumption over the next day's time periods based on energy profiles.
 
@@ -11,12 +13,17 @@ def allocate_energy_consumption(table_path, min_ec_table_fname, predicted_ec):
         table_path (str): Path to the data table.
         min_ec_table_fname (str): Filename of the minimum energy consumption table.
         predicted_ec (float): Total predicted energy consumption for the next day.
+        session (TableSession, optional): Run session that shares the weekday profiles.
+        profile_path (str, optional): Directory of the stored weekday profiles; defaults to <table_path>/PROFILE.
+        new_readings_file (str, optional): The building's new 15-minute readings, folded into the stored
+            profiles first if the file exists (see AutoProfile.fold_pending_readings).
 
     Returns:
         pd.DataFrame: DataFrame with energy consumption allocated over different time periods.
     """
-    # Obtain the time profiles for energy consumption
-    time_profiles = auto_profile(table_path, min_ec_table_fname)
+    # Bring the stored profiles up to date with the latest readings, then obtain them
+    fold_pending_readings(table_path, min_ec_table_fname, new_readings_file, profile_path, session)
+    time_profiles = stored_profile(table_path, min_ec_table_fname, profile_path, session)
 
     # Determine the next day's weekday index
     next_day_index = (datetime.today() + timedelta(days=1)).weekday()
@@ -1,8 +1,46 @@
+import os
+import json
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
 from SimilarWD import similar_weather_days
 from AutoAccess import access_table
+from Session import load_table
+from TableStore import file_signature, table_digest
+from Trace import traced
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Fitted regressions, least recently used first: key -> (source stamp, coef, intercept). The key is
+# (table path or content hash, x column, y column, weighting scheme); the stamp is the file signature
+# the fit was made on, so a changed table replaces its entry instead of adding one
+_REGRESSIONS = OrderedDict()
+_REGRESSION_STORE_FILE = None
+# Keys fitted since the store was last saved
+_UNSAVED_REGRESSIONS = set()
+_SAVE_AT_EXIT = False
+REGRESSION_STORE_FILENAME = 'regressions.json'
+# Entries kept in memory and in the store; tables of removed buildings eventually drop out
+MAX_REGRESSIONS = 4096
+
+def recent_sample_weights(n):
+    """
+    Weight the most recent week of the hybrid table 1000 times more than older samples.
+    """
+    sample_weight = np.ones(n) * 10
+    sample_weight[-7:] *= 1000
+    return sample_weight
+
+WEIGHTING_SCHEMES = {
+    'uniform': lambda n: None,
+    'recent': recent_sample_weights
+}
 
 def perform_regression(x, y, sample_weights=None):
     """
@@ -16,13 +54,143 @@ def perform_regression(x, y, sample_weights=None):
     Returns:
         tuple: Returns the coefficients and the intercept of the regression model.
     """
+    from sklearn.linear_model import LinearRegression  # Imported on first fit: stored regressions never need it
     x = x.reshape(-1, 1)
     y = y.reshape(-1, 1)
     model = LinearRegression()
     model.fit(x, y, sample_weight=sample_weights)
     return model.coef_[0][0], model.intercept_[0]
 
-def predict_energy(table_path, hybrid_table_fname, ed_table_fname, ec_col_name, ed_col_name, tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool):
+def use_regression_store(model_path):
+    """
+    Persist fitted regressions in model_path so that later runs reuse them instead of refitting.
+
+    New fits are kept in memory and written by save_regression_store, which also runs when the
+    process exits.
+
+    Parameters:
+        model_path (str): Directory holding the regression store, e.g. the configured AI model path.
+    """
+    global _REGRESSION_STORE_FILE, _SAVE_AT_EXIT
+    if not _SAVE_AT_EXIT:
+        atexit.register(save_regression_store)
+        _SAVE_AT_EXIT = True
+    _REGRESSION_STORE_FILE = os.path.join(model_path, REGRESSION_STORE_FILENAME)
+    stored = _read_regression_store(_REGRESSION_STORE_FILE)
+    for key, entry in _REGRESSIONS.items():
+        stored[key] = entry
+        stored.move_to_end(key)
+    _REGRESSIONS.clear()
+    _REGRESSIONS.update(stored)
+    _evict_regressions(_REGRESSIONS)
+
+def regression_store_path():
+    """
+    Return the directory of the regression store in use, or None; worker processes are pointed at the same store.
+    """
+    return os.path.dirname(_REGRESSION_STORE_FILE) if _REGRESSION_STORE_FILE is not None else None
+
+def _read_regression_store(store_file):
+    try:
+        with open(store_file, encoding='utf-8') as f:
+            stored = json.load(f)
+        return OrderedDict((tuple(key), (stamp, coef, intercept)) for key, stamp, coef, intercept in stored['entries'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return OrderedDict()
+
+def _evict_regressions(regressions):
+    while len(regressions) > MAX_REGRESSIONS:
+        regressions.popitem(last=False)
+
+@contextmanager
+def _store_lock(store_file):
+    """
+    Hold an exclusive lock on the store's sidecar .lock file.
+    """
+    with open(f"{store_file}.lock", 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def save_regression_store():
+    """
+    Merge the regressions fitted since the last save into the store file.
+
+    Runs once at the end of a run: at interpreter exit, when a fleet worker exits, after a batch
+    run and after each service request; it does nothing when there is nothing new. The store is
+    read, merged and replaced while holding a lock, so processes saving at the same time keep each
+    other's fits.
+    """
+    if _REGRESSION_STORE_FILE is None or not _UNSAVED_REGRESSIONS:
+        return
+    try:
+        os.makedirs(os.path.dirname(_REGRESSION_STORE_FILE), exist_ok=True)
+        with _store_lock(_REGRESSION_STORE_FILE):
+            stored = _read_regression_store(_REGRESSION_STORE_FILE)
+            for key, entry in _REGRESSIONS.items():
+                if key in _UNSAVED_REGRESSIONS:
+                    stored[key] = entry
+                    stored.move_to_end(key)
+            _evict_regressions(stored)
+            tmp_file = f"{_REGRESSION_STORE_FILE}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'entries': [[list(key), stamp, coef, intercept] for key, (stamp, coef, intercept) in stored.items()]}, f)
+            os.replace(tmp_file, _REGRESSION_STORE_FILE)
+        _UNSAVED_REGRESSIONS.clear()
+    except OSError as e:
+        print(f"Could not save the regression store: {e}")
+
+@traced
+def fitted_regression(df, x_col, y_col, weighting='uniform', source=None):
+    """
+    Return the (coef, intercept) of a linear regression of y_col on x_col, fitting it only once.
+
+    Fits are keyed by the table file, the regression direction (x and y columns) and the weighting
+    scheme, and stamped with the file signature (modification time and size), so an unchanged table
+    is never refitted within a run or, with a regression store, across runs. Without a source file
+    the table content hash is used instead.
+
+    Parameters:
+        df (pd.DataFrame): Table holding both columns.
+        x_col (str): Column used as the independent variable.
+        y_col (str): Column used as the dependent variable.
+        weighting (str): Name of a sample weighting scheme in WEIGHTING_SCHEMES.
+        source (str, optional): File the table was loaded from.
+
+    Returns:
+        tuple: The coefficient and the intercept of the regression model.
+    """
+    if source is not None:
+        key, stamp = (os.path.abspath(source), str(x_col), str(y_col), weighting), file_signature(source)
+    else:
+        key, stamp = (table_digest(df), str(x_col), str(y_col), weighting), None
+
+    entry = _REGRESSIONS.get(key)
+    if entry is not None and entry[0] == stamp:
+        _REGRESSIONS.move_to_end(key)
+        return entry[1], entry[2]
+
+    x = df[x_col].values
+    y = df[y_col].values
+    coef, intercept = perform_regression(x, y, WEIGHTING_SCHEMES[weighting](len(x)))
+    _REGRESSIONS[key] = (stamp, float(coef), float(intercept))
+    _REGRESSIONS.move_to_end(key)
+    _evict_regressions(_REGRESSIONS)
+    _UNSAVED_REGRESSIONS.add(key)
+    return float(coef), float(intercept)
+
+@traced
+def predict_energy(table_path, hybrid_table_fname, ed_table_fname, ec_col_name, ed_col_name, tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=None, weather_indices=None):
     """
     Predicts energy consumption based on regression analysis and other factors.
     
@@ -33,44 +201,46 @@ def predict_energy(table_path, hybrid_table_fname, ed_table_fname, ec_col_name,
         ec_col_name (str): Column name for energy consumption in the hybrid table.
         ed_col_name (str): Column name for energy demand in the hybrid table.
         ... (additional parameters for external functions)
+        session (TableSession, optional): Run session that shares loaded tables.
+        weather_indices (tuple, optional): (tem_index, hum_index) already matched for the building's location.
     
     Returns:
         float: Predicted weighted energy consumption.
     """
-    tem_index, hum_index = similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname)
-    pred_ed = access_table(table_path, ed_table_fname, tem_index, hum_index, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
-    df = pd.read_csv(f"{table_path}{hybrid_table_fname}")
-    y = df[ec_col_name].values
-    x = df[ed_col_name].values
-
-    sample_weight = np.ones(len(x)) * 10
-    sample_weight[-7:] *= 1000
-
-    coef, intercept = perform_regression(x, y, sample_weight)
+    if weather_indices is not None:
+        tem_index, hum_index = weather_indices
+    else:
+        tem_index, hum_index = similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, session)
+    pred_ed = access_table(table_path, ed_table_fname, tem_index, hum_index, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session)
+    hybrid_file = f"{table_path}{hybrid_table_fname}"
+    df = load_table(hybrid_file, session)
+    coef, intercept = fitted_regression(df, ed_col_name, ec_col_name, weighting='recent', source=hybrid_file)
     return coef * pred_ed + intercept
 
-def regression_analysis(table_path, hybrid_table_fname, target, is_forward=True):
+@traced
+def regression_analysis(table_path, hybrid_table_fname, target, is_forward=True, session=None):
     """
     Performs forward or reverse regression analysis.
     
     Parameters:
         table_path (str): Path to the data table.
         hybrid_table_fname (str): File name of the hybrid table.
-        target (float): Target value for prediction or reverse calculation.
+        target (float or np.array): Target value(s) for prediction or reverse calculation.
         is_forward (bool): Determines whether to perform forward or reverse regression.
+        session (TableSession, optional): Run session that shares loaded tables.
     
     Returns:
-        float: The result of regression analysis.
+        float or np.array: The result of regression analysis for each target.
     """
-    df = pd.read_csv(f"{table_path}{hybrid_table_fname}")
+    hybrid_file = f"{table_path}{hybrid_table_fname}"
+    df = load_table(hybrid_file, session)
     if is_forward:
-        x = df[df.columns[0]].values
-        y = df[df.columns[-1]].values
+        coef, intercept = fitted_regression(df, df.columns[0], df.columns[-1], source=hybrid_file)
     else:
-        x = df[df.columns[-1]].values
-        y = df[df.columns[0]].values
-    
-    coef, intercept = perform_regression(x, y)
+        coef, intercept = fitted_regression(df, df.columns[-1], df.columns[0], source=hybrid_file)
+
+    if not np.isscalar(target):
+        target = np.asarray(target, dtype=float)
     if is_forward:
         return coef * target + intercept
     else:
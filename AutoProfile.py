@@ -1,7 +1,16 @@
+import os
+import json
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from tslearn.clustering import TimeSeriesKMeans
+from Session import load_table
+from TableStore import file_signature
+from Trace import traced
+
+SLOTS_PER_DAY = 96  # 15-minute readings
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+PROFILE_DIRNAME = 'PROFILE'
+# New 15-minute readings of a registered building are delivered to the input folder as NEW_<EC Minutely file>
+NEW_READINGS_PREFIX = 'NEW_'
 
 def min_max_scaler(data):
     """
@@ -11,32 +20,70 @@ def min_max_scaler(data):
         return data  # Avoid division by zero if all values are the same
     return (data - np.min(data)) / (np.max(data) - np.min(data))
 
+@traced
 def cluster_time_series(data, n_clusters=1, random_seed=0):
     """
     Cluster time series data using TimeSeries KMeans.
     """
     if data.size == 0:
         return None, None  # Handle empty data scenarios
+    from tslearn.clustering import TimeSeriesKMeans  # Imported here: tslearn pulls in numba at import time
     km = TimeSeriesKMeans(n_clusters=n_clusters, max_iter=1000, metric='euclidean', random_state=random_seed)
     labels = km.fit_predict(data)
     return km, labels
 
+def profile_centers(data, n_clusters=1, random_seed=0):
+    """
+    Return the cluster centers of a set of daily series, shaped like TimeSeriesKMeans.cluster_centers_.
+
+    With a single cluster and the Euclidean metric the k-means center is exactly the per-slot mean,
+    so it is computed in closed form; tslearn is only used for more than one cluster.
+
+    Parameters:
+        data (np.array): Daily series of shape (n_days, n_slots).
+        n_clusters (int): Number of clusters.
+        random_seed (int): Random seed passed to tslearn when n_clusters > 1.
+
+    Returns:
+        np.array or None: Centers of shape (n_clusters, n_slots, 1), or None for empty data.
+    """
+    if data.size == 0:
+        return None
+    if n_clusters == 1:
+        return data.mean(axis=0).reshape(1, -1, 1)
+    km, _ = cluster_time_series(data, n_clusters=n_clusters, random_seed=random_seed)
+    return km.cluster_centers_
+
 def organize_data_by_weekday(df, column='eg_value'):
     """
-    Organize data into lists for each weekday.
+    Organize data into arrays of daily series for each weekday.
     """
-    weekdays_data = [[] for _ in range(7)]  # List of lists for each day of the week
-    for _, row in df.iterrows():
-        weekday = datetime.strptime(row['date'], '%Y-%m-%d %H:%M').weekday()
-        weekdays_data[weekday].append(row[column])
-    return [np.array(day).reshape(-1, 96) for day in weekdays_data if day]  # Ensure each day has data
+    weekdays = pd.to_datetime(df['date'], format=DATE_FORMAT).dt.weekday.to_numpy()
+    values = df[column].to_numpy(dtype=np.float64)
 
-def auto_profile(table_path, min_ec_table_fname):
+    # Stable sort keeps the original row order within each weekday
+    order = np.argsort(weekdays, kind='stable')
+    counts = np.bincount(weekdays, minlength=7)
+    groups = np.split(values[order], np.cumsum(counts)[:-1])
+    return [day.reshape(-1, SLOTS_PER_DAY) for day in groups if day.size]  # Ensure each day has data
+
+@traced
+def auto_profile(table_path, min_ec_table_fname, session=None):
     """
     Generate profiles for each weekday using historical energy consumption data.
+    With a session the profiles are built once per table and shared by every allocation.
+    """
+    if session is not None:
+        key = ('weekday_profiles', os.path.abspath(f"{table_path}{min_ec_table_fname}"))
+        return session.get(key, lambda: _auto_profile(table_path, min_ec_table_fname, session))
+    return _auto_profile(table_path, min_ec_table_fname)
+
+def _auto_profile(table_path, min_ec_table_fname, session=None):
+    """
+    Uncached body of auto_profile.
     """
     # Load data
-    df = pd.read_csv(f"{table_path}{min_ec_table_fname}")
+    df = load_table(f"{table_path}{min_ec_table_fname}", session)
     
     # Organize data by weekdays
     weekday_data = organize_data_by_weekday(df)
@@ -45,12 +92,207 @@ def auto_profile(table_path, min_ec_table_fname):
     profiles = []
     for data in weekday_data:
         normalized_data = min_max_scaler(data)
-        km, _ = cluster_time_series(normalized_data, n_clusters=1, random_seed=0)
-        if km:
-            profiles.append(km.cluster_centers_)
+        centers = profile_centers(normalized_data, n_clusters=1, random_seed=0)
+        if centers is not None:
+            profiles.append(centers)
     
     return profiles
 
+def weekday_statistics(df, column='eg_value'):
+    """
+    Reduce 15-minute readings to per-weekday sufficient statistics for the load profiles.
+
+    Parameters:
+        df (pd.DataFrame): Readings with 'date' and value columns.
+        column (str): Name of the value column.
+
+    Returns:
+        dict: 'sums' and 'counts' of shape (7, SLOTS_PER_DAY) per weekday and time slot, and
+              'mins' and 'maxs' of shape (7,) per weekday for the min-max scaler.
+    """
+    dates = pd.to_datetime(df['date'], format=DATE_FORMAT)
+    weekdays = dates.dt.weekday.to_numpy()
+    slots = (dates.dt.hour * 60 + dates.dt.minute).to_numpy() // (24 * 60 // SLOTS_PER_DAY)
+    values = df[column].to_numpy(dtype=np.float64)
+
+    cells = weekdays * SLOTS_PER_DAY + slots
+    mins = np.full(7, np.inf)
+    maxs = np.full(7, -np.inf)
+    np.minimum.at(mins, weekdays, values)
+    np.maximum.at(maxs, weekdays, values)
+    return {
+        'sums': np.bincount(cells, weights=values, minlength=7 * SLOTS_PER_DAY).reshape(7, SLOTS_PER_DAY),
+        'counts': np.bincount(cells, minlength=7 * SLOTS_PER_DAY).reshape(7, SLOTS_PER_DAY),
+        'mins': mins,
+        'maxs': maxs
+    }
+
+def merge_statistics(stats, new_stats):
+    """
+    Combine two sets of weekday statistics; cost depends only on the profile size.
+    """
+    return {
+        'sums': stats['sums'] + new_stats['sums'],
+        'counts': stats['counts'] + new_stats['counts'],
+        'mins': np.minimum(stats['mins'], new_stats['mins']),
+        'maxs': np.maximum(stats['maxs'], new_stats['maxs'])
+    }
+
+def profiles_from_statistics(stats):
+    """
+    Rebuild the auto_profile output (min-max scaled per-slot means) from weekday statistics.
+    """
+    profiles = []
+    for weekday in range(7):
+        if not stats['counts'][weekday].any():
+            continue  # Ensure each day has data
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = stats['sums'][weekday] / stats['counts'][weekday]
+        low, high = stats['mins'][weekday], stats['maxs'][weekday]
+        if high != low:
+            mean = (mean - low) / (high - low)  # The scaler is affine, so scaling the mean equals the mean of scaled days
+        profiles.append(mean.reshape(1, -1, 1))
+    return profiles
+
+def last_reading(df):
+    """
+    Timestamp of the latest reading in a table, formatted with DATE_FORMAT, or None for an empty table.
+    """
+    if df.empty:
+        return None
+    return pd.to_datetime(df['date'], format=DATE_FORMAT).max().strftime(DATE_FORMAT)
+
+def readings_after(df, watermark):
+    """
+    Rows of a readings table later than a watermark from last_reading; all rows when it is None.
+    """
+    if watermark is None:
+        return df
+    return df[pd.to_datetime(df['date'], format=DATE_FORMAT) > pd.Timestamp(watermark)]
+
+def _profile_store_file(table_path, min_ec_table_fname, profile_path=None):
+    if profile_path is None:
+        profile_path = os.path.join(table_path, PROFILE_DIRNAME)
+    return os.path.join(profile_path, f"{os.path.splitext(min_ec_table_fname)[0]}.npz")
+
+def _save_statistics(store_file, stats, stamp):
+    os.makedirs(os.path.dirname(store_file), exist_ok=True)
+    tmp_file = f"{store_file}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, stamp=np.array(json.dumps(stamp)), **stats)
+    os.replace(tmp_file, store_file)
+
+def _load_statistics(store_file):
+    try:
+        with np.load(store_file) as data:
+            stamp = json.loads(str(data['stamp']))
+            stats = {key: data[key] for key in ('sums', 'counts', 'mins', 'maxs')}
+    except (OSError, KeyError, ValueError):
+        return None, None
+    return stats, stamp
+
+@traced
+def load_profile_statistics(table_path, min_ec_table_fname, profile_path=None, session=None):
+    """
+    Return the stored weekday statistics of a building, rebuilding them if the source table changed.
+
+    The store carries a version stamp with the signature of the EC_MIN table it was built from, of
+    every readings file folded into it afterwards, and the watermark: the latest reading the
+    statistics cover. A different table signature, or a store without a watermark, triggers a
+    rebuild, which sets the watermark to the table's last reading so readings the table already
+    holds are never folded again.
+
+    Parameters:
+        table_path (str): Path to the data table.
+        min_ec_table_fname (str): Filename of the 15-minute energy consumption table.
+        profile_path (str, optional): Directory of the profile store; defaults to <table_path>/PROFILE.
+        session (TableSession, optional): Run session used to read the table on a rebuild.
+
+    Returns:
+        tuple: (statistics dict, version stamp dict).
+    """
+    source = f"{table_path}{min_ec_table_fname}"
+    store_file = _profile_store_file(table_path, min_ec_table_fname, profile_path)
+    signature = file_signature(source)
+
+    stats, stamp = _load_statistics(store_file)
+    if stats is None or stamp.get('source') != signature or 'watermark' not in stamp:
+        df = load_table(source, session)
+        stats = weekday_statistics(df)
+        stamp = {'source': signature, 'folded': [], 'watermark': last_reading(df)}
+        try:
+            _save_statistics(store_file, stats, stamp)
+        except OSError as e:
+            print(f"Could not save the weekday profiles: {e}")
+    return stats, stamp
+
+@traced
+def fold_new_readings(table_path, min_ec_table_fname, new_readings_file, profile_path=None):
+    """
+    Fold new 15-minute readings (e.g. NEW_EC_MIN.csv) into a building's stored weekday statistics.
+
+    The work is proportional to the number of new rows. Only readings later than the store's
+    watermark are folded, so readings already in the table or folded by an earlier run are not
+    counted twice; a readings file whose signature is recorded in the version stamp is not read again.
+
+    Returns:
+        bool: True if readings were folded in, False if they were all already part of the store.
+    """
+    stats, stamp = load_profile_statistics(table_path, min_ec_table_fname, profile_path)
+    entry = [os.path.basename(new_readings_file), file_signature(new_readings_file)]
+    if entry in stamp['folded']:
+        return False
+
+    new_readings = readings_after(load_table(new_readings_file), stamp['watermark'])
+    if not new_readings.empty:
+        stats = merge_statistics(stats, weekday_statistics(new_readings))
+        stamp['watermark'] = last_reading(new_readings)
+    stamp['folded'].append(entry)
+    _save_statistics(_profile_store_file(table_path, min_ec_table_fname, profile_path), stats, stamp)
+    return not new_readings.empty
+
+def new_readings_filename(min_ec_table_fname):
+    """
+    Name of the file a building's new 15-minute readings arrive in (NEW_EC_Minutely_A.csv for EC_Minutely_A.csv).
+    """
+    return f"{NEW_READINGS_PREFIX}{min_ec_table_fname}"
+
+def fold_pending_readings(table_path, min_ec_table_fname, new_readings_file, profile_path=None, session=None):
+    """
+    Fold a building's new readings into its stored profiles if the file exists and was not folded yet.
+
+    With a session each version of the readings file is checked once per run, and the session's
+    profiles of the building are dropped when the store changed.
+
+    Returns:
+        bool: True if readings were folded in.
+    """
+    if not new_readings_file or not os.path.exists(new_readings_file):
+        return False
+    if session is None:
+        return fold_new_readings(table_path, min_ec_table_fname, new_readings_file, profile_path)
+
+    source = os.path.abspath(f"{table_path}{min_ec_table_fname}")
+
+    def _fold():
+        folded = fold_new_readings(table_path, min_ec_table_fname, new_readings_file, profile_path)
+        if folded:
+            session.discard(('stored_profiles', source))
+        return folded
+
+    key = ('folded_readings', source, os.path.abspath(new_readings_file), tuple(file_signature(new_readings_file)))
+    return session.get(key, _fold)
+
+@traced
+def stored_profile(table_path, min_ec_table_fname, profile_path=None, session=None):
+    """
+    Weekday profiles read from the persistent store, in the same layout as auto_profile.
+    """
+    if session is not None:
+        key = ('stored_profiles', os.path.abspath(f"{table_path}{min_ec_table_fname}"))
+        return session.get(key, lambda: stored_profile(table_path, min_ec_table_fname, profile_path))
+    stats, _ = load_profile_statistics(table_path, min_ec_table_fname, profile_path)
+    return profiles_from_statistics(stats)
+
 # Example Usage
 # table_path = '/path/to/data/'
 # min_ec_table_fname = 'min_energy_consumption.csv'
@@ -0,0 +1,133 @@
+import numpy as np
+from Session import load_table
+
+# Fewer lagged difference pairs than this are not trusted to the batch estimator
+MIN_PAIRS = 10
+# Batch and statsmodels forecasts may differ by this fraction of the std of the differenced series
+TOLERANCE = 0.05
+# Series of a fleet run cross-checked against statsmodels
+CHECK_SAMPLE = 2
+
+def _stack(columns):
+    n_days = max((len(values) for values in columns), default=0)
+    series = np.full((len(columns), n_days), np.nan)
+    for row, values in enumerate(columns):
+        series[row, :len(values)] = values
+    return series, ~np.isnan(series)
+
+def stack_daily_series(table_path, filenames, column_name, session=None):
+    """
+    Load several EC_Daily tables into one left-aligned matrix with a validity mask.
+
+    Returns:
+        tuple: (series of shape (n_buildings, n_days) padded with NaN, boolean mask of valid entries).
+    """
+    return _stack([load_table(f"{table_path}{filename}", session)[column_name].to_numpy(dtype=np.float64) for filename in filenames])
+
+def _statsmodels_forecast(values):
+    from ARIMA import ARIMA  # statsmodels is only imported when a series needs it
+    try:
+        return ARIMA(values, order=(1, 1, 0)).fit().forecast()[0]
+    except ValueError as e:
+        print(f"Model fitting failed: {e}")
+        return np.nan
+
+def arima_110_batch(series, mask=None, tolerance=TOLERANCE, check_sample=0, random_seed=0):
+    """
+    Fit ARIMA(1, 1, 0) to many series at once and forecast one step ahead.
+
+    ARIMA(1, 1, 0) is an AR(1) without constant on first differences, so the coefficient of every
+    series is estimated in closed form by conditional least squares:
+    phi = sum(dy[t] * dy[t-1]) / sum(dy[t-1] ** 2), and the forecast is y[T] + phi * dy[T].
+    For series of useful length this agrees closely with the statsmodels maximum-likelihood fit.
+
+    A series falls back to statsmodels when it has fewer than MIN_PAIRS lagged pairs or its
+    coefficient is not stationary. With check_sample > 0, that many remaining series are also
+    fitted with statsmodels; if any forecast differs by more than tolerance times the std of the
+    differenced series, or either forecast is not finite, the batch result is not trusted and
+    every series falls back.
+
+    Parameters:
+        series (np.array): Matrix of shape (n_buildings, n_days).
+        mask (np.array, optional): Boolean matrix marking valid entries; each row's valid entries must be contiguous.
+        tolerance (float): Allowed forecast difference, relative to the std of the differenced series.
+        check_sample (int): Number of series to cross-check against statsmodels.
+        random_seed (int): Seed for choosing the cross-checked series.
+
+    Returns:
+        tuple: (forecasts, AR coefficients, boolean array marking series forecast by statsmodels).
+    """
+    series = np.asarray(series, dtype=np.float64)
+    if mask is None:
+        mask = ~np.isnan(series)
+    values = np.where(mask, series, 0.0)
+
+    # Differences are valid where both neighbours are, lagged pairs where both differences are
+    diffs = np.diff(values, axis=1)
+    diff_mask = mask[:, 1:] & mask[:, :-1]
+    diffs = np.where(diff_mask, diffs, 0.0)
+    pair_mask = diff_mask[:, 1:] & diff_mask[:, :-1]
+    lead, lag = diffs[:, 1:] * pair_mask, diffs[:, :-1] * pair_mask
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        phi = (lead * lag).sum(axis=1) / (lag * lag).sum(axis=1)
+
+    rows = np.arange(len(series))
+    n_days = series.shape[1]
+    last = n_days - 1 - np.argmax(mask[:, ::-1], axis=1)
+    last_diff = values[rows, last] - values[rows, np.maximum(last - 1, 0)]
+    forecasts = values[rows, last] + phi * last_diff
+
+    fallback = (pair_mask.sum(axis=1) < MIN_PAIRS) | ~np.isfinite(phi) | (np.abs(phi) >= 1.0)
+
+    if check_sample > 0:
+        candidates = np.flatnonzero(~fallback)
+        rng = np.random.default_rng(random_seed)
+        for row in rng.choice(candidates, size=min(check_sample, len(candidates)), replace=False):
+            reference = _statsmodels_forecast(series[row, mask[row]])
+            scale = diffs[row, diff_mask[row]].std() or 1.0
+            # A NaN on either side would pass the comparison below, so it counts as a mismatch
+            if not (np.isfinite(reference) and np.isfinite(forecasts[row])) or abs(reference - forecasts[row]) > tolerance * scale:
+                fallback[:] = True
+                break
+
+    for row in np.flatnonzero(fallback):
+        forecasts[row] = _statsmodels_forecast(series[row, mask[row]]) if mask[row].sum() >= 3 else np.nan
+
+    return forecasts, phi, fallback
+
+def batch_arima_forecasts(paths, column_name, session=None, check_sample=CHECK_SAMPLE):
+    """
+    Forecast many EC_Daily tables with ARIMA(1, 1, 0) through one arima_110_batch call.
+
+    Tables that cannot be read, or that have gaps, are left out; callers forecast those with
+    ARIMA.arima_model, which also reports what is wrong with them.
+
+    Parameters:
+        paths (list): Paths of the EC_Daily tables.
+        column_name (str): Column holding the daily consumption.
+        session (TableSession, optional): Run session that shares loaded tables.
+        check_sample (int): Number of series cross-checked against statsmodels (see arima_110_batch).
+
+    Returns:
+        dict: Path -> forecast of the tables that were forecast.
+    """
+    columns = {}
+    for path in dict.fromkeys(paths):
+        try:
+            values = load_table(path, session)[column_name].to_numpy(dtype=np.float64)
+        except (OSError, KeyError, ValueError):
+            continue
+        if len(values) and not np.isnan(values).any():
+            columns[path] = values
+    if not columns:
+        return {}
+
+    series, mask = _stack(list(columns.values()))
+    forecasts, _, _ = arima_110_batch(series, mask, check_sample=check_sample)
+    return {path: float(forecast) for path, forecast in zip(columns, forecasts) if np.isfinite(forecast)}
+
+# Example usage:
+# series, mask = stack_daily_series('path/to/storage/', ['EC_Daily_A.csv', 'EC_Daily_B.csv'], 'eg_value')
+# forecasts, phi, fallback = arima_110_batch(series, mask, check_sample=2)
+# forecasts = batch_arima_forecasts(['path/to/storage/EC_Daily_A.csv', 'path/to/storage/EC_Daily_B.csv'], 'eg_value')
@@ -0,0 +1,522 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+from Session import TableSession
+from AutoAccess import SET_M_T, SET_M_H, SET_O_HT, SET_O_CT, access_table
+from SimilarWD import similar_weather_days
+from AutoProfile import auto_profile
+from AutoAlloc import allocate_energy_consumption
+from AutoPredict import predict_energy
+from AutoAdvice import advice_service
+from ARIMA import arima_model
+from DegreeHour import online_energy_model, predict_next_day_energy
+from Fleet import building_jobs, run_fleet
+from Registry import REGISTRY_FILENAME
+
+BENCHMARK_VERSION = 1
+MANIFEST_FILENAME = 'fleet.json'
+DEFAULT_ROOT = os.path.join(tempfile.gettempdir(), 'energy_sys_bench')
+LOCATIONS = ('Seoul', 'Gyeonggi', 'Daejeon', 'Busan', 'Incheon', 'Daegu', 'Gwangju', 'Ulsan')
+START_DATE = '2022-01-01'
+# Setpoints the stages are run with (the defaults of CONFIG.ini)
+SETPOINTS = (16, 30, 20, 26)
+TARGET_ES = 500
+STAGES = ('similar_weather_days', 'access_table', 'auto_profile', 'allocate_energy_consumption', 'arima_model',
+          'predict_energy', 'advice_service', 'degree_hour_training', 'fleet')
+# Relative change of a metric beyond which compare_results reports a regression
+TOLERANCE = 0.1
+
+# Entry points whose import time is budgeted; none of them may import a model backend up front
+STARTUP_MODULES = ('main', 'main_ids', 'main_ids_ver2', 'main_ids_ver3(season)', 'main_batch', 'Service')
+STARTUP_BUDGET_S = 1.0
+BACKENDS = ('statsmodels', 'sklearn', 'tslearn', 'numba')
+# Backends each prediction method must not load (degree hour and advice are lookups and closed-form fits)
+METHOD_FORBIDDEN = {'degree-hour': ('statsmodels', 'sklearn', 'tslearn', 'numba'),
+                    'hybrid-advice': ('statsmodels', 'tslearn', 'numba'),
+                    'arima': ('tslearn', 'numba')}
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _write_profile(path, column, values):
+    pd.DataFrame({'hour': np.arange(len(values)), column: values}).to_csv(path, index=False)
+
+def _daily_weather(rng, n_days):
+    """
+    Synthetic hourly temperature and humidity days of shape (n_days, 24).
+    """
+    hours = np.arange(24)
+    level = rng.uniform(-8, 30, size=(n_days, 1))
+    swing = rng.uniform(3, 9, size=(n_days, 1))
+    tem = level + swing * np.sin(2 * np.pi * (hours - 9) / 24) + rng.normal(0, 0.8, size=(n_days, 24))
+    hum = np.clip(rng.uniform(30, 85, size=(n_days, 1)) - 1.5 * (tem - level) + rng.normal(0, 3, size=(n_days, 24)), 5, 100)
+    return tem, hum
+
+def _ed_table(rng, grid, base):
+    """
+    Full TRNSYS-style ED table over grid weather classes for temperature and humidity.
+    """
+    shape = (grid, grid, 1, len(SET_M_T), len(SET_M_H), len(SET_O_HT), len(SET_O_CT))
+    keys = np.indices(shape).reshape(len(shape), -1).T + 1
+    tem, rh, _, mspt, msph, osph, ospc = keys.T
+    # Demand falls in the directions AdviceIndex.setpoint_mask searches, so advice finds candidates
+    ed = (base * (1 + 0.6 * tem / grid + 0.2 * rh / grid) - 60 * (mspt + msph + osph - ospc)
+          + rng.normal(0, 20, size=len(keys)))
+    df = pd.DataFrame(keys, columns=['Tem', 'RH', 'SCH', 'mSPT', 'mSPH', 'oSPhT', 'oSPcT'])
+    df['Ed'] = np.round(ed, 6)
+    return df
+
+def generate_fleet(root, n_buildings=10, history_days=180, library_days=20, grid=20, n_locations=3, n_ed_tables=3, seed=0):
+    """
+    Write a synthetic fleet with the layout of the IASYSTEM folders (STORAGE, STORAGE/WD, INPUT).
+
+    Every building gets its own hybrid table and daily, hourly and 15-minute consumption tables;
+    ED tables are shared round-robin between buildings, as several buildings of one type share a
+    simulation. The registry is written to INPUT/building_ids.xlsx and the parameters to fleet.json.
+
+    Parameters:
+        root (str): Folder to write the fleet into.
+        n_buildings (int): Number of buildings.
+        history_days (int): Days of consumption history per building.
+        library_days (int): Reference weather days per location.
+        grid (int): Weather classes per axis (temperature and humidity) of the ED tables.
+        n_locations (int): Number of locations, at most len(LOCATIONS).
+        n_ed_tables (int): Number of distinct ED tables.
+        seed (int): Random seed.
+
+    Returns:
+        dict: The manifest (parameters and registry).
+    """
+    if library_days > grid:
+        raise ValueError("The ED grid must cover every weather library day (grid >= library_days).")
+    if not 1 <= n_locations <= len(LOCATIONS):
+        raise ValueError(f"n_locations must be between 1 and {len(LOCATIONS)}.")
+    rng = np.random.default_rng(seed)
+    table_path = os.path.join(root, 'STORAGE', '')
+    input_path = os.path.join(root, 'INPUT', '')
+    os.makedirs(table_path, exist_ok=True)
+    os.makedirs(input_path, exist_ok=True)
+
+    locations = LOCATIONS[:n_locations]
+    hours = pd.date_range(START_DATE, periods=history_days * 24, freq='h')
+    location_temperature = {}
+    for location in locations:
+        for variable, values in zip(('TEM', 'HUM'), _daily_weather(rng, library_days)):
+            storage_path = os.path.join(root, 'STORAGE', 'WD', location, variable)
+            os.makedirs(storage_path, exist_ok=True)
+            for day_id, day in enumerate(values, start=1):
+                _write_profile(os.path.join(storage_path, f"{variable.lower()}_n_{day_id:03d}.csv"), variable.lower(), day)
+
+        tem, hum = _daily_weather(rng, 1)
+        stamps = pd.date_range('2022-11-04', periods=24, freq='h').strftime('%Y-%m-%d %H:%M')
+        pd.DataFrame({'date': stamps, 'Temperature': np.round(tem[0], 1)}).to_csv(f"{input_path}Pred_{location}_Tem_hourly.csv", index=False)
+        pd.DataFrame({'date': stamps, 'Humidity': np.round(hum[0], 1)}).to_csv(f"{input_path}Pred_{location}_Hum_hourly.csv", index=False)
+
+        temperature = _daily_weather(rng, history_days)[0].ravel()
+        location_temperature[location] = temperature
+        pd.DataFrame({'Hour': hours.hour, 'Temperature': temperature}).to_csv(f"{table_path}TEM_HOUR_{location}.csv", index=False)
+
+    tem, _ = _daily_weather(rng, 1)
+    pd.DataFrame({'Hour': np.arange(24), 'Temperature': np.round(tem[0], 1)}).to_csv(f"{input_path}Next_day_hourly_temperature.csv", index=False)
+
+    for table in range(n_ed_tables):
+        _ed_table(rng, grid, rng.uniform(2500, 4000)).to_csv(f"{table_path}ED_{table + 1}.csv", index=False)
+
+    slots = pd.date_range(START_DATE, periods=history_days * 96, freq='15min')
+    slot_shape = 0.4 + np.clip(np.sin(np.pi * (np.arange(96) - 28) / 48), 0, None)  # Office-hours load shape
+    buildings = []
+    for b in range(n_buildings):
+        building_id = str(b + 1)
+        location = locations[b % n_locations]
+        files = {name: f"{prefix}_{building_id}.csv" for name, prefix in
+                 (('Hybrid DB', 'HYBRID'), ('EC Daily', 'EC_Daily'), ('EC Minutely', 'EC_Minutely'), ('EC Hourly', 'EC_HOUR'))}
+        files['ED DB'] = f"ED_{b % n_ed_tables + 1}.csv"
+
+        ed = rng.uniform(3000, 8000, size=history_days)
+        ec = rng.uniform(0.9, 1.4) * ed + rng.uniform(200, 800) + rng.normal(0, 150, size=history_days)
+        pd.DataFrame({'ED': np.round(ed, 6), 'EC': np.round(ec, 2)}).to_csv(f"{table_path}{files['Hybrid DB']}", index=False)
+
+        weekday = np.where(slots.weekday < 5, 1.0, 0.35).reshape(history_days, 96)
+        minutely = np.abs(weekday * slot_shape * ec[:, None] / slot_shape.sum() + rng.normal(0, 2, size=weekday.shape))
+        pd.DataFrame({'date': slots.strftime('%Y-%m-%d %H:%M'), 'eg_value': np.round(minutely.ravel(), 2)}
+                     ).to_csv(f"{table_path}{files['EC Minutely']}", index=False)
+        pd.DataFrame({'date': pd.date_range(START_DATE, periods=history_days).strftime('%Y-%m-%d'),
+                      'eg_value': np.round(minutely.sum(axis=1), 2)}).to_csv(f"{table_path}{files['EC Daily']}", index=False)
+
+        heating = np.clip(18 - location_temperature[location], 0, None)
+        hourly = rng.uniform(50, 150) + rng.uniform(5, 20) * heating + rng.normal(0, 10, size=len(heating))
+        pd.DataFrame({'date': hours.strftime('%Y-%m-%d %H:%M'), 'eg_value': np.round(hourly, 2)}
+                     ).to_csv(f"{table_path}{files['EC Hourly']}", index=False)
+
+        buildings.append(dict(files, **{'Building_ID': building_id, 'Location': location, 'Name': f"B{building_id}"}))
+
+    registry = pd.DataFrame(buildings)[['Building_ID', 'Location', 'Name', 'Hybrid DB', 'ED DB', 'EC Daily', 'EC Minutely']]
+    registry.to_excel(os.path.join(input_path, REGISTRY_FILENAME), sheet_name='Sheet1', index=False)
+
+    manifest = {'version': BENCHMARK_VERSION,
+                'params': {'n_buildings': n_buildings, 'history_days': history_days, 'library_days': library_days,
+                           'grid': grid, 'n_locations': n_locations, 'n_ed_tables': n_ed_tables, 'seed': seed},
+                'buildings': buildings}
+    with open(os.path.join(root, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_fleet(root, **params):
+    """
+    Return the manifest of the fleet in root, generating it first if it is missing or was built with other parameters.
+    """
+    try:
+        with open(os.path.join(root, MANIFEST_FILENAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None or manifest.get('version') != BENCHMARK_VERSION or any(
+            manifest['params'].get(key) != value for key, value in params.items()):
+        manifest = generate_fleet(root, **params)
+    return manifest
+
+def _fleet_config(root):
+    return {'Table Info': {'table_path': os.path.join(root, 'STORAGE', '')},
+            'Filepath': {'input_path': os.path.join(root, 'INPUT', '')},
+            'User Variables': dict(zip(('setpoint_temperature_machine', 'setpoint_humidity_machine',
+                                        'setpoint_temperature_office_heating', 'setpoint_temperature_office_cooling'), SETPOINTS))}
+
+def stage_calls(stage, root, manifest, workers=1):
+    """
+    Build the calls of one stage for a run over the fleet.
+
+    Returns:
+        list: (items, function of a TableSession) pairs; items is the number of buildings one call covers.
+    """
+    table_path = os.path.join(root, 'STORAGE', '')
+    input_path = os.path.join(root, 'INPUT', '')
+    buildings = manifest['buildings']
+
+    def weather(b):
+        return (os.path.join(root, 'STORAGE', 'WD', b['Location'], 'TEM'), os.path.join(root, 'STORAGE', 'WD', b['Location'], 'HUM'),
+                input_path, f"Pred_{b['Location']}_Tem_hourly.csv", f"Pred_{b['Location']}_Hum_hourly.csv")
+
+    def predicted_consumption():
+        session = TableSession()
+        return {b['Building_ID']: float(np.ravel(predict_energy(table_path, b['Hybrid DB'], b['ED DB'], 'EC', 'ED', *weather(b), 1,
+                                                                *SETPOINTS, session=session))[0]) for b in buildings}
+
+    if stage == 'similar_weather_days':
+        locations = {b['Location']: b for b in buildings}.values()
+        return [(1, lambda s, b=b: similar_weather_days(*weather(b), s)) for b in locations]
+    if stage == 'access_table':
+        indices = {b['Location']: similar_weather_days(*weather(b)) for b in buildings}
+        return [(1, lambda s, b=b: access_table(table_path, b['ED DB'], *indices[b['Location']], 1, *SETPOINTS, s)) for b in buildings]
+    if stage == 'auto_profile':
+        return [(1, lambda s, b=b: auto_profile(table_path, b['EC Minutely'], s)) for b in buildings]
+    if stage == 'allocate_energy_consumption':
+        predicted = predicted_consumption()
+        return [(1, lambda s, b=b: allocate_energy_consumption(table_path, b['EC Minutely'], predicted[b['Building_ID']], session=s))
+                for b in buildings]
+    if stage == 'arima_model':
+        return [(1, lambda s, b=b: arima_model(table_path, b['EC Daily'], 'eg_value', session=s)) for b in buildings]
+    if stage == 'predict_energy':
+        return [(1, lambda s, b=b: predict_energy(table_path, b['Hybrid DB'], b['ED DB'], 'EC', 'ED', *weather(b), 1, *SETPOINTS, session=s))
+                for b in buildings]
+    if stage == 'advice_service':
+        predicted = predicted_consumption()
+        return [(1, lambda s, b=b: advice_service(table_path, b['ED DB'], b['Hybrid DB'], *weather(b), 'EC', 'ED', predicted[b['Building_ID']], *SETPOINTS,
+                                                  TARGET_ES, session=s, sch=1)) for b in buildings]
+    if stage == 'degree_hour_training':
+        next_day = pd.read_csv(f"{input_path}Next_day_hourly_temperature.csv")
+
+        def train(s, b):
+            model = online_energy_model(f"{table_path}TEM_HOUR_{b['Location']}.csv", f"{table_path}{b['EC Hourly']}", session=s)
+            return predict_next_day_energy(model, next_day.copy())
+        return [(1, lambda s, b=b: train(s, b)) for b in buildings]
+    if stage == 'fleet':
+        building_data = pd.DataFrame(buildings).set_index('Building_ID')
+        jobs = building_jobs(building_data, _fleet_config(root), os.path.join(root, 'STORAGE', 'WD'))
+        return [(len(jobs), lambda s: run_fleet(jobs, max_workers=workers, session=s))]
+    raise ValueError(f"Unknown stage '{stage}'; use one of {', '.join(STAGES)}.")
+
+def _summary(latencies, items):
+    latencies = np.asarray(latencies)
+    total = float(latencies.sum())
+    return {'calls': len(latencies), 'items': int(items), 'total_s': total,
+            'throughput_per_s': items / total if total > 0 else None,
+            'latency_ms': {'mean': float(latencies.mean() * 1e3), 'p50': float(np.percentile(latencies, 50) * 1e3),
+                           'p90': float(np.percentile(latencies, 90) * 1e3), 'p99': float(np.percentile(latencies, 99) * 1e3),
+                           'max': float(latencies.max() * 1e3)}}
+
+def benchmark_stage(stage, root, manifest, rounds=3, warmup=1, workers=1):
+    """
+    Time one stage over the fleet.
+
+    Every round runs all calls of the stage on a fresh TableSession, as one pipeline run would.
+    Warm-up rounds (which also write the sidecars and stores a steady-state run finds on disk) are
+    not timed. Peak memory is the peak of Python allocations over one extra round under tracemalloc,
+    kept apart so that tracing does not distort the timings.
+
+    Returns:
+        dict: Calls, items, total seconds, throughput (buildings per second), latency percentiles
+              in milliseconds and peak memory in bytes.
+    """
+    calls = stage_calls(stage, root, manifest, workers)
+    for _ in range(warmup):
+        session = TableSession()
+        for _, call in calls:
+            call(session)
+
+    latencies = []
+    for _ in range(rounds):
+        session = TableSession()
+        for _, call in calls:
+            start = time.perf_counter()
+            call(session)
+            latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        session = TableSession()
+        for _, call in calls:
+            call(session)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    result = _summary(latencies, rounds * sum(items for items, _ in calls))
+    result['peak_memory_bytes'] = int(peak)
+    return result
+
+def _environment():
+    import numpy
+    import pandas
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'numpy': numpy.__version__, 'pandas': pandas.__version__}
+
+_IMPORT_PROBE = """
+import sys, time, json, importlib.util
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('startup_probe', {path!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({{'seconds': time.perf_counter() - start, 'backends': [m for m in {backends!r} if m in sys.modules]}}))
+"""
+
+_METHOD_PROBE = """
+import sys, time, json, warnings
+warnings.filterwarnings('ignore')
+start = time.perf_counter()
+from Benchmark import run_method_probe
+run_method_probe({method!r}, {root!r})
+print(json.dumps({{'seconds': time.perf_counter() - start, 'backends': [m for m in {backends!r} if m in sys.modules]}}))
+"""
+
+def _probe(code):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], cwd=PACKAGE_DIR, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - start
+    return result
+
+def run_method_probe(method, root):
+    """
+    Run one prediction method for the first building of a synthetic fleet (used in a fresh process).
+    """
+    with open(os.path.join(root, MANIFEST_FILENAME), encoding='utf-8') as f:
+        b = json.load(f)['buildings'][0]
+    table_path = os.path.join(root, 'STORAGE', '')
+    input_path = os.path.join(root, 'INPUT', '')
+    weather = (os.path.join(root, 'STORAGE', 'WD', b['Location'], 'TEM'), os.path.join(root, 'STORAGE', 'WD', b['Location'], 'HUM'),
+               input_path, f"Pred_{b['Location']}_Tem_hourly.csv", f"Pred_{b['Location']}_Hum_hourly.csv")
+    session = TableSession()
+    if method == 'degree-hour':
+        model = online_energy_model(f"{table_path}TEM_HOUR_{b['Location']}.csv", f"{table_path}{b['EC Hourly']}", session=session)
+        predict_next_day_energy(model, pd.read_csv(f"{input_path}Next_day_hourly_temperature.csv"))
+    elif method == 'hybrid-advice':
+        predicted = float(np.ravel(predict_energy(table_path, b['Hybrid DB'], b['ED DB'], 'EC', 'ED', *weather, 1, *SETPOINTS, session=session))[0])
+        allocate_energy_consumption(table_path, b['EC Minutely'], predicted, session=session)
+        advice_service(table_path, b['ED DB'], b['Hybrid DB'], *weather, 'EC', 'ED', predicted, *SETPOINTS, TARGET_ES, session=session, sch=1)
+    elif method == 'arima':
+        allocate_energy_consumption(table_path, b['EC Minutely'], arima_model(table_path, b['EC Daily'], 'eg_value', session=session), session=session)
+    else:
+        raise ValueError(f"Unknown method '{method}'; use one of {', '.join(METHOD_FORBIDDEN)}.")
+
+def startup_benchmark(root=None, repeat=3, budget=STARTUP_BUDGET_S):
+    """
+    Measure the startup cost of the entry points and the backends each prediction method loads.
+
+    Every measurement runs in a fresh interpreter. For an entry point, 'import_s' is the time to
+    import the module and 'process_s' also includes interpreter startup; both are medians over
+    repeat runs. With a fleet root, each method of METHOD_FORBIDDEN is run once for one building
+    and the backends it loaded are checked.
+
+    Returns:
+        dict: 'budget_s', 'modules' (name -> timings, loaded backends, over_budget) and 'methods'
+              (name -> seconds, loaded backends, forbidden backends that were loaded).
+    """
+    result = {'budget_s': budget, 'modules': {}, 'methods': {}}
+    for name in STARTUP_MODULES:
+        code = _IMPORT_PROBE.format(path=os.path.join(PACKAGE_DIR, f"{name}.py"), backends=BACKENDS)
+        try:
+            runs = [_probe(code) for _ in range(repeat)]
+        except (subprocess.CalledProcessError, ValueError) as e:
+            result['modules'][name] = {'error': getattr(e, 'stderr', None) or str(e)}
+            continue
+        import_s = float(np.median([r['seconds'] for r in runs]))
+        result['modules'][name] = {'import_s': import_s, 'process_s': float(np.median([r['process_s'] for r in runs])),
+                                   'backends': runs[0]['backends'], 'over_budget': import_s > budget or bool(runs[0]['backends'])}
+
+    if root is not None:
+        for method, forbidden in METHOD_FORBIDDEN.items():
+            try:
+                probe = _probe(_METHOD_PROBE.format(method=method, root=root, backends=BACKENDS))
+            except (subprocess.CalledProcessError, ValueError) as e:
+                result['methods'][method] = {'error': getattr(e, 'stderr', None) or str(e)}
+                continue
+            result['methods'][method] = {'seconds': probe['seconds'], 'backends': probe['backends'],
+                                         'forbidden_loaded': [m for m in probe['backends'] if m in forbidden]}
+    return result
+
+def startup_failed(startup):
+    return (any(r.get('over_budget') or 'error' in r for r in startup['modules'].values())
+            or any(r.get('forbidden_loaded') or 'error' in r for r in startup['methods'].values()))
+
+def run_benchmarks(root=DEFAULT_ROOT, stages=STAGES, rounds=3, warmup=1, workers=1, startup=False,
+                   startup_budget=STARTUP_BUDGET_S, **params):
+    """
+    Generate (or reuse) a synthetic fleet and time the given stages on it.
+
+    Parameters:
+        root (str): Folder of the synthetic fleet.
+        stages (list): Stages from STAGES.
+        rounds (int): Timed rounds per stage.
+        warmup (int): Untimed rounds per stage.
+        workers (int): Worker processes of the fleet stage.
+        startup (bool): Also run startup_benchmark.
+        startup_budget (float): Import-time budget in seconds of every entry point.
+        **params: Fleet parameters for generate_fleet.
+
+    Returns:
+        dict: Machine-readable results with the fleet parameters, environment and per-stage metrics.
+    """
+    manifest = load_fleet(root, **params)
+    results = {'version': BENCHMARK_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'fleet': manifest['params'], 'rounds': rounds, 'warmup': warmup, 'workers': workers,
+               'environment': _environment(), 'stages': {}}
+    for stage in stages:
+        try:
+            results['stages'][stage] = benchmark_stage(stage, root, manifest, rounds, warmup, workers)
+        except Exception as e:
+            results['stages'][stage] = {'error': f"{type(e).__name__}: {e}"}
+    if startup:
+        results['startup'] = startup_benchmark(root, budget=startup_budget)
+    return results
+
+def compare_results(results, baseline, tolerance=TOLERANCE):
+    """
+    Compare benchmark results against a baseline.
+
+    Median latency, peak memory and entry-point import time regress when they grow, throughput
+    when it drops, by more than the relative tolerance.
+
+    Returns:
+        list: One dict per stage and metric (stage, metric, baseline, current, change, regression).
+    """
+    metrics = (('p50_ms', lambda r: r['latency_ms']['p50'], 1), ('p99_ms', lambda r: r['latency_ms']['p99'], 1),
+               ('throughput_per_s', lambda r: r['throughput_per_s'], -1), ('peak_memory_bytes', lambda r: r['peak_memory_bytes'], 1))
+    rows = []
+    for stage, current in results['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if previous is None or 'error' in current or 'error' in previous:
+            continue
+        for metric, value, sign in metrics:
+            old, new = value(previous), value(current)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            rows.append({'stage': stage, 'metric': metric, 'baseline': old, 'current': new, 'change': change,
+                         'regression': sign * change > tolerance})
+
+    for name, current in results.get('startup', {}).get('modules', {}).items():
+        previous = baseline.get('startup', {}).get('modules', {}).get(name)
+        if previous is None or 'error' in current or 'error' in previous:
+            continue
+        change = (current['import_s'] - previous['import_s']) / previous['import_s']
+        rows.append({'stage': f"startup:{name}", 'metric': 'import_s', 'baseline': previous['import_s'],
+                     'current': current['import_s'], 'change': change, 'regression': change > tolerance})
+    return rows
+
+def print_results(results, comparison=None):
+    print(f"Fleet: {results['fleet']}")
+    print(f"{'stage':<30}{'calls':>7}{'items/s':>12}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'peak MiB':>10}")
+    for stage, r in results['stages'].items():
+        if 'error' in r:
+            print(f"{stage:<30} failed: {r['error']}")
+            continue
+        latency = r['latency_ms']
+        print(f"{stage:<30}{r['calls']:>7}{r['throughput_per_s']:>12.2f}{latency['p50']:>11.2f}{latency['p90']:>11.2f}"
+              f"{latency['p99']:>11.2f}{r['peak_memory_bytes'] / 2 ** 20:>10.1f}")
+    startup = results.get('startup')
+    if startup:
+        print(f"{'entry point':<30}{'import s':>10}{'process s':>11}  backends (budget {startup['budget_s']:.2f} s)")
+        for name, r in startup['modules'].items():
+            if 'error' in r:
+                print(f"{name:<30} failed: {r['error']}")
+                continue
+            flag = 'OVER BUDGET' if r['over_budget'] else ''
+            print(f"{name:<30}{r['import_s']:>10.3f}{r['process_s']:>11.3f}  {', '.join(r['backends']) or '-'} {flag}")
+        for method, r in startup['methods'].items():
+            if 'error' in r:
+                print(f"method {method:<23} failed: {r['error']}")
+                continue
+            flag = f"LOADED {', '.join(r['forbidden_loaded'])}" if r['forbidden_loaded'] else ''
+            print(f"method {method:<23}{r['seconds']:>10.3f}{'':>11}  {', '.join(r['backends']) or '-'} {flag}")
+    for row in comparison or []:
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['stage']:<30}{row['metric']:<20}{row['baseline']:>14.4g} -> {row['current']:<14.4g}{row['change']:>+8.1%} {flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic fleet.")
+    parser.add_argument('--root', default=DEFAULT_ROOT, help="Folder of the synthetic fleet; regenerated when the parameters change")
+    parser.add_argument('--buildings', type=int, default=10, help="Number of buildings")
+    parser.add_argument('--history-days', dest='history_days', type=int, default=180, help="Days of consumption history per building")
+    parser.add_argument('--library-days', dest='library_days', type=int, default=20, help="Reference weather days per location")
+    parser.add_argument('--grid', type=int, default=20, help="Weather classes per axis of the ED tables")
+    parser.add_argument('--locations', type=int, default=3, help="Number of locations")
+    parser.add_argument('--ed-tables', dest='ed_tables', type=int, default=3, help="Number of distinct ED tables")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='*', choices=STAGES, default=list(STAGES), help="Stages to time; none to only measure startup")
+    parser.add_argument('--rounds', type=int, default=3, help="Timed rounds per stage")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed rounds per stage")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes of the fleet stage")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Relative change reported as a regression")
+    parser.add_argument('--startup', action='store_true', help="Also measure entry-point import time and the backends each method loads")
+    parser.add_argument('--startup-budget', dest='startup_budget', type=float, default=STARTUP_BUDGET_S,
+                        help="Import-time budget in seconds of every entry point")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.root, args.stages, args.rounds, args.warmup, args.workers, args.startup, args.startup_budget,
+                             n_buildings=args.buildings, history_days=args.history_days, library_days=args.library_days,
+                             grid=args.grid, n_locations=args.locations, n_ed_tables=args.ed_tables, seed=args.seed)
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('fleet') != results['fleet']:
+            print(f"Warning: the baseline was measured on another fleet ({baseline.get('fleet')}).")
+        comparison = compare_results(results, baseline, args.tolerance)
+    print_results(results, comparison)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results if comparison is None else dict(results, comparison=comparison), f, indent=2)
+        print(f"Wrote {args.output}")
+    failed = (any('error' in r for r in results['stages'].values()) or any(row['regression'] for row in comparison or [])
+              or ('startup' in results and startup_failed(results['startup'])))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
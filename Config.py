@@ -1,6 +1,9 @@
 import configparser
 import os
 
+# Root folder of the deployed system (configuration files, INPUT and STORAGE)
+IASYSTEM_ROOT = os.path.join('C:\\', 'Users', 'tklee', 'Desktop', 'IASYSTEM')
+
 def create_config_file(filename):
     """Creates and writes default settings to a configuration file."""
     config = configparser.ConfigParser()
@@ -39,6 +42,9 @@ def create_config_file(filename):
         'Target_Value_of_Energy_Saving': '500'
     }
 
+    # ARIMA order of the daily forecast: 'p, d, q', or 'auto' for a cached per-building order search
+    config['ARIMA'] = {'Order': '1, 1, 0'}
+
     # Save to file
     with open(filename, 'w', encoding='utf-8') as configfile:
         config.write(configfile)
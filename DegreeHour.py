@@ -1,21 +1,29 @@
+import os
+import io
+import json
+import hashlib
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from Session import load_table
+from TableStore import file_signature
+from Trace import traced
 
-def load_data(temperature_file, energy_file):
+@traced
+def load_data(temperature_file, energy_file, session=None):
     """
     Load temperature and energy data from CSV files.
     
     Args:
     temperature_file (str): Path to the CSV file containing hourly temperatures.
     energy_file (str): Path to the CSV file containing hourly energy consumption.
+    session (TableSession, optional): Run session that shares loaded tables.
     
     Returns:
     DataFrame, DataFrame: DataFrames containing the temperature and energy data.
     """
     try:
-        temp_df = pd.read_csv(temperature_file)
-        energy_df = pd.read_csv(energy_file)
+        temp_df = load_table(temperature_file, session)
+        energy_df = load_table(energy_file, session)
 
         # Ensure no missing values
         temp_df = temp_df.dropna()
@@ -47,15 +55,18 @@ def calculate_degree_hours(temp_df, threshold=18):
     threshold (float): The temperature threshold for calculating degree hours.
 
     Returns:
-    DataFrame: Updated DataFrame with additional 'Cooling_Degree_Hours' and 'Heating_Degree_Hours' columns.
+    DataFrame: Updated DataFrame with additional 'Cooling_Degree_Hours' and 'Heating_Degree_Hours' columns,
+    and 'Degree_Hours' holding the heating degree hours.
     """
     try:
         # Cooling Degree Hours: Positive when temperature is above the threshold
-        temp_df['Degree_Hours'] = np.where(temp_df['Temperature'] > threshold,
+        temp_df['Cooling_Degree_Hours'] = np.where(temp_df['Temperature'] > threshold,
                                                    temp_df['Temperature'] - threshold, 0)
         # Heating Degree Hours: Positive when temperature is below the threshold
-        temp_df['Degree_Hours'] = np.where(temp_df['Temperature'] < threshold,
+        temp_df['Heating_Degree_Hours'] = np.where(temp_df['Temperature'] < threshold,
                                                    threshold - temp_df['Temperature'], 0)
+        # The single-feature models (train_energy_model, OnlineDegreeHourModel) use the heating degree hours
+        temp_df['Degree_Hours'] = temp_df['Heating_Degree_Hours']
         temp_df = pd.DataFrame(temp_df)
         return temp_df
     except KeyError:
@@ -66,6 +77,7 @@ def calculate_degree_hours(temp_df, threshold=18):
         raise
 
 
+@traced
 def train_energy_model(temp_df, energy_df):
     """
     Train a linear regression model using degree hours as the feature for predicting energy consumption.
@@ -77,6 +89,7 @@ def train_energy_model(temp_df, energy_df):
     Returns:
     LinearRegression: A trained linear regression model.
     """
+    from sklearn.linear_model import LinearRegression  # Only the batch model needs scikit-learn
     try:
         model = LinearRegression()
         model.fit(temp_df[['Degree_Hours']], energy_df['eg_value'])
@@ -88,6 +101,7 @@ def train_energy_model(temp_df, energy_df):
         print(f"Error during model training: {e}")
         raise
 
+@traced
 def predict_next_day_energy(model, next_day_temp_df, threshold=18):
     """
     Predict the next day's hourly energy consumption based on degree hours calculated from hourly temperature data.
@@ -110,3 +124,370 @@ def predict_next_day_energy(model, next_day_temp_df, threshold=18):
         print(f"Error in prediction: {e}")
         raise
 
+# Default grid of balance-point temperatures searched by fit_balance_point
+BALANCE_POINTS = np.arange(10.0, 26.5, 0.5)
+
+def degree_hour_features(temperature, bases):
+    """
+    Compute heating and cooling degree hours of a temperature series against many base temperatures.
+
+    Args:
+    temperature (array-like): Hourly temperatures of shape (n,).
+    bases (array-like): Base temperatures of shape (B,).
+
+    Returns:
+    np.array, np.array: Heating and cooling degree hours, each of shape (B, n).
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)[None, :]
+    bases = np.asarray(bases, dtype=np.float64)[:, None]
+    return np.maximum(bases - temperature, 0), np.maximum(temperature - bases, 0)
+
+def _hour_groups(n, hours, per_hour):
+    if not per_hour:
+        return np.zeros(n, dtype=np.int64), 1
+    hours = np.arange(n) if hours is None else np.asarray(hours)
+    return hours.astype(np.int64) % 24, 24
+
+@traced
+def fit_balance_point(temperature, energy, bases=BALANCE_POINTS, hours=None, per_hour=False):
+    """
+    Fit energy ~ intercept + heating degree hours + cooling degree hours for a grid of balance points
+    and pick the best balance point of every building.
+
+    All candidate bases, hour-of-day groups and buildings are solved together: the design matrices
+    are stacked into one (bases, groups, rows, 3) array and solved with a batched pseudo-inverse,
+    so the search costs a handful of array operations instead of one scikit-learn fit per base.
+
+    Args:
+    temperature (array-like): Hourly outdoor temperatures of shape (n,).
+    energy (array-like): Hourly energy consumption of shape (n,) or (n, m) for m buildings on the same weather.
+    bases (array-like): Candidate balance-point temperatures.
+    hours (array-like, optional): Hour of every row (taken modulo 24); defaults to rows starting at midnight.
+    per_hour (bool): Fit a separate model for each hour of the day.
+
+    Returns:
+    dict: 'bases', 'sse' of shape (B, m), and for every building the best 'base', its 'coef' of shape
+    (groups, 3) as (intercept, heating, cooling) and 'rmse'. Single-building input drops the m axis.
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)
+    energy = np.asarray(energy, dtype=np.float64)
+    single = energy.ndim == 1
+    energy = energy[:, None] if single else energy
+    bases = np.asarray(bases, dtype=np.float64)
+    n, m = energy.shape
+    if len(temperature) != n:
+        raise ValueError("Temperature and energy data must have the same number of rows.")
+
+    groups, n_groups = _hour_groups(n, hours, per_hour)
+    counts = np.bincount(groups, minlength=n_groups)
+    order = np.argsort(groups, kind='stable')
+    slots = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # Groups padded with zero rows, which do not change a least-squares solution
+    heating, cooling = degree_hour_features(temperature, bases)
+    design = np.zeros((len(bases), n_groups, counts.max(), 3))
+    design[:, groups[order], slots, 0] = 1.0
+    design[:, groups[order], slots, 1] = heating[:, order]
+    design[:, groups[order], slots, 2] = cooling[:, order]
+
+    # Center the target per group so the residual sum of squares does not suffer from cancellation
+    means = np.zeros((n_groups, m))
+    np.add.at(means, groups, energy)
+    means /= np.maximum(counts, 1)[:, None]
+    target = np.zeros((n_groups, counts.max(), m))
+    target[groups[order], slots] = energy[order] - means[groups[order]]
+
+    coef = np.linalg.pinv(design) @ target[None]  # (B, groups, 3, m)
+    projected = np.einsum('bgrk,grm->bgkm', design, target)
+    sse = (target ** 2).sum(axis=(0, 1))[None, :] - np.einsum('bgkm,bgkm->bm', projected, coef)
+    coef[:, :, 0, :] += means[None]
+
+    best = np.argmin(sse, axis=0)
+    result = {
+        'bases': bases,
+        'sse': sse,
+        'base': bases[best],
+        'coef': coef[best, :, :, np.arange(m)],
+        'rmse': np.sqrt(np.maximum(sse[best, np.arange(m)], 0) / n),
+        'per_hour': per_hour
+    }
+    if single:
+        result.update(sse=sse[:, 0], base=result['base'][0], coef=result['coef'][0], rmse=result['rmse'][0])
+    return result
+
+def predict_balance_point(fit, temperature, hours=None):
+    """
+    Predict hourly energy consumption with the best balance-point models from fit_balance_point.
+
+    Args:
+    fit (dict): Result of fit_balance_point.
+    temperature (array-like): Hourly temperatures of shape (n,).
+    hours (array-like, optional): Hour of every row; defaults to rows starting at midnight.
+
+    Returns:
+    np.array: Predictions of shape (n,), or (n, m) for a multi-building fit.
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)
+    base = np.atleast_1d(fit['base'])
+    coef = fit['coef'] if np.ndim(fit['base']) else fit['coef'][None]
+    groups, _ = _hour_groups(len(temperature), hours, fit['per_hour'])
+
+    heating, cooling = degree_hour_features(temperature, base)  # (m, n)
+    terms = coef[:, groups, :]  # (m, n, 3)
+    predicted = terms[:, :, 0] + terms[:, :, 1] * heating + terms[:, :, 2] * cooling
+    return predicted.T if np.ndim(fit['base']) else predicted[0]
+
+class OnlineDegreeHourModel:
+    """
+    Least-squares fit of energy consumption on degree hours that is updated one observation at a time.
+
+    The model keeps the sufficient statistics of the fit (total weight, means of x and y and the
+    centered sums of x*x and x*y, which carry the same information as the sums of x, y, x², xy
+    and the count but do not lose precision to cancellation). An update costs O(1) per observation
+    and predicting reads no files. With forgetting < 1 older observations are discounted by that
+    factor per new observation; forgetting = 1 reproduces train_energy_model exactly.
+
+    Args:
+    forgetting (float): Exponential forgetting factor in (0, 1].
+    threshold (float): Degree-hour threshold the features were computed with.
+    """
+
+    def __init__(self, forgetting=1.0, threshold=18):
+        if not 0 < forgetting <= 1:
+            raise ValueError("The forgetting factor must be in (0, 1].")
+        self.forgetting = float(forgetting)
+        self.threshold = threshold
+        self.weight = 0.0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+        self.rows = 0
+
+    def update(self, x, y):
+        """
+        Fold one observation, or arrays of observations in time order, into the model.
+
+        Args:
+        x (float or array-like): Degree hours.
+        y (float or array-like): Energy consumption.
+
+        Returns:
+        OnlineDegreeHourModel: The model itself.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if x.shape != y.shape:
+            raise ValueError("Degree hours and energy consumption must have the same length.")
+        if len(x) == 0:
+            return self
+
+        # Statistics of the batch, the newest observation weighted 1
+        w = self.forgetting ** np.arange(len(x) - 1, -1, -1, dtype=np.float64)
+        batch_weight = w.sum()
+        batch_mx = np.dot(w, x) / batch_weight
+        batch_my = np.dot(w, y) / batch_weight
+        batch_sxx = np.dot(w, (x - batch_mx) ** 2)
+        batch_sxy = np.dot(w, (x - batch_mx) * (y - batch_my))
+
+        # Merge with the discounted history
+        decay = self.forgetting ** len(x)
+        old_weight = self.weight * decay
+        weight = old_weight + batch_weight
+        dx, dy = batch_mx - self.mean_x, batch_my - self.mean_y
+        share = old_weight * batch_weight / weight
+        self.sxx = self.sxx * decay + batch_sxx + dx * dx * share
+        self.sxy = self.sxy * decay + batch_sxy + dx * dy * share
+        self.mean_x += dx * batch_weight / weight
+        self.mean_y += dy * batch_weight / weight
+        self.weight = weight
+        self.rows += len(x)
+        return self
+
+    @property
+    def coef_(self):
+        return np.array([self.sxy / self.sxx if self.sxx > 0 else 0.0])
+
+    @property
+    def intercept_(self):
+        return self.mean_y - self.coef_[0] * self.mean_x
+
+    def predict(self, X):
+        """
+        Predict energy consumption from degree hours.
+
+        Args:
+        X (DataFrame or array-like): Degree hours, as a 'Degree_Hours' column or a plain array.
+
+        Returns:
+        np.array: Predicted energy consumption.
+        """
+        if self.rows == 0:
+            raise ValueError("The model has not been given any observations.")
+        if isinstance(X, pd.DataFrame):
+            X = X['Degree_Hours'] if 'Degree_Hours' in X else X.iloc[:, 0]
+        return self.intercept_ + self.coef_[0] * np.ravel(np.asarray(X, dtype=np.float64))
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in ('forgetting', 'threshold', 'weight', 'mean_x', 'mean_y', 'sxx', 'sxy', 'rows')}
+
+    @classmethod
+    def from_dict(cls, state):
+        model = cls(state['forgetting'], state['threshold'])
+        for key in ('weight', 'mean_x', 'mean_y', 'sxx', 'sxy', 'rows'):
+            setattr(model, key, state[key])
+        return model
+
+# Bytes read at a time when searching a table backwards for its last row
+TAIL_BLOCK = 4096
+
+def _model_state_file(state_path, energy_file):
+    return os.path.join(state_path, f"{os.path.splitext(os.path.basename(energy_file))[0]}_degree_hour.json")
+
+def save_online_model(model, state_file, marks=None, sources=None):
+    """
+    Write the state of an online model as JSON, together with the mark of the last row it was
+    fitted on in each table and the signatures of the tables.
+    """
+    try:
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        tmp_file = f"{state_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'model': model.to_dict(), 'marks': marks, 'sources': sources}, f)
+        os.replace(tmp_file, state_file)
+    except OSError as e:
+        print(f"Could not save the degree hour model: {e}")
+
+def load_online_state(state_file):
+    """
+    Read the state saved by save_online_model.
+
+    Returns:
+    tuple: (model, table marks, sources), or (None, None, None) if there is no usable state.
+    """
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            state = json.load(f)
+        marks = {name: dict(state['marks'][name]) for name in ('temperature', 'energy')}
+        return OnlineDegreeHourModel.from_dict(state['model']), marks, state.get('sources')
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None, None
+
+def load_online_model(state_file):
+    """
+    Read an online model saved by save_online_model, or return None if there is none.
+    """
+    return load_online_state(state_file)[0]
+
+def _last_line_start(f, end):
+    # Search backwards block by block; a newline ending the file does not start a line
+    position, block = end, b''
+    while position > 0:
+        step = min(TAIL_BLOCK, position)
+        position -= step
+        f.seek(position)
+        block = f.read(step) + block
+        newline = block.rfind(b'\n', 0, len(block) - 1)
+        if newline >= 0:
+            return position + newline + 1
+    return 0
+
+def _table_mark(f, end, rows):
+    """
+    Mark of the last row of an open table: the rows folded, the end offset of the fitted bytes, and
+    the start offset and digest of the last line.
+    """
+    start = _last_line_start(f, end)
+    f.seek(start)
+    return {'rows': rows, 'offset': end, 'start': start, 'digest': hashlib.sha1(f.read(end - start)).hexdigest()}
+
+def table_mark(path, rows):
+    """
+    _table_mark of a table file as it is on disk.
+    """
+    with open(path, 'rb') as f:
+        return _table_mark(f, f.seek(0, os.SEEK_END), rows)
+
+def read_appended_rows(path, mark):
+    """
+    Read only the rows appended to a table after a mark from table_mark.
+
+    Returns:
+    tuple: (appended rows without NaNs, new mark), or None when the marked last row is no longer in
+    place, i.e. the table was rewritten, truncated or appended to without a line break.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.readline()
+            end = f.seek(0, os.SEEK_END)
+            if end < mark['offset']:
+                return None
+            f.seek(mark['start'])
+            last_line = f.read(mark['offset'] - mark['start'])
+            if hashlib.sha1(last_line).hexdigest() != mark['digest']:
+                return None
+            appended = f.read()
+            if not appended:
+                return pd.read_csv(io.BytesIO(header)), mark
+            if not last_line.endswith(b'\n'):
+                return None
+            df = pd.read_csv(io.BytesIO(header + appended)).dropna()
+            return df, _table_mark(f, end, mark['rows'] + len(df))
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+@traced
+def online_energy_model(temperature_file, energy_file, state_path=None, threshold=18, forgetting=1.0, session=None):
+    """
+    Bring the persisted online model of a building up to date with its hourly tables.
+
+    When neither table changed since the model was saved it is returned without reading them.
+    Otherwise only the bytes appended after the last row the model was fitted on are read and
+    folded in, so an hourly update costs O(1) in I/O and computation. The last fitted row of each
+    table is checked against its stored offset and digest; when it moved or changed (the table was
+    rewritten, edited at its end or its window rolled), or without a stored model or with other
+    settings, both tables are read in full and refitted. Edits to earlier rows that leave the last
+    fitted row in place are not detected.
+
+    Args:
+    temperature_file (str): Path to the CSV file containing hourly temperatures.
+    energy_file (str): Path to the CSV file containing hourly energy consumption.
+    state_path (str, optional): Directory where the model state of each building is kept.
+    threshold (float): The temperature threshold for calculating degree hours.
+    forgetting (float): Exponential forgetting factor in (0, 1].
+    session (TableSession, optional): Run session that shares loaded tables.
+
+    Returns:
+    OnlineDegreeHourModel: The updated model.
+    """
+    state_file = _model_state_file(state_path, energy_file) if state_path is not None else None
+    model, marks, sources = load_online_state(state_file) if state_file is not None else (None, None, None)
+    if model is not None and (model.threshold != threshold or model.forgetting != forgetting):
+        model = None
+
+    signatures = None
+    if state_file is not None:
+        signatures = {'temperature': file_signature(temperature_file), 'energy': file_signature(energy_file)}
+        if model is not None and sources == signatures:
+            return model
+
+    if model is not None and all(marks[name]['rows'] == model.rows for name in ('temperature', 'energy')):
+        temp_tail = read_appended_rows(temperature_file, marks['temperature'])
+        energy_tail = read_appended_rows(energy_file, marks['energy'])
+        if temp_tail is not None and energy_tail is not None and len(temp_tail[0]) == len(energy_tail[0]):
+            if len(temp_tail[0]):
+                new_temp = calculate_degree_hours(temp_tail[0].copy(), threshold)
+                model.update(new_temp['Degree_Hours'].to_numpy(), energy_tail[0]['eg_value'].to_numpy(dtype=np.float64))
+            save_online_model(model, state_file, {'temperature': temp_tail[1], 'energy': energy_tail[1]}, signatures)
+            return model
+
+    temp_df, energy_df = load_data(temperature_file, energy_file, session)
+    if len(temp_df) != len(energy_df):
+        raise ValueError("The hourly temperature and energy tables must have the same number of rows.")
+    model = OnlineDegreeHourModel(forgetting, threshold)
+    new_temp = calculate_degree_hours(temp_df.copy(), threshold)
+    model.update(new_temp['Degree_Hours'].to_numpy(), energy_df['eg_value'].to_numpy(dtype=np.float64))
+    if state_file is not None:
+        marks = {'temperature': table_mark(temperature_file, len(temp_df)), 'energy': table_mark(energy_file, len(energy_df))}
+        save_online_model(model, state_file, marks, signatures)
+    return model
@@ -0,0 +1,208 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# Columnar output: <output_path>/<station>/{hourly,daily}/ with one set of .npy arrays per chunk
+COLUMNAR_VERSION = 1
+DEFAULT_BASES = (18,)
+DEFAULT_CHUNKSIZE = 100_000
+KINDS = ('cooling degree hour', 'heating degree hour', 'degree hour')
+# CSV timestamp format per rollup, fixed so it does not depend on the rows of a chunk
+DATE_FORMATS = {'hourly': '%Y-%m-%d %H:%M:%S', 'daily': '%Y-%m-%d'}
+
+def degree_hour_array(temperature, bases):
+    """
+    Compute cooling, heating and total degree hours for every temperature against every base.
+
+    Parameters:
+        temperature (np.array): Hourly temperatures of shape (rows,).
+        bases (array-like): Base temperatures of shape (thresholds,).
+
+    Returns:
+        tuple: (cooling, heating, total) arrays of shape (rows, thresholds).
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)[:, None]
+    bases = np.asarray(bases, dtype=np.float64)[None, :]
+    cooling = np.where(temperature > bases, temperature - bases, 0)
+    heating = np.where(temperature <= bases, bases - temperature, 0)
+    return cooling, heating, cooling + heating
+
+def _frame(index, tem, arrays, bases):
+    columns = {'tem': tem}
+    for kind, values in zip(KINDS, arrays):
+        for j, base in enumerate(bases):
+            columns[kind if len(bases) == 1 else f"{kind} {base:g}"] = values[:, j]
+    return pd.DataFrame(columns, index=index)
+
+class _ColumnarWriter:
+    """
+    Append chunks of a rollup as numbered .npy parts and describe them in meta.json.
+    """
+
+    def __init__(self, directory, bases):
+        self.directory = directory
+        self.bases = [float(b) for b in bases]
+        self.parts = []
+        os.makedirs(directory, exist_ok=True)
+        meta_file = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_file):
+            os.remove(meta_file)  # Invalidate first so a partially written output is never read
+
+    def write(self, frame):
+        if frame.empty:
+            return
+        n = len(frame)
+        part = len(self.parts)
+        values = frame.to_numpy(dtype=np.float64)
+        arrays = {'time': frame.index.to_numpy(dtype='datetime64[s]'), 'tem': values[:, 0]}
+        for k, kind in enumerate(KINDS):
+            arrays[kind] = values[:, 1 + k * len(self.bases):1 + (k + 1) * len(self.bases)]
+        for name, array in arrays.items():
+            np.save(os.path.join(self.directory, f"{name.replace(' ', '_')}.p{part:05d}.npy"), array, allow_pickle=False)
+        self.parts.append(n)
+
+    def close(self):
+        meta = {'version': COLUMNAR_VERSION, 'bases': self.bases, 'arrays': ['time', 'tem'] + list(KINDS), 'parts': self.parts}
+        meta_file = os.path.join(self.directory, 'meta.json')
+        tmp_file = f"{meta_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, meta_file)
+
+def station_degree_hours(input_file, bases=DEFAULT_BASES, chunksize=DEFAULT_CHUNKSIZE, hourly_csv=None, daily_csv=None,
+                         columnar_path=None, encoding=None):
+    """
+    Stream one station's hourly temperature record into hourly and daily degree-hour rollups.
+
+    The input (date, temperature) is read chunksize rows at a time in chronological order. The
+    hourly rows of a chunk's last day are held back until the next chunk shows the day is
+    complete, so memory stays bounded by the chunk size and daily sums do not depend on it.
+    Daily rollups are calendar-day sums, with zero rows for missing days.
+
+    Parameters:
+        input_file (str): CSV file whose first two columns are the timestamp and the temperature.
+        bases (array-like): Base temperatures.
+        chunksize (int): Rows read per chunk.
+        hourly_csv (str, optional): Hourly CSV output.
+        daily_csv (str, optional): Daily CSV output.
+        columnar_path (str, optional): Folder for the columnar hourly/ and daily/ output.
+        encoding (str, optional): Encoding of the input file.
+
+    Returns:
+        tuple: (number of hourly rows, number of daily rows) written.
+    """
+    bases = list(bases)
+    writers = {}
+    if columnar_path is not None:
+        writers = {'hourly': _ColumnarWriter(os.path.join(columnar_path, 'hourly'), bases),
+                   'daily': _ColumnarWriter(os.path.join(columnar_path, 'daily'), bases)}
+    csv_header = {'hourly': True, 'daily': True}
+
+    def emit(kind, frame, path):
+        if kind in writers:
+            writers[kind].write(frame)
+        if path is not None and not frame.empty:
+            frame.to_csv(path, mode='w' if csv_header[kind] else 'a', header=csv_header[kind], index_label='date',
+                         date_format=DATE_FORMATS[kind])
+            csv_header[kind] = False
+
+    hourly_rows = daily_rows = 0
+    pending = None  # Hourly rows of the last, possibly incomplete, day
+    for chunk in pd.read_csv(input_file, chunksize=chunksize, encoding=encoding):
+        index = pd.DatetimeIndex(pd.to_datetime(chunk.iloc[:, 0]), name='date')
+        tem = chunk.iloc[:, 1].to_numpy(dtype=np.float64)
+        hourly = _frame(index, tem, degree_hour_array(tem, bases), bases)
+        emit('hourly', hourly, hourly_csv)
+        hourly_rows += len(hourly)
+
+        if pending is not None:
+            hourly = pd.concat([pending, hourly])
+        if hourly.empty:
+            continue
+        first_day, last_day = hourly.index[0].normalize(), hourly.index[-1].normalize()
+        pending = hourly[hourly.index >= last_day]
+        # Every day before last_day is complete, including days with no rows between the chunks
+        days = pd.date_range(first_day, periods=(last_day - first_day).days, freq='D', name='date')
+        daily = hourly[hourly.index < last_day].resample('D').sum().reindex(days, fill_value=0)
+        emit('daily', daily, daily_csv)
+        daily_rows += len(daily)
+
+    if pending is not None and not pending.empty:
+        daily = pending.resample('D').sum()
+        emit('daily', daily, daily_csv)
+        daily_rows += len(daily)
+    for writer in writers.values():
+        writer.close()
+    return hourly_rows, daily_rows
+
+def degree_hour_etl(input_files, output_path, bases=DEFAULT_BASES, chunksize=DEFAULT_CHUNKSIZE, csv=True, encoding=None):
+    """
+    Run station_degree_hours for many weather stations.
+
+    Parameters:
+        input_files (dict or list): Station name -> hourly temperature CSV; a list uses the file names as station names.
+        output_path (str): Output root; each station gets <output_path>/<station>/ with columnar
+                           hourly/ and daily/ folders and, with csv=True, hourly.csv and daily.csv.
+        bases (array-like): Base temperatures.
+        chunksize (int): Rows read per chunk.
+        csv (bool): Also write CSV rollups.
+        encoding (str, optional): Encoding of the input files.
+
+    Returns:
+        dict: Station -> (hourly rows, daily rows).
+    """
+    if not isinstance(input_files, dict):
+        input_files = {os.path.splitext(os.path.basename(path))[0]: path for path in input_files}
+
+    written = {}
+    for station, input_file in input_files.items():
+        station_path = os.path.join(output_path, station)
+        written[station] = station_degree_hours(input_file, bases, chunksize,
+                                                os.path.join(station_path, 'hourly.csv') if csv else None,
+                                                os.path.join(station_path, 'daily.csv') if csv else None,
+                                                station_path, encoding)
+    return written
+
+def read_degree_hours(path, rollup='daily'):
+    """
+    Load a columnar rollup written by station_degree_hours.
+
+    Parameters:
+        path (str): Station output folder.
+        rollup (str): 'hourly' or 'daily'.
+
+    Returns:
+        dict: bases, time, tem, and the (rows, thresholds) degree-hour arrays.
+    """
+    directory = os.path.join(path, rollup)
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported degree hour output version in {directory}.")
+
+    result = {'bases': np.asarray(meta['bases'])}
+    for name in meta['arrays']:
+        parts = [np.load(os.path.join(directory, f"{name.replace(' ', '_')}.p{part:05d}.npy"), mmap_mode='r')
+                 for part in range(len(meta['parts']))]
+        result[name] = np.concatenate(parts) if parts else np.empty(0)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hourly and daily degree hours for one or more weather stations.")
+    parser.add_argument('output_path', help="Output root; one folder per station")
+    parser.add_argument('input_files', nargs='+', help="Hourly temperature CSV files (date, temperature), one per station")
+    parser.add_argument('--bases', default='18', help="Comma-separated base temperatures, e.g. 16,18,20")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--no-csv', action='store_true', help="Write only the columnar output")
+    parser.add_argument('--encoding', default=None)
+    args = parser.parse_args(argv)
+
+    bases = [float(b) for b in args.bases.split(',')]
+    for station, (hourly, daily) in degree_hour_etl(args.input_files, args.output_path, bases, args.chunksize,
+                                                    not args.no_csv, args.encoding).items():
+        print(f"{station}: {hourly} hourly rows, {daily} daily rows")
+
+if __name__ == "__main__":
+    main()
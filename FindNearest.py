@@ -21,8 +21,130 @@ def find_nearest(data, target_value, column='Ed'):
 
     return nearest_indices
 
+def sort_column(values):
+    """
+    Sort a column once for repeated nearest-value queries.
+
+    Parameters:
+        values (array-like): Column values.
+
+    Returns:
+        tuple: (order, sorted values), where order maps sorted positions back to row positions.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(values, kind='stable')
+    return order, values[order]
+
+def k_nearest(sorted_values, targets, k=1, order=None):
+    """
+    Find the k values closest to each of many targets in a sorted column.
+
+    Each target is located with np.searchsorted; its k nearest distances are among the 2k values
+    around that position, so the k-th distance is found by partitioning that window. Values strictly
+    closer than the k-th distance are taken from the window, and the values at exactly that distance
+    from the heads of their runs of equal values, where the rows are in ascending order (sort_column
+    sorts stably). A batch costs O(m k log n) for m targets after the O(n log n) sort. Equal
+    distances are ordered by row position, as in find_nearest; NaN values at the end of the sorted
+    column are never returned.
+
+    Parameters:
+        sorted_values (np.array): Column values in ascending order.
+        targets (array-like): Target values.
+        k (int): Number of neighbours per target.
+        order (np.array, optional): Row positions of the sorted values, as returned by sort_column.
+
+    Returns:
+        tuple: (indices, distances), both of shape (m, k). Indices are row positions when order is
+               given, otherwise positions in sorted_values; missing neighbours are -1 with distance inf.
+    """
+    targets = np.atleast_1d(np.asarray(targets, dtype=np.float64))
+    sorted_values = np.asarray(sorted_values, dtype=np.float64)
+    n = len(sorted_values) - int(np.isnan(sorted_values).sum())
+    sorted_values = sorted_values[:n]
+    rows = np.arange(n) if order is None else np.asarray(order)[:n]
+    if n == 0 or k <= 0:
+        return np.full((len(targets), max(k, 0)), -1), np.full((len(targets), max(k, 0)), np.inf)
+
+    # Window of the k positions on either side of each target
+    pos = np.searchsorted(sorted_values, targets)
+    window = pos[:, None] + np.arange(-k, k)
+    valid = (window >= 0) & (window < n)
+    window = np.clip(window, 0, n - 1)
+    values = sorted_values[window]
+    distances = np.where(valid, np.abs(values - targets[:, None]), np.inf)
+    distances[np.isnan(distances)] = np.inf
+    kth = np.partition(distances, k - 1, axis=1)[:, k - 1:k]
+
+    # Values at the k-th distance lie in at most one run below the target and one at or above it
+    tied = valid & (distances == kth) & np.isfinite(kth)
+    heads = []
+    for half in (slice(0, k), slice(k, 2 * k)):
+        has_run = tied[:, half].any(axis=1)
+        run_value = np.take_along_axis(values[:, half], tied[:, half].argmax(axis=1)[:, None], axis=1)[:, 0]
+        start = np.searchsorted(sorted_values, run_value, 'left')
+        stop = np.searchsorted(sorted_values, run_value, 'right')
+        head = start[:, None] + np.arange(k)
+        heads.append((np.clip(head, 0, n - 1), has_run[:, None] & (head < stop[:, None])))
+
+    positions = np.concatenate([window] + [head for head, _ in heads], axis=1)
+    closer = valid & (distances < kth)
+    distances = np.concatenate([np.where(closer, distances, np.inf)]
+                               + [np.where(mask, kth, np.inf) for _, mask in heads], axis=1)
+    candidates = np.where(np.isfinite(distances), rows[positions], -1)
+
+    # Rank by distance, then by row position; unused slots sort last
+    rank = np.lexsort((np.where(candidates >= 0, candidates, n), distances), axis=1)[:, :k]
+    distances = np.take_along_axis(distances, rank, axis=1)
+    indices = np.where(np.isfinite(distances), np.take_along_axis(candidates, rank, axis=1), -1)
+    return indices, distances
+
+def find_nearest_many(data, target_values, column='Ed'):
+    """
+    Batched find_nearest: for every target, the index of all rows whose column value is closest to it.
+
+    The column is sorted once; each target's tie set is the run of equal values on the nearer
+    side (or both sides when they are equally far), found by binary search. The runs of all
+    targets are gathered into one array and ordered by (target, row) in a single sort.
+
+    Parameters:
+        data (pd.DataFrame): The DataFrame to search.
+        target_values (array-like): The values to find the closest rows for.
+        column (str): The column in the DataFrame to compare the target values against.
+
+    Returns:
+        list: One pd.Index per target, in the row order find_nearest would return.
+    """
+    order, sorted_values = sort_column(data[column].to_numpy())
+    targets = np.atleast_1d(np.asarray(target_values, dtype=np.float64))
+    n = len(sorted_values) - int(np.isnan(sorted_values).sum())  # NaN values sort last and never match
+    sorted_values = sorted_values[:n]
+    if n == 0:
+        return [data.index[:0] for _ in targets]
+
+    pos = np.searchsorted(sorted_values, targets)
+    below = sorted_values[np.maximum(pos - 1, 0)]
+    above = sorted_values[np.minimum(pos, n - 1)]
+    below_dist = np.where(pos > 0, np.abs(below - targets), np.inf)
+    above_dist = np.where(pos < n, np.abs(above - targets), np.inf)
+    nearest = np.minimum(below_dist, above_dist)
+
+    # One segment of sorted positions per target and side; sides that are not nearest are empty
+    run_values = np.stack([below, above], axis=1).ravel()
+    taken = np.stack([below_dist == nearest, above_dist == nearest], axis=1).ravel()
+    starts = np.searchsorted(sorted_values, run_values, 'left')
+    lengths = np.where(taken, np.searchsorted(sorted_values, run_values, 'right') - starts, 0)
+
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+    target_ids = np.repeat(np.arange(len(run_values)) // 2, lengths)
+    rows = order[positions]
+    ranked = np.lexsort((rows, target_ids))
+    counts = np.bincount(target_ids, minlength=len(targets))
+    return [data.index[r] for r in np.split(rows[ranked], np.cumsum(counts)[:-1])]
+
 # Example Usage:
 # df = pd.DataFrame({'Ed': [100, 200, 300, 400, 500]})
 # target_value = 305
 # nearest_index = find_nearest(df, target_value)
 # print(f"Nearest index: {nearest_index}")
+# nearest_indexes = find_nearest_many(df, [105, 305, 480])
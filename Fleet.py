@@ -0,0 +1,184 @@
+import os
+import multiprocessing.util
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from SimilarWD import similar_weather_days
+from AutoPredict import predict_energy, regression_store_path, save_regression_store, use_regression_store
+from AutoAlloc import allocate_energy_consumption
+from AutoProfile import SLOTS_PER_DAY, new_readings_filename
+from Session import TableSession
+from Prefetch import MAX_IN_FLIGHT, prefetch_fleet
+from Trace import span, traced
+
+# Session reused by every building a worker process handles
+_WORKER_SESSION = None
+
+def fleet_workers(config, default=None):
+    """
+    Read the worker count from the optional [Fleet] section of the config ('workers = 4').
+    """
+    workers = config.get('Fleet', {}).get('workers')
+    return int(workers) if workers else default
+
+def building_jobs(building_data, config, wd_root, sch=1):
+    """
+    Describe the per-building work of a fleet run as plain dictionaries that can be sent to worker processes.
+
+    Parameters:
+        building_data (pd.DataFrame): Building registry indexed by Building_ID.
+        config (dict): Seasonal configuration.
+        wd_root (str): Root folder of the per-location weather profiles (STORAGE/WD).
+        sch (int): Schedule index.
+
+    Returns:
+        list: One job dictionary per building.
+    """
+    jobs = []
+    for building_id in building_data.index:
+        location = building_data.loc[building_id, 'Location']
+        jobs.append({
+            'building_id': building_id,
+            'location': location,
+            'table_path': config['Table Info']['table_path'],
+            'hybrid_table_filename': building_data.loc[building_id, 'Hybrid DB'],
+            'ed_table_filename': building_data.loc[building_id, 'ED DB'],
+            'ec_min_table_filename': building_data.loc[building_id, 'EC Minutely'],
+            'ec_min_input_filename': new_readings_filename(building_data.loc[building_id, 'EC Minutely']),
+            'temperature_profile_storage_path': os.path.join(wd_root, location, 'TEM'),
+            'humidity_profile_storage_path': os.path.join(wd_root, location, 'HUM'),
+            'input_path': config['Filepath']['input_path'],
+            'temperature_input_filename': f"Pred_{location}_Tem_hourly.csv",
+            'humidity_input_filename': f"Pred_{location}_Hum_hourly.csv",
+            'sch': sch,
+            'set_tem_mach': config['User Variables']['setpoint_temperature_machine'],
+            'set_hum_mach': config['User Variables']['setpoint_humidity_machine'],
+            'set_tem_oheat': config['User Variables']['setpoint_temperature_office_heating'],
+            'set_tem_ocool': config['User Variables']['setpoint_temperature_office_cooling']
+        })
+    return jobs
+
+@traced
+def location_weather_indices(jobs, session=None):
+    """
+    Run the similar-weather-day search once per location.
+
+    Returns:
+        dict: Location -> (tem_index, hum_index), or the exception raised for that location.
+    """
+    indices = {}
+    for job in jobs:
+        if job['location'] in indices:
+            continue
+        try:
+            indices[job['location']] = similar_weather_days(job['temperature_profile_storage_path'], job['humidity_profile_storage_path'],
+                                                            job['input_path'], job['temperature_input_filename'], job['humidity_input_filename'], session)
+        except Exception as e:
+            indices[job['location']] = e
+    return indices
+
+def predict_building(job, weather_indices, session=None):
+    """
+    Predict and allocate the next-day energy consumption of one building (method 2).
+
+    Returns:
+        np.array: Allocated energy consumption per 15-minute slot.
+    """
+    table_path = job['table_path']
+    with span('Fleet.predict_building', job['building_id']):
+        pred_result = predict_energy(table_path, job['hybrid_table_filename'], job['ed_table_filename'], 'EC', 'ED',
+                                     job['temperature_profile_storage_path'], job['humidity_profile_storage_path'],
+                                     job['input_path'], job['temperature_input_filename'], job['humidity_input_filename'],
+                                     job['sch'], job['set_tem_mach'], job['set_hum_mach'], job['set_tem_oheat'], job['set_tem_ocool'],
+                                     session=session, weather_indices=weather_indices)
+        allocated = allocate_energy_consumption(table_path, job['ec_min_table_filename'], pred_result, session=session,
+                                                new_readings_file=os.path.join(job['input_path'], job['ec_min_input_filename']))
+    return np.ravel(allocated)
+
+def _init_worker(regression_store):
+    """
+    Set up a worker process: spawned workers start from fresh module state, so they are pointed
+    at the parent's regression store here. Worker processes skip atexit handlers, so their fits
+    are saved by a multiprocessing finalizer when the worker exits.
+    """
+    global _WORKER_SESSION
+    _WORKER_SESSION = TableSession()
+    if regression_store is not None:
+        use_regression_store(regression_store)
+        multiprocessing.util.Finalize(None, save_regression_store, exitpriority=10)
+
+def _predict_building_in_worker(job, weather_indices):
+    global _WORKER_SESSION
+    if _WORKER_SESSION is None:
+        _WORKER_SESSION = TableSession()
+    return predict_building(job, weather_indices, _WORKER_SESSION)
+
+@traced
+def run_fleet(jobs, max_workers=None, session=None, prefetch=MAX_IN_FLIGHT):
+    """
+    Run predict_building for every job, in parallel on a process pool when max_workers > 1.
+
+    Location-scoped work (similar-weather-day search and forecast loading) runs once per location
+    in the calling process and is shared with the workers. Workers use the regression store of the
+    calling process. A failing building is reported and left as NaN in the result instead of
+    aborting the whole run.
+
+    Parameters:
+        jobs (list): Job dictionaries from building_jobs.
+        max_workers (int, optional): Number of worker processes; defaults to the CPU count. 1 runs in-process.
+        session (TableSession, optional): Session for the location-scoped and in-process work.
+        prefetch (int, optional): Concurrent reads used to load input files into the session before
+            computing; None or 0 loads files on demand. With a process pool only the location-scoped
+            files are prefetched, since the building tables are read by the workers.
+
+    Returns:
+        tuple: (array of shape (SLOTS_PER_DAY, n_buildings) with allocated consumption, dict of Building_ID -> error).
+    """
+    if session is None:
+        session = TableSession()
+    results = np.full((SLOTS_PER_DAY, len(jobs)), np.nan)
+    errors = {}
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    in_process = min(max_workers, len(jobs)) <= 1
+
+    if prefetch:
+        prefetch_fleet(jobs, session, prefetch, building_tables=in_process)  # Failures resurface in the stage that needs the file
+    indices = location_weather_indices(jobs, session)
+    runnable = []
+    for column, job in enumerate(jobs):
+        if isinstance(indices[job['location']], Exception):
+            errors[job['building_id']] = f"Weather matching for {job['location']} failed: {indices[job['location']]}"
+        else:
+            runnable.append((column, job))
+
+    def _store(column, job, outcome):
+        if isinstance(outcome, Exception):
+            errors[job['building_id']] = f"{type(outcome).__name__}: {outcome}"
+        else:
+            results[:, column] = outcome
+
+    if in_process or len(runnable) <= 1:
+        for column, job in runnable:
+            try:
+                outcome = predict_building(job, indices[job['location']], session)
+            except Exception as e:
+                outcome = e
+            _store(column, job, outcome)
+    else:
+        save_regression_store()  # Forked workers would otherwise save the parent's fits again
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(runnable)), initializer=_init_worker,
+                                 initargs=(regression_store_path(),)) as executor:
+            futures = [(column, job, executor.submit(_predict_building_in_worker, job, indices[job['location']]))
+                       for column, job in runnable]
+            for column, job, future in futures:
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = e
+                _store(column, job, outcome)
+
+    save_regression_store()
+    for building_id, message in errors.items():
+        print(f"Building {building_id} failed: {message}")
+    return results, errors
@@ -0,0 +1,103 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from SimilarWD import load_profile_matrix
+from WDArchive import VARIABLES, has_archive, profile_files
+
+# Reads in flight at once; bounds the load on the STORAGE share
+MAX_IN_FLIGHT = 8
+# Encoding read_and_reshape uses for forecast inputs and weather profiles
+PROFILE_ENCODING = 'cp949'
+
+def fleet_files(jobs, building_tables=True):
+    """
+    Work out the deduplicated set of files a fleet run reads.
+
+    Parameters:
+        jobs (list): Job dictionaries from Fleet.building_jobs.
+        building_tables (bool): Include the per-building tables; False keeps only the location-scoped
+            forecast inputs and weather profiles.
+
+    Returns:
+        tuple: (dict of table path -> encoding, list of weather profile folders).
+    """
+    tables = {}
+    profile_dirs = []
+    for job in jobs:
+        # The EC Minutely table is left out; allocation reads the stored profile statistics instead
+        for key in ('hybrid_table_filename', 'ed_table_filename', 'ec_daily_table_filename'):
+            if building_tables and job.get(key):
+                tables.setdefault(os.path.abspath(f"{job['table_path']}{job[key]}"), None)
+        for key in ('temperature_input_filename', 'humidity_input_filename'):
+            tables.setdefault(os.path.abspath(os.path.join(job['input_path'], job[key])), PROFILE_ENCODING)
+        for key in ('temperature_profile_storage_path', 'humidity_profile_storage_path'):
+            storage_path = os.path.abspath(job[key])
+            if storage_path not in profile_dirs:
+                profile_dirs.append(storage_path)
+
+    # Day files of locations without a packed archive are fetched one by one as well
+    for storage_path in profile_dirs:
+        location_path, variable = os.path.split(storage_path)
+        if variable.upper() in VARIABLES and has_archive(location_path):
+            continue
+        try:
+            for _, filename in profile_files(storage_path):
+                tables.setdefault(os.path.join(storage_path, filename), PROFILE_ENCODING)
+        except OSError:
+            pass  # Reported by the compute stage that needs the folder
+    return tables, profile_dirs
+
+async def _prefetch(tables, profile_dirs, session, max_in_flight, executor):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def fetch(function, *args):
+        async with semaphore:
+            try:
+                await loop.run_in_executor(executor, function, *args)
+            except Exception as e:
+                return e
+            return None
+
+    errors = {}
+    outcomes = await asyncio.gather(*(fetch(session.table, path, encoding) for path, encoding in tables.items()))
+    errors.update((path, e) for path, e in zip(tables, outcomes) if e is not None)
+
+    # Stack the fetched day files (or map the location archive) into the matrices the weather matching uses
+    outcomes = await asyncio.gather(*(fetch(load_profile_matrix, path, '.csv', session) for path in profile_dirs))
+    errors.update((path, e) for path, e in zip(profile_dirs, outcomes) if e is not None)
+    return errors
+
+def prefetch_files(tables, profile_dirs, session, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Load tables and weather profile matrices into a session concurrently.
+
+    At most max_in_flight reads run at once; parsing happens on a thread pool of the same size,
+    so latency of a network share overlaps instead of adding up file by file.
+
+    Parameters:
+        tables (dict): Table path -> encoding.
+        profile_dirs (list): Weather profile folders.
+        session (TableSession): Session that receives the loaded data.
+        max_in_flight (int): Maximum number of concurrent reads.
+
+    Returns:
+        dict: Path -> exception for the files that could not be loaded.
+    """
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        return asyncio.run(_prefetch(tables, profile_dirs, session, max_in_flight, executor))
+
+def prefetch_fleet(jobs, session, max_in_flight=MAX_IN_FLIGHT, building_tables=True):
+    """
+    Prefetch the files the given fleet jobs read into the session (see fleet_files for building_tables).
+
+    Returns:
+        dict: Path -> exception for the files that could not be loaded.
+    """
+    tables, profile_dirs = fleet_files(jobs, building_tables)
+    return prefetch_files(tables, profile_dirs, session, max_in_flight)
+
+# Example usage:
+# session = TableSession()
+# errors = prefetch_fleet(building_jobs(building_data, config, wd_root), session)
+# results, failures = run_fleet(jobs, session=session)
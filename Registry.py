@@ -0,0 +1,212 @@
+import os
+import copy
+import glob
+import json
+import numpy as np
+import pandas as pd
+from Config import IASYSTEM_ROOT, read_config
+from TableStore import file_signature
+from AutoProfile import new_readings_filename
+from Trace import traced, count
+
+# Per-location weather profile folders (STORAGE/WD/<Location>/TEM and HUM)
+WD_ROOT = os.path.join(IASYSTEM_ROOT, 'STORAGE', 'WD')
+REGISTRY_FILENAME = 'building_ids.xlsx'
+REGISTRY_CACHE_VERSION = 2
+# Season name of the plain CONFIG.ini in a compiled registry
+DEFAULT_SEASON = 'default'
+
+# Compiled registries keyed by cache file, checked against the source signatures on every load
+_REGISTRIES = {}
+
+# Function to read building IDs from Excel
+@traced
+def read_building_ids(filepath, sheet_name='Sheet1'):
+    df = pd.read_excel(filepath, sheet_name=sheet_name)
+    count(bytes_read=os.path.getsize(filepath), rows=len(df))
+    df['Building_ID'] = df['Building_ID'].astype(str)  # Ensure Building_ID is a string
+    return df.set_index('Building_ID')
+
+
+def _building_record(fields, wd_root):
+    """
+    Resolve the per-building configuration entries from one registry row.
+    """
+    location = fields['Location']
+    return {
+        'table_info': {
+            'hybrid_table_filename': fields['Hybrid DB'],
+            'ed_table_filename': fields['ED DB'],
+            'ec_daily_table_filename': fields['EC Daily'],
+            'ec_min_table_filename': fields['EC Minutely'],
+            'location': location,
+            # Temperature and humidity paths depend on the location
+            'temperature_profile_storage_path': os.path.join(wd_root, location, 'TEM'),
+            'humidity_profile_storage_path': os.path.join(wd_root, location, 'HUM')
+        },
+        'filepath': {
+            'temperature_input_filename': f"Pred_{location}_Tem_hourly.csv",
+            'humidity_input_filename': f"Pred_{location}_Hum_hourly.csv",
+            'ec_min_input_filename': new_readings_filename(fields['EC Minutely'])
+        }
+    }
+
+def _apply_building(config, record):
+    config = copy.deepcopy(config)
+    config['Table Info'].update(record['table_info'])
+    config['Filepath'].update(record['filepath'])
+    return config
+
+def building_config(config, building_data, building_id, wd_root=WD_ROOT):
+    """
+    Return a copy of the configuration pointed at one building's tables and its location's weather data.
+
+    Parameters:
+        config (dict): Configuration as returned by read_config.
+        building_data (pd.DataFrame): Building registry indexed by Building_ID.
+        building_id (str): Building to configure.
+        wd_root (str): Root folder of the per-location weather profiles.
+
+    Returns:
+        dict: The building's configuration.
+    """
+    if building_id not in building_data.index:
+        raise KeyError(f"Building ID {building_id} not found in the database.")
+    return _apply_building(config, _building_record(building_data.loc[building_id], wd_root))
+
+def registry_cache_file(registry_file):
+    """
+    Compiled registry of a building_ids.xlsx, kept next to it (building_ids.registry.json).
+    """
+    return f"{os.path.splitext(registry_file)[0]}.registry.json"
+
+def _source_signatures(registry_file, ini_path):
+    sources = [registry_file] + sorted(glob.glob(os.path.join(ini_path, 'CONFIG*.ini')))
+    return {os.path.abspath(path): file_signature(path) for path in sources}
+
+def _season_name(ini_file):
+    stem = os.path.splitext(os.path.basename(ini_file))[0]
+    return stem.split('_', 1)[1].lower() if '_' in stem else DEFAULT_SEASON
+
+def _typed(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def _setpoints(config):
+    setpoints = {}
+    for key, value in config.get('User Variables', {}).items():
+        try:
+            setpoints[key] = float(value)
+        except ValueError:
+            pass
+    return setpoints
+
+@traced
+def compile_registry(registry_file, ini_path=IASYSTEM_ROOT, wd_root=WD_ROOT):
+    """
+    Compile the building registry and the configuration files into one indexed structure.
+
+    Parameters:
+        registry_file (str): Path of building_ids.xlsx.
+        ini_path (str): Folder of CONFIG.ini and the CONFIG_<SEASON>.ini files.
+        wd_root (str): Root folder of the per-location weather profiles.
+
+    Returns:
+        dict: 'buildings' (Building_ID -> registry fields and resolved configuration entries),
+              'locations' (Location -> Building_IDs in registry order), 'seasons' (season ->
+              configuration and numeric setpoints), plus the source signatures it was built from.
+    """
+    sources = _source_signatures(registry_file, ini_path)
+    building_data = read_building_ids(registry_file)
+
+    buildings = {}
+    locations = {}
+    for building_id, row in building_data.iterrows():
+        fields = {column: _typed(value) for column, value in row.items()}
+        buildings[building_id] = dict(_building_record(fields, wd_root), fields=fields)
+        locations.setdefault(fields['Location'], []).append(building_id)
+
+    seasons = {}
+    for ini_file in sources:
+        if ini_file != os.path.abspath(registry_file):
+            config = read_config(os.path.dirname(ini_file), os.path.basename(ini_file))
+            seasons[_season_name(ini_file)] = {'config': config, 'setpoints': _setpoints(config)}
+
+    return {'version': REGISTRY_CACHE_VERSION, 'sources': sources, 'wd_root': wd_root,
+            'columns': list(building_data.columns), 'buildings': buildings, 'locations': locations, 'seasons': seasons}
+
+def _save_registry(cache_file, registry):
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+def _is_current(registry, sources, wd_root):
+    return (registry is not None and registry.get('version') == REGISTRY_CACHE_VERSION
+            and registry.get('sources') == sources and registry.get('wd_root') == wd_root)
+
+def load_registry(registry_file, ini_path=IASYSTEM_ROOT, wd_root=WD_ROOT):
+    """
+    Return the compiled registry, recompiling it only when the Excel sheet or a CONFIG*.ini changed.
+
+    The compiled registry is kept in memory and in building_ids.registry.json, so a new process
+    reads one JSON file instead of parsing the workbook.
+
+    Parameters:
+        registry_file (str): Path of building_ids.xlsx.
+        ini_path (str): Folder of the configuration files.
+        wd_root (str): Root folder of the per-location weather profiles.
+
+    Returns:
+        dict: The registry as described in compile_registry.
+    """
+    cache_file = registry_cache_file(registry_file)
+    sources = _source_signatures(registry_file, ini_path)
+    registry = _REGISTRIES.get(cache_file)
+    if _is_current(registry, sources, wd_root):
+        return registry
+
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        registry = None
+    if not _is_current(registry, sources, wd_root):
+        registry = compile_registry(registry_file, ini_path, wd_root)
+        try:
+            _save_registry(cache_file, registry)
+        except OSError as e:
+            print(f"Could not save the compiled registry: {e}")
+    _REGISTRIES[cache_file] = registry
+    return registry
+
+def registry_building(registry, building_id):
+    """
+    Look up one building of a compiled registry.
+    """
+    try:
+        return registry['buildings'][str(building_id)]
+    except KeyError:
+        raise KeyError(f"Building ID {building_id} not found in the database.") from None
+
+def registry_config(registry, config, building_id):
+    """
+    Compiled-registry counterpart of building_config.
+    """
+    return _apply_building(config, registry_building(registry, building_id))
+
+def buildings_by_location(registry):
+    """
+    Return the Building_IDs of every location, in registry order.
+    """
+    return registry['locations']
+
+def registry_frame(registry):
+    """
+    Return the registry as the DataFrame read_building_ids produces (indexed by Building_ID).
+    """
+    return pd.DataFrame([b['fields'] for b in registry['buildings'].values()], columns=registry['columns'],
+                        index=pd.Index(list(registry['buildings']), name='Building_ID'))
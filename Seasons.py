@@ -0,0 +1,63 @@
+import os
+import copy
+from datetime import datetime, timedelta
+import pandas as pd
+from Config import IASYSTEM_ROOT, read_config
+
+SEASONS = ('heating', 'cooling', 'transition')
+
+# Function to determine the current season based on month and day
+def determine_season(month, day):
+    if (month in (12, 1, 2)) or (month == 3 and day < 21):
+        return 'heating'
+    elif (month in (6, 7, 8)) or (month == 9 and day < 23):
+        return 'cooling'
+    else:
+        return 'transition'
+
+
+# Function to determine the season based on external temperature
+def determine_season_from_temperature(temperature):
+    if temperature < 10:
+        return 'heating'
+    elif temperature > 20:
+        return 'cooling'
+    else:
+        return 'transition'
+
+
+def resolve_season(mode='date', temperature_file=None, today=None):
+    """
+    Resolve a season selection without asking the user.
+
+    Parameters:
+        mode (str): 'date' (season of the next day), 'temperature' (first forecast temperature of the
+                    next day) or a season name ('heating', 'cooling', 'transition').
+        temperature_file (str, optional): Next-day hourly temperature CSV, required for 'temperature'.
+        today (datetime, optional): Reference date for 'date'; defaults to today.
+
+    Returns:
+        str: The season name.
+    """
+    mode = mode.lower()
+    if mode in SEASONS:
+        return mode
+    if mode == 'date':
+        next_day = (today or datetime.today()) + timedelta(days=1)
+        return determine_season(next_day.month, next_day.day)
+    if mode == 'temperature':
+        if temperature_file is None:
+            raise ValueError("Season mode 'temperature' needs a next-day temperature file.")
+        return determine_season_from_temperature(pd.read_csv(temperature_file).iloc[0, 1])  # Temperature is in the second column
+    raise ValueError(f"Unknown season mode '{mode}'; use 'date', 'temperature' or one of {', '.join(SEASONS)}.")
+
+
+# Function to load seasonal configuration based on the season name
+# A compiled registry (Registry.load_registry) already holds the parsed configuration files
+def load_seasonal_config(season, ini_path=IASYSTEM_ROOT, registry=None):
+    if registry is not None and season in registry['seasons']:
+        config = copy.deepcopy(registry['seasons'][season]['config'])
+    else:
+        config_filename = f'CONFIG_{season.upper()}.ini'
+        config = read_config(ini_path, config_filename)
+    return config
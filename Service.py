@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from Config import IASYSTEM_ROOT, read_config
+from AutoPredict import predict_energy, save_regression_store, use_regression_store
+from AutoAlloc import allocate_energy_consumption
+from AutoAdvice import advice_service, advice_sweep
+from Session import TableSession
+from TableStore import file_signature
+from WDArchive import ARCHIVE_DIRNAME, VARIABLES, archive_path, has_archive, sync_archive
+from Seasons import resolve_season, load_seasonal_config
+from Registry import WD_ROOT, REGISTRY_FILENAME, load_registry, registry_config
+from main_batch import METHODS, run_method, _json_default
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8750
+# Seconds between checks of the loaded files for changes on disk
+POLL_INTERVAL = 2.0
+
+def _path_signature(path):
+    """
+    Version stamp of a file, or of a directory's files (name, size and modification time of each).
+
+    Rewriting a file in place does not touch its directory's own mtime, so the entries are signed
+    one by one. A TEM or HUM folder also covers its location's archive, which the weather matching
+    reads instead of the day files once it is packed.
+    """
+    try:
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                listing = sorted([entry.name, *file_signature(entry.path)] for entry in entries if entry.is_file())
+            location_path, variable = os.path.split(os.path.normpath(path))
+            if variable.upper() in VARIABLES:
+                listing.append([ARCHIVE_DIRNAME, _path_signature(os.path.join(archive_path(location_path), 'meta.json'))])
+            return ['dir', listing]
+        return file_signature(path)
+    except OSError:
+        return None
+
+def _sync_weather_archive(path):
+    """
+    Fold the day CSVs of a changed TEM or HUM folder into its location's archive, which the read
+    path only syncs when the folder's own modification time moved.
+    """
+    location_path, variable = os.path.split(os.path.normpath(path))
+    if variable.upper() in VARIABLES and has_archive(location_path):
+        try:
+            sync_archive(location_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not sync the weather archive of {location_path}: {e}")
+
+class PipelineService:
+    """
+    Keeps the configuration, building registry and every loaded table in memory between requests.
+
+    Tables, ED indexes, regressions, weekday profiles and weather libraries are loaded on first use
+    (or by warm()) into one TableSession. Before a request the files behind the session entries are
+    checked, at most every poll_interval seconds; when one changed, its entries and every derived
+    entry are dropped and reload on the next use.
+
+    Parameters:
+        ini_path (str): Folder of the configuration files.
+        season (str, optional): Season mode for resolve_season; None uses CONFIG.ini.
+        registry_file (str, optional): Building registry; defaults to building_ids.xlsx in the input folder.
+        wd_root (str): Root folder of the per-location weather profiles.
+        poll_interval (float): Minimum seconds between change checks.
+    """
+
+    def __init__(self, ini_path=IASYSTEM_ROOT, season=None, registry_file=None, wd_root=WD_ROOT, poll_interval=POLL_INTERVAL):
+        self.ini_path = ini_path
+        self.season_mode = season
+        self.registry_file = registry_file
+        self.wd_root = wd_root
+        self.poll_interval = poll_interval
+        self.session = TableSession()
+        self._signatures = {}
+        self._last_check = 0.0
+        self._load_config()
+
+    def _load_config(self):
+        if self.season_mode is None:
+            self.season = None
+            self.config_file = os.path.join(self.ini_path, 'CONFIG.ini')
+            self.config = read_config(self.ini_path, 'CONFIG.ini')
+        else:
+            self.season = resolve_season(self.season_mode)
+            self.config_file = os.path.join(self.ini_path, f'CONFIG_{self.season.upper()}.ini')
+            self.config = load_seasonal_config(self.season, self.ini_path)
+        use_regression_store(self.config['Modelpath']['ai_model_path'])
+        self.registry_path = self.registry_file or os.path.join(self.config['Filepath']['input_path'], REGISTRY_FILENAME)
+        self.registry = load_registry(self.registry_path, self.ini_path, self.wd_root)
+        self._config_signatures = [_path_signature(self.config_file), _path_signature(self.registry_path)]
+
+    def refresh(self, force=False):
+        """
+        Drop session entries whose source files changed on disk.
+
+        Returns:
+            list: Paths found to have changed.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.poll_interval:
+            return []
+        self._last_check = now
+
+        changed = []
+        if [_path_signature(self.config_file), _path_signature(self.registry_path)] != self._config_signatures:
+            changed.append(self.config_file)
+            self._load_config()
+
+        stale_keys = set()
+        for key in self.session.keys():
+            for path in (part for part in key[1:] if isinstance(part, str)):
+                signature = _path_signature(path)
+                if path not in self._signatures:
+                    self._signatures[path] = signature
+                elif self._signatures[path] != signature:
+                    _sync_weather_archive(path)
+                    self._signatures[path] = _path_signature(path)
+                    changed.append(path)
+                    stale_keys.add(key)
+
+        if changed:
+            # Derived entries (indexes, profiles, weather matches) may depend on any changed file
+            for key in self.session.keys():
+                if key in stale_keys or key[0] != 'table':
+                    self.session.discard(key)
+        return changed
+
+    def building(self, building_id):
+        return registry_config(self.registry, self.config, building_id)
+
+    def warm(self, methods=('hybrid',)):
+        """
+        Load everything the given methods need for every registered building.
+
+        Returns:
+            dict: Building_ID -> error message for buildings that could not be warmed.
+        """
+        errors = {}
+        for building_id in self.registry['buildings']:
+            for method in methods:
+                try:
+                    run_method(self.building(building_id), method, self.session)
+                except Exception as e:
+                    errors[building_id] = f"{type(e).__name__}: {e}"
+        self.refresh(force=True)  # Record the signatures of everything loaded
+        return errors
+
+    def predict(self, building_id, method='hybrid', next_day_temperature_file=None):
+        result = run_method(self.building(building_id), method, self.session, next_day_temperature_file)
+        return dict(result, building_id=str(building_id), method=method)
+
+    def allocate(self, building_id, predicted_ec):
+        config = self.building(building_id)
+        allocated = allocate_energy_consumption(config['Table Info']['table_path'], config['Table Info']['ec_min_table_filename'],
+                                                float(predicted_ec), session=self.session,
+                                                new_readings_file=os.path.join(config['Filepath']['input_path'], config['Filepath']['ec_min_input_filename']))
+        return {'building_id': str(building_id), 'allocation': [float(v) for v in allocated.ravel()]}
+
+    def advice(self, building_id, target_es=None, predicted_ec=None):
+        """
+        Advice for one saving target, or the savings frontier for a list of targets.
+        """
+        config = self.building(building_id)
+        table_info, filepath, user = config['Table Info'], config['Filepath'], config['User Variables']
+        weather = (table_info['temperature_profile_storage_path'], table_info['humidity_profile_storage_path'],
+                   filepath['input_path'], filepath['temperature_input_filename'], filepath['humidity_input_filename'])
+        setpoints = (user['setpoint_temperature_machine'], user['setpoint_humidity_machine'],
+                     user['setpoint_temperature_office_heating'], user['setpoint_temperature_office_cooling'])
+        if predicted_ec is None:
+            predicted_ec = predict_energy(table_info['table_path'], table_info['hybrid_table_filename'], table_info['ed_table_filename'],
+                                          'EC', 'ED', *weather, 1, *setpoints, session=self.session)
+        predicted_ec = float(np.ravel(predicted_ec)[0])
+        if target_es is None:
+            target_es = user['target_value_of_energy_saving']
+
+        args = (table_info['table_path'], table_info['ed_table_filename'], table_info['hybrid_table_filename']) + weather
+        if isinstance(target_es, list):
+            advice = advice_sweep(*args, predicted_ec, *setpoints, target_es, session=self.session, sch=1)
+        else:
+            advice = advice_service(*args, 'EC', 'ED', predicted_ec, *setpoints, target_es, session=self.session, sch=1)
+        return {'building_id': str(building_id), 'predicted_ec': predicted_ec, 'advice': advice.to_dict('records')}
+
+    def handle(self, route, body):
+        """
+        Dispatch one request; raises LookupError for unknown endpoints or buildings and ValueError for bad requests.
+        Regressions fitted for the request are saved once it is answered.
+        """
+        self.refresh()
+        try:
+            return self._route(route, body)
+        finally:
+            save_regression_store()
+
+    def _route(self, route, body):
+        if route == '/health':
+            return {'status': 'ok', 'season': self.season, 'entries': len(self.session), 'buildings': list(self.registry['buildings'])}
+        if route == '/reload':
+            return {'changed': self.refresh(force=True)}
+        if 'building_id' not in body:
+            raise ValueError("Missing 'building_id'.")
+        if route == '/predict':
+            method = body.get('method', 'hybrid')
+            if method not in METHODS:
+                raise ValueError(f"Unknown method '{method}'; use one of {', '.join(METHODS)}.")
+            return self.predict(body['building_id'], method, body.get('next_day_temperature'))
+        if route == '/allocate':
+            if 'predicted_ec' not in body:
+                raise ValueError("Missing 'predicted_ec'.")
+            return self.allocate(body['building_id'], body['predicted_ec'])
+        if route == '/advice':
+            return self.advice(body['building_id'], body.get('target_es'), body.get('predicted_ec'))
+        raise LookupError(f"Unknown endpoint {route}.")
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, body):
+            try:
+                self._reply(200, service.handle(self.path.split('?')[0], body))
+            except LookupError as e:
+                self._reply(404, {'error': e.args[0] if e.args else str(e)})
+            except ValueError as e:
+                self._reply(400, {'error': str(e)})
+            except Exception as e:
+                self._reply(500, {'error': f"{type(e).__name__}: {e}"})
+
+        def do_GET(self):
+            self._dispatch({})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._reply(400, {'error': "The request body must be a JSON object."})
+                return
+            self._dispatch(body if isinstance(body, dict) else {})
+
+        def log_message(self, format, *args):
+            pass  # Requests are answered in milliseconds; per-request logging would dominate
+
+    return Handler
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Answer requests until interrupted. Requests are handled one at a time on the shared session.
+    """
+    server = HTTPServer((host, port), make_handler(service))
+    print(f"Serving on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident prediction, allocation and advice service.")
+    parser.add_argument('--ini-path', dest='ini_path', default=IASYSTEM_ROOT, help="Folder of the configuration files")
+    parser.add_argument('--season', default=None, help="Season mode ('date', 'heating', ...); CONFIG.ini is used when omitted")
+    parser.add_argument('--registry', help="Building registry (building_ids.xlsx)")
+    parser.add_argument('--wd-root', dest='wd_root', default=WD_ROOT, help="Root folder of the weather profiles")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--poll', type=float, default=POLL_INTERVAL, help="Seconds between checks for changed files")
+    parser.add_argument('--no-warm', dest='warm', action='store_false', help="Load tables on first request instead of at startup")
+    args = parser.parse_args(argv)
+
+    service = PipelineService(args.ini_path, args.season, args.registry, args.wd_root, args.poll)
+    if args.warm:
+        for building_id, message in service.warm().items():
+            print(f"Building {building_id} could not be warmed: {message}")
+    serve(service, args.host, args.port)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
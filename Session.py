@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+from TableStore import read_table
+
+class TableSession:
+    """
+    Owns every table, input forecast and derived object loaded during one pipeline run.
+
+    Entries are keyed by absolute file path (plus a kind tag for derived objects such as
+    compiled lookup cubes or weekday profiles), so each file is loaded exactly once per run
+    and buildings that share a table or a location share the loaded data.
+
+    The session is thread-safe: concurrent get() calls for the same key run its loader once and
+    share the result, while loaders for different keys run in parallel.
+
+    Parameters:
+        max_entries (int, optional): Least-recently-used bound on the number of cached entries.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}  # Key -> lock held while that key's loader runs
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True, self._entries[key]
+            return False, None
+
+    def get(self, key, loader):
+        """
+        Return the cached entry for key, calling loader() to create it on first use.
+        """
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            found, value = self._lookup(key)
+            if found:
+                return value
+            try:
+                value = loader()
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            with self._lock:
+                self._entries[key] = value
+                self._loading.pop(key, None)
+                if self.max_entries is not None:
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return value
+
+    def table(self, path, encoding=None):
+        """
+        Return the DataFrame stored at path, reading it on first use.
+        """
+        path = os.path.abspath(path)
+        return self.get(('table', path), lambda: read_table(path, encoding=encoding))
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def discard(self, key):
+        """
+        Forget one entry so that the next get() loads it again.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def load_table(path, session=None, encoding=None):
+    """
+    Read a table through the session if one is given, otherwise straight from storage.
+    """
+    if session is not None:
+        return session.table(path, encoding=encoding)
+    return read_table(path, encoding=encoding)
@@ -1,45 +1,130 @@
 import os
 import numpy as np
-import pandas as pd
+from Session import load_table
+from WDArchive import VARIABLES, has_archive, profile_files, refresh_archive, variable_profiles
+from Trace import traced
 
-def read_and_reshape(path, filename, encoding='cp949'):
+def read_and_reshape(path, filename, encoding='cp949', session=None):
     """
     Helper function to read a CSV file and reshape it for further processing.
     """
-    data = pd.read_csv(os.path.join(path, filename), encoding=encoding)
+    data = load_table(os.path.join(path, filename), session, encoding=encoding)
     return data.iloc[:, 1].values.reshape(-1, 1)  # Assumes data is in the second column
 
-def calculate_distances(input_data, storage_path, file_extension='.csv'):
+@traced
+def load_profile_matrix(storage_path, file_extension='.csv', session=None):
     """
-    Calculate Euclidean distances between input data and each data file in the storage path.
+    Load every reference profile in the storage path into a single matrix.
+
+    If the location has a packed archive (see WDArchive) the profiles are memory-mapped from it.
+    The day CSVs are only listed when a TEM or HUM folder was modified since the archive was
+    written (refresh_archive); CSVs rewritten in place are folded in by an explicit sync. If the
+    archive cannot be brought up to date, or there is none, every CSV in the folder is read. Day ids come from the
+    archive id column or the filename number, never from the directory listing order.
+
+    Parameters:
+        storage_path (str): TEM or HUM folder of a location, holding one profile file per reference day.
+        file_extension (str): Extension of the profile files.
+        session (TableSession, optional): Run session; the matrix is then loaded once per run.
+
+    Returns:
+        tuple: (ids, matrix, squared norms) where ids are the 1-based day indices used by the ED table,
+               matrix has shape (n_days, n_hours) and squared norms has shape (n_days,).
+    """
+    def _load():
+        location_path, variable = os.path.split(os.path.normpath(storage_path))
+        ids = None
+        if variable.upper() in VARIABLES and has_archive(location_path):
+            try:
+                refresh_archive(location_path)
+                ids, matrix = variable_profiles(location_path, variable)
+            except (OSError, ValueError) as e:
+                print(f"Weather archive of {location_path} is not usable, reading the day files: {e}")
+        if ids is None:
+            entries = profile_files(storage_path, file_extension)
+            if not entries:
+                raise ValueError(f"No reference profiles found in {storage_path}.")
+            ids = np.array([day_id for day_id, _ in entries])
+            matrix = np.stack([read_and_reshape(storage_path, f, session=session).ravel() for _, f in entries]).astype(np.float64)
+            if session is not None:
+                # The matrix replaces the per-day tables (which a prefetch may have loaded concurrently)
+                for _, f in entries:
+                    session.discard(('table', os.path.abspath(os.path.join(storage_path, f))))
+        return ids, matrix, np.einsum('ij,ij->i', matrix, matrix)
+
+    if session is not None:
+        return session.get(('wd_matrix', os.path.abspath(storage_path)), _load)
+    return _load()
+
+def profile_distances(forecasts, matrix, sq_norms):
+    """
+    Euclidean distances between each forecast and every reference profile, shape (m, n_days).
+    """
+    forecasts = np.atleast_2d(np.asarray(forecasts, dtype=np.float64))
+    sq_dist = np.einsum('ij,ij->i', forecasts, forecasts)[:, None] + sq_norms[None, :] - 2.0 * forecasts @ matrix.T
+    return np.sqrt(np.maximum(sq_dist, 0.0))
+
+def nearest_profiles(forecasts, matrix, sq_norms, k=1):
+    """
+    Find the k reference profiles closest (Euclidean) to each forecast in one broadcast operation.
+
+    Parameters:
+        forecasts (np.array): One forecast of shape (n_hours,) or a batch of shape (m, n_hours).
+        matrix (np.array): Reference profiles of shape (n_days, n_hours).
+        sq_norms (np.array): Precomputed squared norms of the reference profiles.
+        k (int): Number of neighbours to return.
+
+    Returns:
+        tuple: (row positions, distances), each of shape (m, k) and ordered from nearest to farthest.
+               Ties keep the storage order, as the original argmin did.
     """
-    storage_files = [f for f in os.listdir(storage_path) if f.endswith(file_extension)]
-    distances = []
+    distances = profile_distances(forecasts, matrix, sq_norms)
+    k = min(k, matrix.shape[0])
+    order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+    return order, np.take_along_axis(distances, order, axis=1)
 
-    for filename in storage_files:
-        reference_data = read_and_reshape(storage_path, filename)
-        distance = np.linalg.norm(input_data - reference_data)
-        distances.append(distance)
+def rank_similar_days(forecast, storage_path, k=1, session=None):
+    """
+    Return the ids and distances of the k stored days most similar to one forecast profile.
+    """
+    ids, matrix, sq_norms = load_profile_matrix(storage_path, session=session)
+    order, distances = nearest_profiles(np.ravel(forecast), matrix, sq_norms, k)
+    return ids[order[0]], distances[0]
 
-    return distances
+def calculate_distances(input_data, storage_path, file_extension='.csv', session=None):
+    """
+    Calculate Euclidean distances between input data and each data file in the storage path.
+    """
+    _, matrix, sq_norms = load_profile_matrix(storage_path, file_extension, session)
+    return profile_distances(np.ravel(input_data), matrix, sq_norms)[0].tolist()
 
-def similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname):
+@traced
+def similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, session=None):
     """
     Determine the most similar weather days for temperature and humidity based on historical data.
+    With a session the result is computed once per location and forecast and then shared.
     """
-    # Read and reshape input temperature and humidity data
-    tem_input = read_and_reshape(common_ipath, pred_tem_input_fname)
-    hum_input = read_and_reshape(common_ipath, pred_hum_input_fname)
+    if session is not None:
+        key = ('similar_wd',) + tuple(os.path.abspath(p) for p in (tem_storage_path, hum_storage_path,
+                                                                   os.path.join(common_ipath, pred_tem_input_fname),
+                                                                   os.path.join(common_ipath, pred_hum_input_fname)))
+        return session.get(key, lambda: _similar_weather_days(tem_storage_path, hum_storage_path, common_ipath,
+                                                              pred_tem_input_fname, pred_hum_input_fname, session))
+    return _similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname)
 
-    # Calculate distances to stored temperature and humidity profiles
-    dist_tem = calculate_distances(tem_input, tem_storage_path)
-    dist_hum = calculate_distances(hum_input, hum_storage_path)
+def _similar_weather_days(tem_storage_path, hum_storage_path, common_ipath, pred_tem_input_fname, pred_hum_input_fname, session=None):
+    """
+    Uncached body of similar_weather_days.
+    """
+    # Read and reshape input temperature and humidity data
+    tem_input = read_and_reshape(common_ipath, pred_tem_input_fname, session=session)
+    hum_input = read_and_reshape(common_ipath, pred_hum_input_fname, session=session)
 
-    # Find the index of the minimum distance
-    tem_index = dist_tem.index(min(dist_tem)) + 1
-    hum_index = dist_hum.index(min(dist_hum)) + 1
+    # Find the stored temperature and humidity profiles at the minimum distance
+    tem_ids, _ = rank_similar_days(tem_input, tem_storage_path, session=session)
+    hum_ids, _ = rank_similar_days(hum_input, hum_storage_path, session=session)
 
-    return tem_index, hum_index
+    return int(tem_ids[0]), int(hum_ids[0])
 
 # # Example usage
 # try:
@@ -0,0 +1,205 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from Trace import traced, count
+
+# Sidecars live in a hidden folder next to the source table so directory listings stay unchanged
+SIDECAR_DIRNAME = '.sidecar'
+SIDECAR_VERSION = 2
+# Prefix of the generation folders written by write_generation
+GENERATION_PREFIX = 'g'
+
+def file_signature(path):
+    """
+    Return a cheap version stamp (modification time in ns, size in bytes) for a file.
+    """
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def sidecar_path(path):
+    """
+    Return the sidecar directory used for a source table.
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, SIDECAR_DIRNAME, filename)
+
+def downcast_column(values):
+    """
+    Convert a column to the smallest dtype that stores it without loss.
+
+    Integers shrink to the narrowest integer type holding their range (int8 for grid indices),
+    floats shrink to float32 only when every value survives the round trip, and text becomes a
+    fixed-width unicode array so that it can be memory-mapped.
+
+    Parameters:
+        values (np.array): Column values as parsed from the CSV file.
+
+    Returns:
+        np.array or None: The downcast column, or None if the column cannot be stored.
+    """
+    if values.dtype.kind in 'iu':
+        if len(values) == 0:
+            return values
+        low, high = values.min(), values.max()
+        for dtype in (np.int8, np.int16, np.int32, np.int64):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+    if values.dtype.kind == 'f':
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow.astype(values.dtype), values, equal_nan=True):
+            return narrow
+        return values
+    if values.dtype.kind == 'b':
+        return values
+    if values.dtype.kind in 'OU' and all(isinstance(v, str) for v in values):
+        return np.array(values, dtype=str)
+    return None
+
+def write_generation(directory, generation, arrays, meta):
+    """
+    Write arrays as .npy files into a new generation folder and publish it by replacing meta.json.
+
+    Every file is written under a temporary name and renamed into place, and meta.json, which names
+    the generation, is replaced last. A reader that opened meta.json therefore always finds complete
+    files of one generation; superseded generations are removed afterwards.
+
+    Parameters:
+        directory (str): Folder holding meta.json and the generation folders.
+        generation (str): Name of the new generation; writers of the same content may share it.
+        arrays (dict): File stem -> array.
+        meta (dict): Metadata published with the generation.
+    """
+    generation_dir = os.path.join(directory, generation)
+    os.makedirs(generation_dir, exist_ok=True)
+    for name, values in arrays.items():
+        tmp_file = os.path.join(generation_dir, f'{name}.{os.getpid()}.{threading.get_ident()}.tmp.npy')
+        np.save(tmp_file, values, allow_pickle=False)
+        os.replace(tmp_file, os.path.join(generation_dir, f'{name}.npy'))
+
+    meta_file = os.path.join(directory, 'meta.json')
+    tmp_file = f"{meta_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, generation=generation), f, ensure_ascii=False)
+    os.replace(tmp_file, meta_file)
+
+    # A generation still memory-mapped on Windows cannot be removed yet; a later write retries
+    for entry in os.listdir(directory):
+        if entry.startswith(GENERATION_PREFIX) and entry != generation:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+def read_generation(directory):
+    """
+    Read meta.json of a generation folder.
+
+    Returns:
+        tuple: (meta, folder of the published generation).
+    """
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta, os.path.join(directory, meta['generation'])
+
+def write_sidecar(path, df, signature):
+    """
+    Write a DataFrame as one .npy file per column plus a metadata file describing the source version.
+
+    The columns go into a generation named after the source signature, so concurrent writers of the
+    same file version produce the same files and readers never see a mix of two versions.
+
+    Returns:
+        bool: True if the sidecar was written, False if a column type is not supported.
+    """
+    columns = [downcast_column(df[col].to_numpy()) for col in df.columns]
+    if any(col is None for col in columns):
+        return False
+
+    meta = {
+        'version': SIDECAR_VERSION,
+        'signature': signature,
+        'columns': [str(col) for col in df.columns],
+        'dtypes': [str(df[col].dtype) for col in df.columns],
+        'rows': len(df)
+    }
+    write_generation(sidecar_path(path), f"{GENERATION_PREFIX}{signature[0]}_{signature[1]}",
+                     {f'c{i}': values for i, values in enumerate(columns)}, meta)
+    return True
+
+def read_sidecar_columns(path, signature=None):
+    """
+    Memory-map the columns of a table's sidecar if it matches the current version of the source.
+
+    Parameters:
+        path (str): Path to the source table.
+        signature (list, optional): Current source signature; computed if omitted.
+
+    Returns:
+        tuple or None: (meta, list of memory-mapped column arrays), or None if the sidecar is missing,
+                       stale or incomplete.
+    """
+    try:
+        meta, generation_dir = read_generation(sidecar_path(path))
+        if signature is None:
+            signature = file_signature(path)
+        if meta.get('version') != SIDECAR_VERSION or meta.get('signature') != signature:
+            return None
+        columns = [np.load(os.path.join(generation_dir, f'c{i}.npy'), mmap_mode='r') for i in range(len(meta['columns']))]
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(values) != meta['rows'] for values in columns):
+        return None
+    return meta, columns
+
+@traced
+def read_table(path, encoding=None, downcast=False):
+    """
+    Read a CSV table, serving it from its binary sidecar when the sidecar is up to date.
+
+    The first read of each file version parses the CSV and writes the sidecar; later reads only
+    memory-map the stored columns. A change in the source modification time or size invalidates it.
+
+    Parameters:
+        path (str): Path to the CSV file.
+        encoding (str, optional): Encoding used to parse the CSV on a cold read.
+        downcast (bool): Keep the compact sidecar dtypes instead of restoring the CSV dtypes.
+
+    Returns:
+        pd.DataFrame: The table contents.
+    """
+    signature = file_signature(path)
+    cached = read_sidecar_columns(path, signature)
+    if cached is not None:
+        meta, columns = cached
+        data = {}
+        for name, dtype, values in zip(meta['columns'], meta['dtypes'], columns):
+            if downcast or values.dtype.kind == 'U':
+                data[name] = np.asarray(values)
+            else:
+                data[name] = values.astype(dtype)
+        count(bytes_read=sum(values.nbytes for values in columns), rows=meta['rows'])
+        return pd.DataFrame(data, columns=meta['columns'])
+
+    df = pd.read_csv(path, encoding=encoding)
+    count(bytes_read=signature[1], rows=len(df))
+    try:
+        write_sidecar(path, df, signature)
+    except OSError:
+        pass  # A read-only share still works, it just stays cold
+    return df
+
+def table_digest(df):
+    """
+    Return a content hash of a DataFrame, independent of where or when it was loaded.
+    """
+    digest = hashlib.sha1('\x1f'.join(str(col) for col in df.columns).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def series_digest(time_series):
+    """
+    Hash of a series prefix, used to check that a persisted model was fitted on the same history.
+    """
+    return hashlib.sha1(np.ascontiguousarray(time_series, dtype=np.float64).tobytes()).hexdigest()
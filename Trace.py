@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import functools
+import threading
+import tracemalloc
+
+# Tracing is configured from the environment on import, so the interactive main scripts and the
+# worker processes of a fleet run need no extra arguments:
+#   ENERGY_SYS_TRACE=run.jsonl          structured log, one JSON record per finished span (appended)
+#   ENERGY_SYS_TRACE_CHROME=run.json    Chrome-trace / Perfetto file written when the process exits
+#   ENERGY_SYS_TRACE_MEMORY=1           peak memory per span (tracemalloc; slows the run down)
+ENV_LOG = 'ENERGY_SYS_TRACE'
+ENV_CHROME = 'ENERGY_SYS_TRACE_CHROME'
+ENV_MEMORY = 'ENERGY_SYS_TRACE_MEMORY'
+ENV_RUN = 'ENERGY_SYS_TRACE_RUN'  # Run id shared with child processes
+
+_enabled = False
+_memory = False
+_run = None
+_log = None
+_chrome_file = None
+_events = []
+_lock = threading.Lock()
+_local = threading.local()
+
+class _Span:
+    __slots__ = ('stage', 'building', 'parent', 'start', 'cpu', 'bytes_read', 'rows', 'mem_start', 'mem_peak')
+
+    def __init__(self, stage, building):
+        self.stage = stage
+        self.building = building
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        if self.building is None:
+            self.building = (self.parent.building if self.parent is not None else None) or getattr(_local, 'building', None)
+        self.bytes_read = 0
+        self.rows = 0
+        if _memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.mem_peak = max(self.parent.mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = self.mem_peak = current
+        else:
+            self.mem_start = self.mem_peak = None
+        stack.append(self)
+        self.cpu = time.thread_time()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        cpu = time.thread_time() - self.cpu
+        _stack().pop()
+        peak_memory = None
+        if self.mem_start is not None and tracemalloc.is_tracing():
+            self.mem_peak = max(self.mem_peak, tracemalloc.get_traced_memory()[1])
+            peak_memory = self.mem_peak - self.mem_start
+
+        # Counters are inclusive: a stage reports everything its callees read
+        parent = self.parent
+        if parent is not None:
+            parent.bytes_read += self.bytes_read
+            parent.rows += self.rows
+            if parent.mem_peak is not None and self.mem_peak is not None:
+                parent.mem_peak = max(parent.mem_peak, self.mem_peak)
+
+        _record({'run': _run, 'stage': self.stage, 'building': self.building,
+                 'parent': parent.stage if parent is not None else None,
+                 'start_us': self.start // 1000, 'wall_s': (end - self.start) / 1e9, 'cpu_s': cpu,
+                 'bytes_read': self.bytes_read, 'rows': self.rows, 'peak_memory': peak_memory,
+                 'error': exc_type.__name__ if exc_type is not None else None,
+                 'pid': os.getpid(), 'tid': threading.get_ident()})
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _record(event):
+    with _lock:
+        _events.append(event)
+        if _log is not None:
+            _log.write(json.dumps(event) + '\n')
+            _log.flush()
+
+def enabled():
+    return _enabled
+
+def enable(log_file=None, chrome_file=None, memory=False, run=None):
+    """
+    Start recording spans.
+
+    Parameters:
+        log_file (str, optional): JSON Lines file the finished spans are appended to.
+        chrome_file (str, optional): Chrome-trace file written when the process exits.
+        memory (bool): Record the peak memory of every span with tracemalloc.
+        run (str, optional): Run id stored with every span; a new one is made when omitted.
+    """
+    global _enabled, _memory, _run, _log, _chrome_file
+    disable()
+    _run = run or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    if log_file:
+        _log = open(log_file, 'a', encoding='utf-8')
+    if chrome_file:
+        if _chrome_file is None:
+            atexit.register(_write_chrome_at_exit)
+        _chrome_file = chrome_file
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+def disable():
+    global _enabled, _memory, _log
+    _enabled = False
+    if _log is not None:
+        _log.close()
+        _log = None
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+def configure_from_env():
+    """
+    Enable tracing if ENERGY_SYS_TRACE or ENERGY_SYS_TRACE_CHROME is set. Child processes inherit the run id.
+    """
+    log_file = os.environ.get(ENV_LOG)
+    chrome_file = os.environ.get(ENV_CHROME)
+    if not (log_file or chrome_file):
+        return
+    run = os.environ.get(ENV_RUN)
+    if run is None:
+        run = os.environ[ENV_RUN] = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    elif chrome_file:
+        # A child process writes its own Chrome file next to the parent's
+        stem, ext = os.path.splitext(chrome_file)
+        chrome_file = f"{stem}.{os.getpid()}{ext}"
+    enable(log_file, chrome_file, os.environ.get(ENV_MEMORY, '') not in ('', '0'), run)
+
+def span(stage, building=None):
+    """
+    Context manager timing a block as one stage; a no-op while tracing is disabled.
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(stage, building)
+
+def traced(func=None, *, name=None, building=None):
+    """
+    Decorator recording every call of a function as a span named '<module>.<function>'.
+
+    While tracing is disabled the wrapper only checks a flag before calling the function.
+
+    Parameters:
+        name (str, optional): Stage name to use instead of the qualified function name.
+        building (str, optional): Name of the argument holding the building ID the call works for.
+    """
+    def decorate(func):
+        stage = name or f"{func.__module__}.{func.__qualname__}"
+        position = func.__code__.co_varnames[:func.__code__.co_argcount].index(building) if building else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            building_id = None
+            if building is not None:
+                building_id = args[position] if position < len(args) else kwargs.get(building)
+            with _Span(stage, None if building_id is None else str(building_id)):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+def count(bytes_read=0, rows=0):
+    """
+    Add bytes read and rows processed to the innermost running span.
+    """
+    if not _enabled:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].bytes_read += bytes_read
+        stack[-1].rows += rows
+
+def set_building(building_id):
+    """
+    Attribute the following spans of this thread to a building (until set_building(None)).
+    """
+    _local.building = None if building_id is None else str(building_id)
+
+def events():
+    with _lock:
+        return list(_events)
+
+def chrome_trace(records):
+    """
+    Convert span records to the Chrome-trace event format (chrome://tracing, ui.perfetto.dev).
+    """
+    trace_events = []
+    for e in records:
+        args = {key: e[key] for key in ('building', 'cpu_s', 'bytes_read', 'rows', 'peak_memory', 'error') if e.get(key) is not None}
+        trace_events.append({'name': e['stage'], 'cat': e['stage'].split('.')[0], 'ph': 'X', 'ts': e['start_us'],
+                             'dur': max(1, int(e['wall_s'] * 1e6)), 'pid': e['pid'], 'tid': e['tid'], 'args': args})
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+def write_chrome_trace(path, records=None):
+    """
+    Write span records (by default those of this process) as a Chrome-trace JSON file.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(chrome_trace(events() if records is None else records), f)
+
+def _write_chrome_at_exit():
+    if _chrome_file and _events:
+        try:
+            write_chrome_trace(_chrome_file)
+        except OSError as e:
+            print(f"Could not write the Chrome trace: {e}")
+
+def read_log(log_file, run='last'):
+    """
+    Read the span records of a structured log.
+
+    Parameters:
+        log_file (str): JSON Lines file written by a traced run.
+        run (str): Run id to keep; 'last' keeps the last run in the file, None keeps every run.
+
+    Returns:
+        list: Span records.
+    """
+    with open(log_file, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run == 'last' and records:
+        run = records[-1]['run']
+    return [r for r in records if run is None or r['run'] == run]
+
+def summarize(records, by=('stage',)):
+    """
+    Total wall time, CPU time, bytes, rows and peak memory of the spans grouped by the given keys.
+
+    Returns:
+        list: One dict per group, slowest first.
+    """
+    groups = {}
+    for e in records:
+        key = tuple(e.get(k) for k in by)
+        g = groups.setdefault(key, dict(zip(by, key), calls=0, wall_s=0.0, cpu_s=0.0, bytes_read=0, rows=0, peak_memory=None))
+        g['calls'] += 1
+        g['wall_s'] += e['wall_s']
+        g['cpu_s'] += e['cpu_s']
+        g['bytes_read'] += e['bytes_read']
+        g['rows'] += e['rows']
+        if e.get('peak_memory') is not None:
+            g['peak_memory'] = max(g['peak_memory'] or 0, e['peak_memory'])
+    return sorted(groups.values(), key=lambda g: -g['wall_s'])
+
+def print_summary(summary, by=('stage',)):
+    header = ''.join(f"{k:<45}" if k == 'stage' else f"{k:<12}" for k in by)
+    print(f"{header}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'MiB read':>10}{'rows':>11}{'peak MiB':>10}")
+    for g in summary:
+        keys = ''.join(f"{str(g[k]):<45}" if k == 'stage' else f"{str(g[k]):<12}" for k in by)
+        peak = f"{g['peak_memory'] / 2 ** 20:>10.1f}" if g['peak_memory'] is not None else f"{'-':>10}"
+        print(f"{keys}{g['calls']:>7}{g['wall_s']:>10.3f}{g['cpu_s']:>10.3f}{g['bytes_read'] / 2 ** 20:>10.1f}{g['rows']:>11}{peak}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a structured trace log and convert it to a Chrome trace.")
+    parser.add_argument('log_file', help="JSON Lines log written with ENERGY_SYS_TRACE")
+    parser.add_argument('--run', default='last', help="Run id to report; 'all' for every run in the log")
+    parser.add_argument('--by', nargs='+', default=['stage'], choices=['stage', 'building', 'pid'], help="Grouping keys")
+    parser.add_argument('--chrome', help="Write the spans as a Chrome-trace / Perfetto JSON file")
+    args = parser.parse_args(argv)
+
+    records = read_log(args.log_file, None if args.run == 'all' else args.run)
+    print_summary(summarize(records, tuple(args.by)), tuple(args.by))
+    if args.chrome:
+        write_chrome_trace(args.chrome, records)
+        print(f"Wrote {args.chrome}")
+
+configure_from_env()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,282 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import threading
+import numpy as np
+from TableStore import GENERATION_PREFIX, file_signature, read_table, read_generation, write_generation
+
+# A location's archive sits next to its TEM and HUM folders: STORAGE/WD/<Location>/WD_ARCHIVE
+ARCHIVE_DIRNAME = 'WD_ARCHIVE'
+ARCHIVE_VERSION = 2
+VARIABLES = ('TEM', 'HUM')  # Order of the variable axis in profiles.npy
+
+def archive_path(location_path):
+    return os.path.join(location_path, ARCHIVE_DIRNAME)
+
+def has_archive(location_path):
+    return os.path.exists(os.path.join(archive_path(location_path), 'meta.json'))
+
+def profile_files(storage_path, file_extension='.csv'):
+    """
+    List the profile files of a TEM or HUM folder together with their explicit day ids.
+
+    The id is the trailing number of the filename (tem_n_07.csv -> 7), which is the index the
+    ED table uses. Files without a number are numbered by their position in sorted order.
+
+    Returns:
+        list: (day id, filename) pairs sorted by id.
+    """
+    filenames = sorted(f for f in os.listdir(storage_path) if f.endswith(file_extension))
+    entries = []
+    for position, filename in enumerate(filenames, start=1):
+        match = re.search(r'(\d+)' + re.escape(file_extension) + '$', filename)
+        entries.append((int(match.group(1)) if match else position, filename))
+
+    ids = [day_id for day_id, _ in entries]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate day ids in {storage_path}.")
+    return sorted(entries)
+
+def read_profile(path, encoding='cp949'):
+    """
+    Read one daily profile CSV (hour, value) and return the values as a 1-D array.
+    """
+    return read_table(path, encoding=encoding).iloc[:, 1].to_numpy(dtype=np.float64)
+
+def _write_archive(location_path, ids, profiles, meta):
+    # Generations are named after their content, so workers syncing the same folders concurrently agree
+    digest = hashlib.sha1(ids.tobytes())
+    digest.update(np.ascontiguousarray(profiles).tobytes())
+    meta = dict(meta, version=ARCHIVE_VERSION, variables=list(VARIABLES), days=int(len(ids)), hours=int(profiles.shape[2]))
+    write_generation(archive_path(location_path), f"{GENERATION_PREFIX}{digest.hexdigest()[:16]}",
+                     {'ids': ids, 'profiles': profiles}, meta)
+
+def open_archive(location_path):
+    """
+    Memory-map a location's weather profile archive.
+
+    Returns:
+        tuple: (ids, profiles, meta) with ids of shape (n_days,) and profiles of shape
+               (n_days, len(VARIABLES), n_hours).
+    """
+    directory = archive_path(location_path)
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') == 1:
+        generation_dir = directory  # Archives packed before generations kept their arrays in the folder itself
+    elif meta.get('version') == ARCHIVE_VERSION:
+        meta, generation_dir = read_generation(directory)
+    else:
+        raise ValueError(f"Unsupported weather archive version in {directory}.")
+    ids = np.load(os.path.join(generation_dir, 'ids.npy'), mmap_mode='r')
+    profiles = np.load(os.path.join(generation_dir, 'profiles.npy'), mmap_mode='r')
+    if len(ids) != meta['days'] or profiles.shape[0] != meta['days']:
+        raise ValueError(f"Incomplete weather archive in {directory}.")
+    return ids, profiles, meta
+
+def variable_profiles(location_path, variable):
+    """
+    Return (ids, matrix) for one variable ('TEM' or 'HUM') of a location's archive.
+    """
+    ids, profiles, _ = open_archive(location_path)
+    return np.asarray(ids), profiles[:, VARIABLES.index(variable.upper()), :]
+
+def source_files(location_path):
+    """
+    List the day CSVs of a location with their signatures, which the archive records to detect
+    files added or rewritten after it was packed.
+
+    Returns:
+        dict: Variable -> list of (day id, filename, signature); variables without a folder are left out.
+    """
+    sources = {}
+    for var in VARIABLES:
+        storage_path = os.path.join(location_path, var)
+        if os.path.isdir(storage_path):
+            sources[var] = [(day_id, filename, file_signature(os.path.join(storage_path, filename)))
+                            for day_id, filename in profile_files(storage_path)]
+    return sources
+
+def folder_signatures(location_path):
+    """
+    Modification times of a location's TEM and HUM folders, which change when a day CSV is added,
+    removed or replaced by rename, but not when one is rewritten in place.
+    """
+    folders = {}
+    for var in VARIABLES:
+        try:
+            folders[var] = os.stat(os.path.join(location_path, var)).st_mtime_ns
+        except OSError:
+            pass
+    return folders
+
+def _settled_folders(location_path, folders, sources):
+    # Reading the CSVs may create their sidecar folder, which moves the folder times; the new times
+    # are recorded only if the day files are still the ones that were packed
+    after = folder_signatures(location_path)
+    if after != folders and source_files(location_path) == sources:
+        return after
+    return folders
+
+def _record_folders(location_path, meta, folders):
+    # Only meta.json is replaced; the published arrays stay as they are
+    meta_file = os.path.join(archive_path(location_path), 'meta.json')
+    tmp_file = f"{meta_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, folders=folders), f, ensure_ascii=False)
+    os.replace(tmp_file, meta_file)
+
+def _recorded_sources(sources):
+    return {var: {filename: signature for _, filename, signature in files} for var, files in sources.items()}
+
+def migrate_location(location_path):
+    """
+    Pack the one-CSV-per-day TEM and HUM folders of a location into its archive.
+
+    Both folders must hold the same set of day ids. The CSV folders are left untouched.
+
+    Parameters:
+        location_path (str): Location folder, e.g. STORAGE/WD/Seoul.
+
+    Returns:
+        int: Number of days written.
+    """
+    folders = folder_signatures(location_path)
+    sources = source_files(location_path)
+    entries = {var: profile_files(os.path.join(location_path, var)) for var in VARIABLES}
+    ids = [day_id for day_id, _ in entries[VARIABLES[0]]]
+    for var in VARIABLES[1:]:
+        if [day_id for day_id, _ in entries[var]] != ids:
+            raise ValueError(f"TEM and HUM day ids differ in {location_path}; cannot pack them together.")
+
+    profiles = np.stack([
+        np.stack([read_profile(os.path.join(location_path, var, filename)) for _, filename in entries[var]])
+        for var in VARIABLES
+    ], axis=1)
+    _write_archive(location_path, np.asarray(ids, dtype=np.int32), profiles,
+                   {'location': os.path.basename(os.path.normpath(location_path)), 'sources': _recorded_sources(sources),
+                    'folders': _settled_folders(location_path, folders, sources)})
+    return len(ids)
+
+def sync_archive(location_path):
+    """
+    Fold day CSVs added or rewritten since the archive was packed into it.
+
+    The signatures of the CSVs are compared with the ones recorded in the archive. New days need
+    both a TEM and a HUM file; a rewritten file replaces that variable of its day. Days appended
+    without CSVs and days whose CSVs were removed are kept.
+
+    Every day CSV is listed and signed, so this is an explicit step (the sync command, or
+    PipelineService.refresh when a TEM or HUM folder changed); the read path only calls it through
+    refresh_archive when a folder's modification time moved.
+
+    Parameters:
+        location_path (str): Location folder holding the archive and the TEM and HUM folders.
+
+    Returns:
+        int: Number of days added or updated (0 when the archive is current).
+    """
+    folders = folder_signatures(location_path)
+    sources = source_files(location_path)
+    ids, profiles, meta = open_archive(location_path)
+    recorded = meta.get('sources', {})
+    changed = {var: [(day_id, filename) for day_id, filename, signature in files
+                     if recorded.get(var, {}).get(filename) != signature]
+               for var, files in sources.items()}
+    if not any(changed.values()):
+        if meta.get('folders') != folders:
+            _record_folders(location_path, meta, folders)  # So the read path stops checking
+        return 0
+
+    days = {int(day_id): np.array(profiles[row]) for row, day_id in enumerate(ids)}
+    new_days = {}
+    for var, entries in changed.items():
+        for day_id, filename in entries:
+            profile = read_profile(os.path.join(location_path, var, filename))
+            if day_id not in days:
+                new_days.setdefault(day_id, {})[var] = profile
+            else:
+                if len(profile) != profiles.shape[2]:
+                    raise ValueError(f"{filename} must have {profiles.shape[2]} hourly values.")
+                days[day_id][VARIABLES.index(var)] = profile
+
+    for day_id, variables in new_days.items():
+        if set(variables) != set(VARIABLES):
+            raise ValueError(f"Day {day_id} of {location_path} has no {' and '.join(set(VARIABLES) - set(variables))} profile; cannot pack it.")
+        days[day_id] = np.stack([variables[var] for var in VARIABLES])
+        if days[day_id].shape[1] != profiles.shape[2]:
+            raise ValueError(f"Day {day_id} of {location_path} must have {profiles.shape[2]} hourly values.")
+
+    order = sorted(days)
+    _write_archive(location_path, np.asarray(order, dtype=np.int32), np.stack([days[day_id] for day_id in order]),
+                   dict({k: v for k, v in meta.items() if k == 'location'}, sources=_recorded_sources(sources),
+                        folders=_settled_folders(location_path, folders, sources)))
+    return len({day_id for entries in changed.values() for day_id, _ in entries})
+
+def refresh_archive(location_path):
+    """
+    Sync a location's archive only if its TEM or HUM folder was modified since it was written.
+
+    Costs one read of meta.json and two stats when nothing changed. Day CSVs rewritten in place do
+    not move the folder times; they are picked up by an explicit sync_archive.
+
+    Returns:
+        int: Number of days added or updated.
+    """
+    with open(os.path.join(archive_path(location_path), 'meta.json'), encoding='utf-8') as f:
+        recorded = json.load(f).get('folders')
+    if recorded == folder_signatures(location_path):
+        return 0
+    return sync_archive(location_path)
+
+def append_days(location_path, tem_profiles, hum_profiles, day_ids=None):
+    """
+    Append new representative days to a location's archive.
+
+    Parameters:
+        location_path (str): Location folder holding the archive.
+        tem_profiles (array-like): Temperature profiles of shape (n_new, n_hours) or (n_hours,).
+        hum_profiles (array-like): Humidity profiles with the same shape.
+        day_ids (list, optional): Ids for the new days; defaults to consecutive ids after the current maximum.
+
+    Returns:
+        np.array: Ids assigned to the new days.
+    """
+    ids, profiles, meta = open_archive(location_path)
+    ids, profiles = np.array(ids), np.array(profiles)  # Release the memory maps before the files are replaced
+    new = np.stack([np.atleast_2d(np.asarray(tem_profiles, dtype=np.float64)),
+                    np.atleast_2d(np.asarray(hum_profiles, dtype=np.float64))], axis=1)
+    if new.shape[2] != profiles.shape[2]:
+        raise ValueError(f"Profiles must have {profiles.shape[2]} hourly values.")
+
+    start = int(ids.max()) + 1 if len(ids) else 1
+    new_ids = np.arange(start, start + len(new)) if day_ids is None else np.asarray(day_ids)
+    if len(new_ids) != len(new) or np.isin(new_ids, ids).any() or len(set(new_ids.tolist())) != len(new_ids):
+        raise ValueError("Day ids of appended profiles must be new and unique.")
+
+    _write_archive(location_path, np.concatenate([ids, new_ids]).astype(np.int32),
+                   np.concatenate([profiles, new]), {k: v for k, v in meta.items() if k in ('location', 'sources', 'folders')})
+    return new_ids
+
+def main(argv):
+    usage = ("Usage:\n"
+             "  python WDArchive.py migrate <location_path> [<location_path> ...]\n"
+             "  python WDArchive.py sync <location_path> [<location_path> ...]\n"
+             "  python WDArchive.py append <location_path> <tem_csv> <hum_csv> [day_id]")
+    if len(argv) >= 2 and argv[0] == 'migrate':
+        for location_path in argv[1:]:
+            print(f"{location_path}: packed {migrate_location(location_path)} days")
+    elif len(argv) >= 2 and argv[0] == 'sync':
+        for location_path in argv[1:]:
+            print(f"{location_path}: updated {sync_archive(location_path)} days")
+    elif len(argv) in (4, 5) and argv[0] == 'append':
+        day_ids = [int(argv[4])] if len(argv) == 5 else None
+        new_ids = append_days(argv[1], read_profile(argv[2]), read_profile(argv[3]), day_ids)
+        print(f"{argv[1]}: appended day id {new_ids.tolist()}")
+    else:
+        print(usage)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
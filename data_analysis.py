@@ -1,17 +1,6 @@
-import numpy as np
-import pandas as pd
+from DegreeHourETL import station_degree_hours
 
-df = pd.read_csv('./외기온도_시간자료.csv')
-df.columns = ['date', 'tem']
-df = df.set_index('date')
-df.index = pd.to_datetime(df.index)
-
-df['cooling degree hour'] = np.where(df['tem'] > 18, df['tem'] - 18, 0)
-df['heating degree hour'] = np.where(df['tem'] <= 18, 18 - df['tem'], 0)
-df['degree hour'] = df['cooling degree hour'] + df['heating degree hour']
-
-df.to_csv('./degree hour_hourly.csv')
-
-df_daily = df.resample('D').sum()
-
-df_daily.to_csv('./degree hour.csv')
\ No newline at end of file
+# Hourly and daily degree hours of the outdoor temperature record at the 18 °C base.
+# For several stations or base temperatures use DegreeHourETL.py directly.
+station_degree_hours('./외기온도_시간자료.csv', bases=(18,),
+                     hourly_csv='./degree hour_hourly.csv', daily_csv='./degree hour.csv')
@@ -2,17 +2,22 @@ import os
 from Config import read_config
 from AutoAdvice import advice_service
 from AutoAlloc import allocate_energy_consumption
-from ARIMA import arima_model
-from AutoPredict import predict_energy
+from ARIMA import arima_model, arima_order
+from AutoPredict import predict_energy, use_regression_store
+from Session import TableSession
+from Trace import traced
 
 def load_config():
     ini_path = os.path.join('C:\\', 'Users', 'tklee', 'Desktop', 'IASYSTEM')
     config_filename = 'CONFIG.ini'
     return read_config(ini_path, config_filename)
 
+@traced(name='main.main')
 def main():
     # Load configuration
     config = load_config()
+    session = TableSession()
+    use_regression_store(config['Modelpath']['ai_model_path'])
 
     # Define necessary variables using the configuration
     common_ipath = config['Filepath']['input_path']
@@ -30,19 +35,21 @@ def main():
     target_es = config['User Variables']['target_value_of_energy_saving']
 
     # Perform ARIMA model predictions
-    pred_ec1 = arima_model(config['Table Info']['table_path'], config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=(1, 1, 0))
+    pred_ec1 = arima_model(config['Table Info']['table_path'], config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=arima_order(config), session=session, state_path=config['Modelpath']['ai_model_path'])
 
     # Perform regression to predict energy consumption
     pred_ec2 = predict_energy(table_path, config['Table Info']['hybrid_table_filename'], config['Table Info']['ed_table_filename'], hybrid_table_ec_col_name, hybrid_table_ed_col_name, config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
-        common_ipath, pred_tem_input_fname, pred_hum_input_fname, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
+        common_ipath, pred_tem_input_fname, pred_hum_input_fname, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=session)
 
     # Generate advice based on predictions
     advice = advice_service(table_path, config['Table Info']['ed_table_filename'], config['Table Info']['hybrid_table_filename'], config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'], common_ipath, pred_tem_input_fname, pred_hum_input_fname,
-                    hybrid_table_ec_col_name, hybrid_table_ed_col_name, pred_ec2, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es)
+                    hybrid_table_ec_col_name, hybrid_table_ed_col_name, pred_ec2, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, session=session, sch=sch)
 
-    # Allocate predicted energy consumption using ARIMA and Hybrid model predictions
-    arima_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec1)
-    hybrid_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec2)
+    # Allocate predicted energy consumption using ARIMA and Hybrid model predictions; the latest
+    # 15-minute readings are folded into the stored weekday profiles first
+    new_ec_min_file = os.path.join(common_ipath, config['Filepath']['ec_min_input_filename'])
+    arima_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec1, session=session, new_readings_file=new_ec_min_file)
+    hybrid_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec2, session=session, new_readings_file=new_ec_min_file)
 
     # Optionally print results or perform further processing
     print("ARIMA Predictions:", arima_pred)
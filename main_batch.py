@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from Config import IASYSTEM_ROOT
+from AutoAdvice import advice_service
+from AutoAlloc import allocate_energy_consumption
+from ARIMA import arima_model, arima_order
+from BatchARIMA import batch_arima_forecasts
+from AutoPredict import predict_energy, save_regression_store, use_regression_store
+from Session import TableSession
+from DegreeHour import online_energy_model, predict_next_day_energy
+from Seasons import resolve_season, load_seasonal_config
+from Registry import WD_ROOT, REGISTRY_FILENAME, load_registry, registry_config
+
+METHODS = ('arima', 'hybrid', 'degree-hour')
+
+def run_method(config, method, session, next_day_temperature_file=None, sch=1, arima_forecast=None):
+    """
+    Run one prediction method for a building configured by registry_config.
+
+    For the 'arima' method a forecast computed beforehand (see batch_arima_forecasts) can be
+    passed as arima_forecast; the building's series is then not fitted again.
+
+    Returns:
+        dict: 'prediction' and, depending on the method, 'allocation' (per 15-minute slot),
+              'hourly' (degree-hour prediction) and 'advice' (list of records).
+    """
+    table_path = config['Table Info']['table_path']
+    common_ipath = config['Filepath']['input_path']
+    user = config['User Variables']
+    result = {}
+
+    if method == 'arima' and arima_forecast is not None:
+        result['prediction'] = arima_forecast
+    elif method == 'arima':
+        result['prediction'] = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], 'eg_value', order=arima_order(config),
+                                           session=session, state_path=config['Modelpath']['ai_model_path'])
+        if result['prediction'] is None:
+            raise ValueError("ARIMA forecast failed.")
+    elif method == 'hybrid':
+        result['prediction'] = predict_energy(table_path, config['Table Info']['hybrid_table_filename'], config['Table Info']['ed_table_filename'], 'EC', 'ED',
+                                              config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
+                                              common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'], sch,
+                                              user['setpoint_temperature_machine'], user['setpoint_humidity_machine'],
+                                              user['setpoint_temperature_office_heating'], user['setpoint_temperature_office_cooling'], session=session)
+    elif method == 'degree-hour':
+        if next_day_temperature_file is None:
+            raise ValueError("The degree-hour method needs a next-day hourly temperature file.")
+        model = online_energy_model(os.path.join(table_path, config['Table Info']['tem_hourly_table_filename']),
+                                    os.path.join(table_path, config['Table Info']['ec_hourly_table_filename']),
+                                    config['Modelpath']['ai_model_path'], session=session)
+        hourly = predict_next_day_energy(model, pd.read_csv(next_day_temperature_file))['Predicted_Energy'].to_numpy()
+        result['prediction'] = float(hourly.sum())
+        result['hourly'] = hourly.tolist()
+        return result
+    else:
+        raise ValueError(f"Unknown method '{method}'; use one of {', '.join(METHODS)}.")
+
+    result['prediction'] = float(np.ravel(result['prediction'])[0])
+    allocated = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], result['prediction'], session=session,
+                                            new_readings_file=os.path.join(common_ipath, config['Filepath']['ec_min_input_filename']))
+    result['allocation'] = np.ravel(allocated).tolist()
+
+    if method == 'hybrid':
+        advice = advice_service(table_path, config['Table Info']['ed_table_filename'], config['Table Info']['hybrid_table_filename'],
+                                config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
+                                common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'],
+                                'EC', 'ED', result['prediction'], user['setpoint_temperature_machine'], user['setpoint_humidity_machine'],
+                                user['setpoint_temperature_office_heating'], user['setpoint_temperature_office_cooling'],
+                                user['target_value_of_energy_saving'], session=session, sch=sch)
+        result['advice'] = advice.to_dict('records')
+    return result
+
+def run_batch(building_ids=None, methods=('hybrid',), season='date', next_day_temperature_file=None, registry_file=None,
+              ini_path=IASYSTEM_ROOT, wd_root=WD_ROOT, session=None, order=None):
+    """
+    Run every (building, method) combination in one process, sharing loaded tables through one session.
+
+    With the default order the ARIMA(1, 1, 0) forecasts of all buildings are computed together by
+    batch_arima_forecasts; buildings it leaves out, and every building with another order, are
+    fitted one by one with statsmodels.
+
+    Parameters:
+        building_ids (list, optional): Buildings to run; all registered buildings when omitted.
+        methods (list): Methods from METHODS.
+        season (str): Season mode for resolve_season ('date', 'temperature' or a season name).
+        next_day_temperature_file (str, optional): Next-day hourly temperature CSV (degree-hour method, 'temperature' season mode).
+        registry_file (str, optional): Building registry; defaults to building_ids.xlsx in the input folder.
+        ini_path (str): Folder of the seasonal configuration files.
+        wd_root (str): Root folder of the per-location weather profiles.
+        session (TableSession, optional): Session shared by all runs.
+        order (str, optional): ARIMA order ('auto' or 'p, d, q'); overrides the [ARIMA] section of the config.
+
+    Returns:
+        tuple: (season, list of result dictionaries, one per building and method).
+    """
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}'; use one of {', '.join(METHODS)}.")
+    if session is None:
+        session = TableSession()
+
+    season = resolve_season(season, next_day_temperature_file)
+    config = load_seasonal_config(season, ini_path)
+    use_regression_store(config['Modelpath']['ai_model_path'])
+    if order is not None:
+        config.setdefault('ARIMA', {})['order'] = order
+    registry = load_registry(registry_file or os.path.join(config['Filepath']['input_path'], REGISTRY_FILENAME), ini_path, wd_root)
+    if not building_ids:
+        building_ids = list(registry['buildings'])
+
+    buildings = {}
+    for building_id in building_ids:
+        building_id = str(building_id)
+        try:
+            buildings[building_id] = registry_config(registry, config, building_id)
+        except KeyError as e:
+            buildings[building_id] = e
+
+    daily_tables = {building_id: os.path.join(building['Table Info']['table_path'], building['Table Info']['ec_daily_table_filename'])
+                    for building_id, building in buildings.items() if not isinstance(building, Exception)}
+    batched = 'arima' in methods and arima_order(config) == (1, 1, 0)
+    arima_forecasts = batch_arima_forecasts(list(daily_tables.values()), 'eg_value', session) if batched else {}
+
+    results = []
+    for building_id, building in buildings.items():
+        if isinstance(building, Exception):
+            results.extend({'building_id': building_id, 'method': method, 'error': building.args[0]} for method in methods)
+            continue
+        for method in methods:
+            entry = {'building_id': building_id, 'location': building['Table Info']['location'], 'method': method}
+            try:
+                entry.update(run_method(building, method, session, next_day_temperature_file,
+                                        arima_forecast=arima_forecasts.get(daily_tables[building_id])))
+            except Exception as e:
+                entry['error'] = f"{type(e).__name__}: {e}"
+            results.append(entry)
+    save_regression_store()
+    return season, results
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def write_results(results, season, output_path):
+    """
+    Write results.json (every result) and allocation.csv (one column per building and method).
+
+    Returns:
+        list: Paths of the written files.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    results_file = os.path.join(output_path, 'results.json')
+    with open(results_file, 'w', encoding='utf-8') as f:
+        json.dump({'season': season, 'results': results}, f, ensure_ascii=False, indent=2, default=_json_default)
+
+    written = [results_file]
+    allocations = {f"{r['building_id']}:{r['method']}": r['allocation'] for r in results if 'allocation' in r}
+    if allocations:
+        allocation_file = os.path.join(output_path, 'allocation.csv')
+        pd.DataFrame(allocations).to_csv(allocation_file, index_label='slot')
+        written.append(allocation_file)
+    return written
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run predictions, allocation and advice for many buildings without prompts.")
+    parser.add_argument('--job', help="JSON job file; its keys (buildings, methods, season, output, ...) are defaults for the options below")
+    parser.add_argument('--buildings', nargs='*', help="Building IDs; all registered buildings when omitted")
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=['hybrid'])
+    parser.add_argument('--season', default='date', help="'date', 'temperature', 'heating', 'cooling' or 'transition'")
+    parser.add_argument('--arima-order', dest='arima_order', help="'auto' or 'p, d, q'; defaults to the [ARIMA] section of the config")
+    parser.add_argument('--next-day-temperature', dest='next_day_temperature', help="Next-day hourly temperature CSV")
+    parser.add_argument('--registry', help="Building registry (building_ids.xlsx)")
+    parser.add_argument('--ini-path', dest='ini_path', default=IASYSTEM_ROOT, help="Folder of the CONFIG_<SEASON>.ini files")
+    parser.add_argument('--wd-root', dest='wd_root', default=WD_ROOT, help="Root folder of the weather profiles")
+    parser.add_argument('--output', default=os.path.join(IASYSTEM_ROOT, 'OUTPUT'), help="Folder for results.json and allocation.csv")
+
+    args, _ = parser.parse_known_args(argv)
+    if args.job:
+        with open(args.job, encoding='utf-8') as f:
+            job = json.load(f)
+        parser.set_defaults(**{key.replace('-', '_'): value for key, value in job.items()})
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    season, results = run_batch(args.buildings, args.methods, args.season, args.next_day_temperature, args.registry,
+                                args.ini_path, args.wd_root, order=args.arima_order)
+    for path in write_results(results, season, args.output):
+        print(f"Wrote {path}")
+
+    failed = [r for r in results if 'error' in r]
+    for r in failed:
+        print(f"Building {r['building_id']} ({r['method']}) failed: {r['error']}")
+    print(f"Season: {season}; {len(results) - len(failed)} of {len(results)} runs succeeded.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,22 +3,24 @@ import pandas as pd
 from Config import read_config
 from AutoAdvice import advice_service
 from AutoAlloc import allocate_energy_consumption
-from ARIMA import arima_model
-from AutoPredict import predict_energy
-
-def read_building_ids(filepath, sheet_name='Sheet1'):
-    df = pd.read_excel(filepath, sheet_name=sheet_name)
-    df['Building_ID'] = df['Building_ID'].astype(str)  # Make sure Building_ID is a string
-    return df.set_index('Building_ID')
+from ARIMA import arima_model, arima_order
+from AutoPredict import predict_energy, use_regression_store
+from AutoProfile import new_readings_filename
+from Session import TableSession
+from Trace import traced, set_building
+from Registry import load_registry, registry_frame
 
 def load_config():
     ini_path = os.path.join('C:\\', 'Users', 'tklee', 'Desktop', 'IASYSTEM')
     config_filename = 'CONFIG.ini'
     return read_config(ini_path, config_filename)
 
+@traced(name='main_ids.main')
 def main():
     # Load configuration
     config = load_config()
+    session = TableSession()
+    use_regression_store(config['Modelpath']['ai_model_path'])
 
     # Define necessary variables using the configuration
     common_ipath = config['Filepath']['input_path']
@@ -39,15 +41,17 @@ def main():
     # Get Building ID from user input
     building_id = input("Please enter the Building ID: ")
     building_id = str(building_id)
+    set_building(building_id)
 
-    # Read building IDs
-    building_data = read_building_ids(building_id_filepath)
+    # Read building IDs from the compiled registry (rebuilt only when the workbook changes)
+    building_data = registry_frame(load_registry(building_id_filepath))
 
     if building_id in building_data.index:
         config['Table Info']['hybrid_table_filename'] = building_data.loc[building_id, 'Hybrid DB']
         config['Table Info']['ed_table_filename'] = building_data.loc[building_id, 'ED DB']
         config['Table Info']['ec_daily_table_filename'] = building_data.loc[building_id, 'EC Daily']
         config['Table Info']['ec_min_table_filename'] = building_data.loc[building_id, 'EC Minutely']
+        config['Filepath']['ec_min_input_filename'] = new_readings_filename(building_data.loc[building_id, 'EC Minutely'])
 
         # Update temperature and humidity paths based on the location
         location = building_data.loc[building_id, 'Location']
@@ -65,19 +69,20 @@ def main():
     print(f"Processing for Building ID: {building_id}")
     
     # Perform ARIMA model predictions
-    pred_ec1 = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=(1, 1, 0))
+    pred_ec1 = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=arima_order(config), session=session, state_path=config['Modelpath']['ai_model_path'])
 
     # Perform regression to predict energy consumption
     pred_ec2 = predict_energy(table_path, config['Table Info']['hybrid_table_filename'], config['Table Info']['ed_table_filename'], 'EC', 'ED', config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
-                              common_ipath, pred_tem_input_fname, pred_hum_input_fname, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
+                              common_ipath, pred_tem_input_fname, pred_hum_input_fname, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=session)
 
     # Generate advice based on predictions
     advice = advice_service(table_path, config['Table Info']['ed_table_filename'], config['Table Info']['hybrid_table_filename'], config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'], common_ipath, pred_tem_input_fname, pred_hum_input_fname,
-                            'EC', 'ED', pred_ec2, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es)
+                            'EC', 'ED', pred_ec2, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, session=session, sch=sch)
 
-    # Allocate predicted energy consumption using ARIMA and Hybrid model predictions
-    arima_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec1)
-    hybrid_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec2)
+    # Allocate predicted energy consumption using ARIMA and Hybrid model predictions, after folding in the building's new readings
+    new_ec_min_file = os.path.join(common_ipath, config['Filepath']['ec_min_input_filename'])
+    arima_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec1, session=session, new_readings_file=new_ec_min_file)
+    hybrid_pred = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_ec2, session=session, new_readings_file=new_ec_min_file)
 
     # Print results or perform further processing
     print(f"ARIMA Predictions for Building {building_id}:", arima_pred)
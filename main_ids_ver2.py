@@ -3,23 +3,25 @@ import pandas as pd
 from Config import read_config
 from AutoAdvice import advice_service
 from AutoAlloc import allocate_energy_consumption
-from ARIMA import arima_model
-from AutoPredict import predict_energy
-from DegreeHour import load_data, calculate_degree_hours, train_energy_model, predict_next_day_energy
-
-def read_building_ids(filepath, sheet_name='Sheet1'):
-    df = pd.read_excel(filepath, sheet_name=sheet_name)
-    df['Building_ID'] = df['Building_ID'].astype(str)  # Ensure Building_ID is a string
-    return df.set_index('Building_ID')
+from ARIMA import arima_model, arima_order
+from AutoPredict import predict_energy, use_regression_store
+from AutoProfile import new_readings_filename
+from Session import TableSession
+from Trace import traced, set_building
+from Registry import load_registry, registry_frame
+from DegreeHour import online_energy_model, predict_next_day_energy
 
 def load_config():
     ini_path = os.path.join('C:\\', 'Users', 'tklee', 'Desktop', 'IASYSTEM')
     config_filename = 'CONFIG.ini'
     return read_config(ini_path, config_filename)
 
+@traced(name='main_ids_ver2.main')
 def main():
     # Load configuration
     config = load_config()
+    session = TableSession()
+    use_regression_store(config['Modelpath']['ai_model_path'])
 
     # Define necessary variables using the configuration
     common_ipath = config['Filepath']['input_path']
@@ -40,15 +42,17 @@ def main():
     # Get Building ID from user input
     building_id = input("Please enter the Building ID: ")
     building_id = str(building_id)
+    set_building(building_id)
 
-    # Read building IDs
-    building_data = read_building_ids(building_id_filepath)
+    # Read building IDs from the compiled registry (rebuilt only when the workbook changes)
+    building_data = registry_frame(load_registry(building_id_filepath))
 
     if building_id in building_data.index:
         config['Table Info']['hybrid_table_filename'] = building_data.loc[building_id, 'Hybrid DB']
         config['Table Info']['ed_table_filename'] = building_data.loc[building_id, 'ED DB']
         config['Table Info']['ec_daily_table_filename'] = building_data.loc[building_id, 'EC Daily']
         config['Table Info']['ec_min_table_filename'] = building_data.loc[building_id, 'EC Minutely']
+        config['Filepath']['ec_min_input_filename'] = new_readings_filename(building_data.loc[building_id, 'EC Minutely'])
 
         # Update temperature and humidity paths based on the location
         location = building_data.loc[building_id, 'Location']
@@ -74,10 +78,10 @@ def main():
 
     # Execute predictions and calculate advice based on the selected method
     if method_choice == '1':
-        pred_result = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=(1, 1, 0))
+        pred_result = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=arima_order(config), session=session, state_path=config['Modelpath']['ai_model_path'])
     elif method_choice == '2':
         pred_result = predict_energy(table_path, config['Table Info']['hybrid_table_filename'], config['Table Info']['ed_table_filename'], 'EC', 'ED', config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
-                                     common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'], sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
+                                     common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'], sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=session)
     elif method_choice == '3':
         new_tem_input_fname = input("Enter the next day hourly temperature input filename: ")
         new_temperature_path = os.path.join(common_ipath, new_tem_input_fname)
@@ -86,11 +90,8 @@ def main():
         # Load and prepare data
         temperature_file = os.path.join(table_path, tem_hour_table_fname)
         energy_file = os.path.join(table_path, ec_hour_table_fname)
-        temp_df, energy_df = load_data(temperature_file, energy_file)
-        temp_df = calculate_degree_hours(temp_df)
-
-        # Train the model
-        model = train_energy_model(temp_df, energy_df)
+        # Bring the stored model up to date with the rows added since the last run
+        model = online_energy_model(temperature_file, energy_file, config['Modelpath']['ai_model_path'], session=session)
 
         # Assuming 'next_day_temperature.csv' for predictions
         next_day_temp_df = pd.read_csv(new_temperature_file)
@@ -105,7 +106,8 @@ def main():
 
     if method_choice == '1' or method_choice == '2':
         # Allocate predicted energy consumption using the selected prediction method
-        allocated_result = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_result)
+        allocated_result = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_result, session=session,
+                                                       new_readings_file=os.path.join(common_ipath, config['Filepath']['ec_min_input_filename']))
         # Output the results and advice
         print(f"Prediction result for Building {building_id} using method {method_choice}: {pred_result}")
         print(f"Allocated Energy Consumption for Building {building_id}: {allocated_result}")
@@ -113,7 +115,7 @@ def main():
     # Generate advice based on predictions
     if method_choice == '2':
         advice = advice_service(table_path, config['Table Info']['ed_table_filename'], config['Table Info']['hybrid_table_filename'], config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'], common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'],
-                                'EC', 'ED', pred_result, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es)
+                                'EC', 'ED', pred_result, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, session=session, sch=sch)
         print(f"Advice DataFrame for Building {building_id}:", advice)
 
 if __name__ == "__main__":
@@ -2,46 +2,16 @@ import os
 import pandas as pd
 from datetime import datetime, timedelta
 import threading
-from Config import read_config
 from AutoAdvice import advice_service
 from AutoAlloc import allocate_energy_consumption
-from ARIMA import arima_model
-from AutoPredict import predict_energy
-from DegreeHour import load_data, calculate_degree_hours, train_energy_model, predict_next_day_energy
-
-
-# Function to determine the current season based on month and day
-def determine_season(month, day):
-    if (month in (12, 1, 2)) or (month == 3 and day < 21):
-        return 'heating'
-    elif (month in (6, 7, 8)) or (month == 9 and day < 23):
-        return 'cooling'
-    else:
-        return 'transition'
-
-
-# Function to determine the season based on external temperature
-def determine_season_from_temperature(temperature):
-    if temperature < 10:
-        return 'heating'
-    elif temperature > 20:
-        return 'cooling'
-    else:
-        return 'transition'
-
-
-# Function to load seasonal configuration based on the season name
-def load_seasonal_config(season):
-    ini_path = os.path.join('C:\\', 'Users', 'tklee', 'Desktop', 'IASYSTEM')
-    config_filename = f'CONFIG_{season.upper()}.ini'
-    return read_config(ini_path, config_filename)
-
-
-# Function to read building IDs from Excel
-def read_building_ids(filepath, sheet_name='Sheet1'):
-    df = pd.read_excel(filepath, sheet_name=sheet_name)
-    df['Building_ID'] = df['Building_ID'].astype(str)  # Ensure Building_ID is a string
-    return df.set_index('Building_ID')
+from ARIMA import arima_model, arima_order
+from AutoPredict import predict_energy, use_regression_store
+from Session import TableSession
+from Trace import traced
+from Fleet import building_jobs, fleet_workers, run_fleet
+from DegreeHour import online_energy_model, predict_next_day_energy
+from Seasons import determine_season, determine_season_from_temperature, load_seasonal_config
+from Registry import WD_ROOT, load_registry, registry_frame, building_config
 
 
 # Function to get user input with a timeout
@@ -67,72 +37,40 @@ def input_with_timeout(prompt, timeout=10, default='1'):
 
 
 # Function to aggregate all buildings' energy demands using method 2
+@traced(name='main_ids_ver3.aggregate_all_buildings_demand')
 def aggregate_all_buildings_demand(building_id_filepath, season):
-    # Load seasonal configuration
-    config = load_seasonal_config(season)
+    # Load the compiled registry (rebuilt only when the workbook or a CONFIG file changes) and the seasonal configuration
+    registry = load_registry(building_id_filepath)
+    config = load_seasonal_config(season, registry=registry)
+    use_regression_store(config['Modelpath']['ai_model_path'])
 
     # Define necessary variables from the configuration
-    common_ipath = config['Filepath']['input_path']
-    table_path = config['Table Info']['table_path']
     sch = 1
-    set_tem_mach = config['User Variables']['setpoint_temperature_machine']
-    set_hum_mach = config['User Variables']['setpoint_humidity_machine']
-    set_tem_oheat = config['User Variables']['setpoint_temperature_office_heating']
-    set_tem_ocool = config['User Variables']['setpoint_temperature_office_cooling']
-
-    # Read all buildings from the Excel file
-    building_data = read_building_ids(building_id_filepath)
-
-    # Aggregate energy predictions across all buildings using method 2
-    total_demand = pd.DataFrame()
-
-    for building_id in building_data.index:
-        config['Table Info']['hybrid_table_filename'] = building_data.loc[building_id, 'Hybrid DB']
-        config['Table Info']['ed_table_filename'] = building_data.loc[building_id, 'ED DB']
-        config['Table Info']['ec_daily_table_filename'] = building_data.loc[building_id, 'EC Daily']
-        config['Table Info']['ec_min_table_filename'] = building_data.loc[building_id, 'EC Minutely']
-        
-        location = building_data.loc[building_id, 'Location']
-
-        # Update paths for each building
-        config['Table Info']['hybrid_table_filename'] = building_data.loc[building_id, 'Hybrid DB']
-        config['Table Info']['ed_table_filename'] = building_data.loc[building_id, 'ED DB']
-        config['Table Info']['temperature_profile_storage_path'] = os.path.join('C:\\Users\\tklee\\Desktop\\IASYSTEM\\STORAGE\\WD', location, 'TEM')
-        config['Table Info']['humidity_profile_storage_path'] = os.path.join('C:\\Users\\tklee\\Desktop\\IASYSTEM\\STORAGE\\WD', location, 'HUM')
-        config['Filepath']['temperature_input_filename'] = f"Pred_{location}_Tem_hourly.csv"
-        config['Filepath']['humidity_input_filename'] = f"Pred_{location}_Hum_hourly.csv"
-
-        # Perform the energy prediction for each building (option 2)
-        pred_result = predict_energy(table_path, config['Table Info']['hybrid_table_filename'], config['Table Info']['ed_table_filename'], 'EC', 'ED', config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
-                                     common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'], sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
-        allocated_result = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_result)
-        
-        # Ensure pred_result is a DataFrame
-        if not isinstance(allocated_result, pd.DataFrame):
-            allocated_result = pd.DataFrame(allocated_result).transpose()
 
-        # Append each building's prediction result into total_demand
-        total_demand = pd.concat([total_demand, allocated_result], axis=1)
-    
+    # All buildings of the registry
+    building_data = registry_frame(registry)
+
+    # Predict every building (option 2) on a process pool; weather matching runs once per location
+    jobs = building_jobs(building_data, config, WD_ROOT, sch)
+    results, errors = run_fleet(jobs, max_workers=fleet_workers(config))
+
+    # Aggregate energy predictions across the buildings that succeeded
+    total_demand = pd.DataFrame(results, columns=[job['building_id'] for job in jobs]).drop(columns=list(errors))
     total_demand['Total'] = total_demand.sum(axis=1)
 
     print("Aggregated Total Energy Demand Across All Buildings:")
     print(total_demand['Total'])
 
 # Function to process individual building demand predictions
-def process_individual_building(config, season, building_id, building_data, common_ipath, table_path, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, ec_day_table_ec_col_name, ec_hour_table_fname, tem_hour_table_fname):
+@traced(name='main_ids_ver3.process_individual_building', building='building_id')
+def process_individual_building(config, season, building_id, building_data, common_ipath, table_path, sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, ec_day_table_ec_col_name, ec_hour_table_fname, tem_hour_table_fname, session=None):
+    if session is None:
+        session = TableSession()
+
     if building_id in building_data.index:
-        config['Table Info']['hybrid_table_filename'] = building_data.loc[building_id, 'Hybrid DB']
-        config['Table Info']['ed_table_filename'] = building_data.loc[building_id, 'ED DB']
-        config['Table Info']['ec_daily_table_filename'] = building_data.loc[building_id, 'EC Daily']
-        config['Table Info']['ec_min_table_filename'] = building_data.loc[building_id, 'EC Minutely']
-
-        # Update temperature and humidity paths based on the location
-        location = building_data.loc[building_id, 'Location']
-        config['Table Info']['temperature_profile_storage_path'] = os.path.join('C:\\Users\\tklee\\Desktop\\IASYSTEM\\STORAGE\\WD', location, 'TEM')
-        config['Table Info']['humidity_profile_storage_path'] = os.path.join('C:\\Users\\tklee\\Desktop\\IASYSTEM\\STORAGE\\WD', location, 'HUM')
-        config['Filepath']['temperature_input_filename'] = f"Pred_{location}_Tem_hourly.csv"
-        config['Filepath']['humidity_input_filename'] = f"Pred_{location}_Hum_hourly.csv"
+        # Point the configuration at the building's tables and its location's weather data
+        config = building_config(config, building_data, building_id)
+        location = config['Table Info']['location']
 
         print(f"Configuration updated for Building ID: {building_id} with Location: {location} and Season: {season.capitalize()}")
 
@@ -148,10 +86,10 @@ def process_individual_building(config, season, building_id, building_data, comm
 
         # Execute predictions and calculate advice based on the selected method
         if method_choice == '1':
-            pred_result = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=(1, 1, 0))
+            pred_result = arima_model(table_path, config['Table Info']['ec_daily_table_filename'], ec_day_table_ec_col_name, order=arima_order(config), session=session, state_path=config['Modelpath']['ai_model_path'])
         elif method_choice == '2':
             pred_result = predict_energy(table_path, config['Table Info']['hybrid_table_filename'], config['Table Info']['ed_table_filename'], 'EC', 'ED', config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'],
-                                         common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'], sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool)
+                                         common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'], sch, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, session=session)
         elif method_choice == '3':
             new_tem_input_fname = input("Enter the next day hourly temperature input filename: ")
             new_temperature_path = os.path.join(common_ipath, new_tem_input_fname)
@@ -160,11 +98,8 @@ def process_individual_building(config, season, building_id, building_data, comm
             # Load and prepare data
             temperature_file = os.path.join(table_path, tem_hour_table_fname)
             energy_file = os.path.join(table_path, ec_hour_table_fname)
-            temp_df, energy_df = load_data(temperature_file, energy_file)
-            temp_df = calculate_degree_hours(temp_df)
-
-            # Train the model
-            model = train_energy_model(temp_df, energy_df)
+            # Bring the stored model up to date with the rows added since the last run
+            model = online_energy_model(temperature_file, energy_file, config['Modelpath']['ai_model_path'], session=session)
 
             # Assuming 'next_day_temperature.csv' for predictions
             next_day_temp_df = pd.read_csv(new_temperature_file)
@@ -178,7 +113,8 @@ def process_individual_building(config, season, building_id, building_data, comm
 
         if method_choice in ('1', '2'):
             # Allocate predicted energy consumption using the selected prediction method
-            allocated_result = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_result)
+            allocated_result = allocate_energy_consumption(table_path, config['Table Info']['ec_min_table_filename'], pred_result, session=session,
+                                                           new_readings_file=os.path.join(common_ipath, config['Filepath']['ec_min_input_filename']))
             # Output the results and advice
             print(f"Prediction result for Building {building_id} using method {method_choice}: {pred_result}")
             print(f"Allocated Energy Consumption for Building {building_id}: {allocated_result}")
@@ -186,11 +122,12 @@ def process_individual_building(config, season, building_id, building_data, comm
         # Generate advice based on predictions
         if method_choice == '2':
             advice = advice_service(table_path, config['Table Info']['ed_table_filename'], config['Table Info']['hybrid_table_filename'], config['Table Info']['temperature_profile_storage_path'], config['Table Info']['humidity_profile_storage_path'], common_ipath, config['Filepath']['temperature_input_filename'], config['Filepath']['humidity_input_filename'],
-                                    'EC', 'ED', pred_result, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es)
+                                    'EC', 'ED', pred_result, set_tem_mach, set_hum_mach, set_tem_oheat, set_tem_ocool, target_es, session=session, sch=sch)
             print(f"Advice DataFrame for Building {building_id}:", advice)
 
 
 # Main function with option selection
+@traced(name='main_ids_ver3.main')
 def main():
     # Path to the Excel file with Building IDs
     building_id_filepath = os.path.join('C:\\', 'Users', 'tklee', 'Desktop', 'IASYSTEM', 'INPUT', 'building_ids.xlsx')
@@ -237,7 +174,9 @@ def main():
         
     elif option_choice == '2':
         # Option 2: Process an individual building
-        config = load_seasonal_config(season)
+        registry = load_registry(building_id_filepath)
+        config = load_seasonal_config(season, registry=registry)
+        use_regression_store(config['Modelpath']['ai_model_path'])
 
         # Define necessary variables using the seasonal configuration
         common_ipath = config['Filepath']['input_path']
@@ -252,8 +191,8 @@ def main():
         ec_hour_table_fname = config['Table Info']['ec_hourly_table_filename']
         tem_hour_table_fname = config['Table Info']['tem_hourly_table_filename']
 
-        # Read building IDs
-        building_data = read_building_ids(building_id_filepath)
+        # Building IDs of the compiled registry
+        building_data = registry_frame(registry)
 
         # Get Building ID from user input
         building_id = input("Please enter the Building ID: ")
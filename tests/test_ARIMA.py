@@ -0,0 +1,114 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import ARIMA
+from ARIMA import _arima_class, _state_file, arima_model, update_arima
+
+def _series(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    steps = np.zeros(n)
+    for i in range(1, n):
+        steps[i] = 0.5 * steps[i - 1] + rng.normal(0, 10)
+    return 1000 + np.cumsum(steps)
+
+def _daily(path, series):
+    pd.DataFrame({'date': pd.date_range('2024-01-01', periods=len(series)).strftime('%Y-%m-%d'),
+                  'eg_value': series}).to_csv(path, index=False)
+
+@pytest.fixture
+def fits(monkeypatch):
+    calls = []
+    original = ARIMA._arima_class
+
+    def counting():
+        cls = original()
+
+        def make(*args, **kwargs):
+            calls.append(len(args[0]))
+            return cls(*args, **kwargs)
+        return make
+    monkeypatch.setattr(ARIMA, '_arima_class', counting)
+    return calls
+
+def test_append_matches_a_filter_with_the_same_parameters():
+    series = _series()
+    _, state, refitted = update_arima(series[:-1], (1, 1, 0))
+    assert refitted
+    results, state, refitted = update_arima(series, (1, 1, 0), state)
+
+    assert not refitted
+    assert state['n_obs'] == len(series) and state['appended'] == 1
+    expected = _arima_class()(series, order=(1, 1, 0)).smooth(results.params).forecast()
+    np.testing.assert_allclose(results.forecast(), expected)
+
+def test_scheduled_refit():
+    series = _series()
+    _, state, _ = update_arima(series[:-3], (1, 1, 0), refit_every=3)
+    _, state, refitted = update_arima(series[:-1], (1, 1, 0), state, refit_every=3)
+    assert not refitted
+    _, state, refitted = update_arima(series, (1, 1, 0), state, refit_every=3)
+    assert refitted and state['appended'] == 0
+
+def test_drift_triggers_a_refit():
+    series = _series()
+    _, state, _ = update_arima(series[:-1], (1, 1, 0))
+    jumped = np.append(series[:-1], series[-2] + 1000)
+    _, _, refitted = update_arima(jumped, (1, 1, 0), state)
+    assert refitted
+
+@pytest.mark.parametrize('change', ['edited', 'shorter', 'order'])
+def test_unusable_state_is_refitted(change):
+    series = _series()
+    _, state, _ = update_arima(series[:-1], (1, 1, 0))
+    order = (1, 1, 0)
+    if change == 'edited':
+        series = series.copy()
+        series[10] += 50
+    elif change == 'shorter':
+        series = series[:-5]
+    else:
+        order = (2, 1, 0)
+    results, _, refitted = update_arima(series, order, state)
+
+    assert refitted
+    expected = _arima_class()(series, order=order).fit()
+    np.testing.assert_allclose(results.params, expected.params)
+
+def test_persisted_forecast_matches_a_fresh_fit(tmp_path, fits):
+    series = _series()
+    _daily(tmp_path / 'EC_DAILY.csv', series[:-1])
+    state_path = str(tmp_path / 'MODEL')
+    first = arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value', state_path=state_path)
+    assert first == pytest.approx(arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value'))
+
+    _daily(tmp_path / 'EC_DAILY.csv', series)
+    arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value', state_path=state_path)
+    assert fits == [len(series) - 1, len(series) - 1]  # The new day was appended without a fit
+    assert os.path.exists(_state_file(state_path, 'EC_DAILY.csv'))
+    assert not [name for name in os.listdir(state_path) if name.endswith('.tmp')]
+
+def test_unreadable_state_is_refitted(tmp_path, fits):
+    series = _series()
+    _daily(tmp_path / 'EC_DAILY.csv', series)
+    state_path = tmp_path / 'MODEL'
+    state_path.mkdir()
+    (state_path / 'EC_DAILY_arima.pkl').write_bytes(b'truncated')
+
+    forecast = arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value', state_path=str(state_path))
+    assert forecast == pytest.approx(arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value'))
+    assert len(fits) == 2
+
+@pytest.mark.parametrize('error', [ImportError, AttributeError, TypeError])
+def test_state_from_other_library_versions_is_refitted(tmp_path, fits, monkeypatch, error):
+    series = _series()
+    _daily(tmp_path / 'EC_DAILY.csv', series)
+    state_path = str(tmp_path / 'MODEL')
+    arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value', state_path=state_path)
+
+    def load(f):
+        raise error("pickled under another version")
+    monkeypatch.setattr(ARIMA.pickle, 'load', load)
+    forecast = arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value', state_path=state_path)
+    assert forecast == pytest.approx(arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value'))
+    assert len(fits) == 3
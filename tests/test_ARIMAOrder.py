@@ -0,0 +1,99 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import ARIMA
+from ARIMA import (ORDER_GRID, _arima_class, arima_model, arima_order, cached_arima_order, differencing_order,
+                   score_order, select_arima_order)
+
+def _random_walk(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    steps = np.zeros(n)
+    for i in range(1, n):
+        steps[i] = 0.5 * steps[i - 1] + rng.normal(0, 10)
+    return 1000 + np.cumsum(steps)
+
+def _stationary(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    values = np.zeros(n)
+    for i in range(1, n):
+        values[i] = 0.3 * values[i - 1] + rng.normal(0, 10)
+    return 1000 + values
+
+@pytest.fixture
+def searches(monkeypatch):
+    calls = []
+    original = ARIMA.select_arima_order
+
+    def counting(time_series, *args, **kwargs):
+        calls.append(len(time_series))
+        return original(time_series, *args, **kwargs)
+    monkeypatch.setattr(ARIMA, 'select_arima_order', counting)
+    return calls
+
+@pytest.mark.parametrize('setting, expected', [(None, (1, 1, 0)), ('auto', 'auto'), (' Auto ', 'auto'), ('2, 1, 1', (2, 1, 1))])
+def test_arima_order_setting(setting, expected):
+    config = {'ARIMA': {'order': setting}} if setting is not None else {}
+    assert arima_order(config) == expected
+
+def test_invalid_order_setting():
+    with pytest.raises(ValueError):
+        arima_order({'ARIMA': {'order': '1, 1'}})
+
+def test_differencing_order():
+    assert differencing_order(_random_walk()) == 1
+    assert differencing_order(_stationary()) == 0
+
+@pytest.mark.parametrize('make, d', [(_random_walk, 1), (_stationary, 0)])
+def test_information_criteria_rank_one_d(make, d):
+    series = make()
+    ranked = select_arima_order(series, max_workers=1)
+    assert {c['order'][1] for c in ranked} == {d}
+
+    # The choice is the lowest AIC among the candidates with that d
+    expected = [score_order(series, order) for order in ORDER_GRID if order[1] == d]
+    best = min((c for c in expected if c['score'] is not None and c['converged']), key=lambda c: c['score'])
+    assert ranked[0]['order'] == best['order']
+
+def test_holdout_ranks_the_whole_grid():
+    ranked = select_arima_order(_random_walk(120), criterion='holdout', max_workers=1)
+    assert len(ranked) == len(ORDER_GRID)
+
+def test_cached_order_is_reused_until_the_series_changes(tmp_path, searches):
+    series = _random_walk()
+    cache_file = str(tmp_path / 'EC_order.json')
+    order, params = cached_arima_order(series, cache_file, max_workers=1)
+    assert cached_arima_order(series[:], cache_file, max_workers=1) == (order, params)
+    assert cached_arima_order(_random_walk(310), cache_file, max_workers=1)[0] == order  # Growth under 10%
+    assert searches == [300]
+
+    edited = series.copy()
+    edited[5] += 100
+    cached_arima_order(edited, cache_file, max_workers=1)
+    cached_arima_order(_random_walk(340), cache_file, max_workers=1)
+    assert searches == [300, 300, 340]
+    with open(cache_file, encoding='utf-8') as f:
+        assert json.load(f)['n_obs'] == 340
+
+def test_auto_order_starts_from_the_cached_parameters(tmp_path, monkeypatch):
+    pd.DataFrame({'eg_value': _random_walk()}).to_csv(tmp_path / 'EC_DAILY.csv', index=False)
+    series = pd.read_csv(tmp_path / 'EC_DAILY.csv')['eg_value'].to_numpy()  # As parsed, which the cache digest covers
+    order, params = cached_arima_order(series, str(tmp_path / 'MODEL' / 'EC_DAILY_order.json'), max_workers=1)
+
+    starts = []
+    original = ARIMA._arima_class
+
+    def recording():
+        cls = original()
+
+        class Recording(cls):
+            def fit(self, *args, **kwargs):
+                starts.append(kwargs.get('start_params'))
+                return super().fit(*args, **kwargs)
+        return Recording
+    monkeypatch.setattr(ARIMA, '_arima_class', recording)
+
+    forecast = arima_model(str(tmp_path), 'EC_DAILY.csv', 'eg_value', order='auto')
+    assert starts == [params]
+    expected = _arima_class()(series, order=order).fit().forecast()[0]
+    assert forecast == pytest.approx(expected, rel=1e-4)
@@ -0,0 +1,85 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+import AutoAdvice
+from AdviceIndex import SETPOINT_COLUMNS, advice_candidates, load_advice_index, pareto_mask
+from AutoAdvice import advice_sweep, get_setpoints_indices
+from AutoPredict import regression_analysis
+
+SETPOINTS = (16, 30, 20, 26)
+TARGETS = range(100, 3001, 100)
+
+@pytest.fixture
+def tables(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    grid = list(itertools.product([1, 2], [1, 2], [1], range(1, 12), range(1, 6), range(1, 6), range(1, 6)))
+    ed = pd.DataFrame(grid, columns=['Tem', 'RH', 'SCH', *SETPOINT_COLUMNS])
+    ed['Ed'] = np.round(20000 + 800 * ed['mSPT'] - 500 * ed['oSPcT'] + rng.normal(0, 700, len(ed)), -1)  # Rounded so demands repeat
+    ed.to_csv(tmp_path / 'ED_TABLE.csv', index=False)
+
+    demand = rng.uniform(15000, 30000, 60)
+    pd.DataFrame({'ED': demand, 'EC': 0.8 * demand + 500 + rng.normal(0, 20, 60)}).to_csv(tmp_path / 'HYBRID_TABLE.csv', index=False)
+
+    monkeypatch.setattr(AutoAdvice, 'similar_weather_days', lambda *args, **kwargs: (2, 1))
+    return f"{tmp_path}/"
+
+def _sweep(table_path, pred_ec, k=2):
+    return advice_sweep(table_path, 'ED_TABLE.csv', 'HYBRID_TABLE.csv', None, None, None, None, None,
+                        pred_ec, *SETPOINTS, TARGETS, sch=1, k=k)
+
+def _loop_frontier(table_path, pred_ec, k=2):
+    # One advice_candidates query per target, then a pairwise dominance check
+    index = load_advice_index(table_path, 'ED_TABLE.csv')
+    indices = get_setpoints_indices(*SETPOINTS)
+    setpoints = [index['columns'].index(col) for col in SETPOINT_COLUMNS]
+    current = [indices[key] for key in ('a', 'b', 'c', 'd')]
+
+    settings = {}
+    for target in TARGETS:
+        req_ed = regression_analysis(table_path, 'HYBRID_TABLE.csv', pred_ec - target, is_forward=False)
+        for row in advice_candidates(index, indices, 2, 1, req_ed, sch=1, k=k):
+            settings[tuple(row)] = target  # Later targets are larger
+    points = []
+    for row, target in settings.items():
+        energy = regression_analysis(table_path, 'HYBRID_TABLE.csv', row[index['columns'].index('Ed')], is_forward=True)
+        deviation = sum(abs(row[col] - cur) for col, cur in zip(setpoints, current))
+        points.append((row, target, energy, deviation))
+    return {row: (target, energy, deviation) for row, target, energy, deviation in points
+            if not any(e <= energy and d <= deviation and (e < energy or d < deviation) for _, _, e, d in points)}
+
+@pytest.mark.parametrize('k', [1, 2, 5])
+def test_sweep_matches_a_loop_over_targets(tables, k):
+    pred_ec = 36000.0
+    frontier = _sweep(tables, pred_ec, k)
+    expected = _loop_frontier(tables, pred_ec, k)
+    columns = [col for col in frontier.columns if col in ('Tem', 'RH', 'SCH', *SETPOINT_COLUMNS)] + ['Table Ed']
+
+    assert len(frontier) == len(expected) > 1
+    for _, row in frontier.iterrows():
+        target, energy, deviation = expected[tuple(row[columns])]
+        assert row['Target ES'] == target
+        assert row['Ed'] == pytest.approx(energy)
+        assert row['Comfort Deviation'] == deviation
+
+def test_energy_is_predicted_per_setting(tables):
+    frontier = _sweep(tables, 36000.0)
+    expected = regression_analysis(tables, 'HYBRID_TABLE.csv', frontier['Table Ed'].to_numpy(), is_forward=True)
+    np.testing.assert_allclose(frontier['Ed'], expected)
+    assert frontier['Ed'].nunique() > 1
+    np.testing.assert_allclose(frontier['Saving Potential[%]'], 100 - frontier['Ed'] / 36000.0 * 100)
+
+def test_frontier_has_no_dominated_or_repeated_settings(tables):
+    frontier = _sweep(tables, 36000.0, k=5)
+    assert pareto_mask(frontier['Ed'], frontier['Comfort Deviation']).all()
+    assert not frontier.duplicated(subset=list(SETPOINT_COLUMNS)).any()
+    assert list(frontier.index) == list(range(1, len(frontier) + 1))
+    assert frontier['Comfort Deviation'].is_monotonic_increasing
+
+def test_pareto_mask():
+    energy = np.array([1.0, 2.0, 2.0, 3.0, 1.0])
+    deviation = np.array([3.0, 2.0, 2.0, 1.0, 4.0])
+    np.testing.assert_array_equal(pareto_mask(energy, deviation), [True, True, True, True, False])
+
+def test_unreachable_targets_give_an_empty_frontier(tables):
+    assert _sweep(tables, 0.0).empty
@@ -0,0 +1,155 @@
+import os
+import json
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pytest
+import AutoPredict
+from AutoPredict import (REGRESSION_STORE_FILENAME, fitted_regression, perform_regression, recent_sample_weights,
+                         regression_analysis, save_regression_store, use_regression_store)
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(AutoPredict, '_REGRESSIONS', OrderedDict())
+    monkeypatch.setattr(AutoPredict, '_REGRESSION_STORE_FILE', None)
+    monkeypatch.setattr(AutoPredict, '_UNSAVED_REGRESSIONS', set())
+
+@pytest.fixture
+def fits(monkeypatch):
+    calls = []
+
+    def counting(x, y, sample_weights=None):
+        calls.append(len(x))
+        return perform_regression(x, y, sample_weights)
+    monkeypatch.setattr(AutoPredict, 'perform_regression', counting)
+    return calls
+
+def _hybrid(path, seed=0, n=30):
+    rng = np.random.default_rng(seed)
+    ed = rng.uniform(3000, 8000, n)
+    pd.DataFrame({'ED': ed, 'EC': 1.2 * ed + 300 + rng.normal(0, 50, n)}).to_csv(path, index=False)
+    return str(path)
+
+def _rewrite(path, seed):
+    stat = os.stat(path)
+    _hybrid(path, seed)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+def test_matches_a_direct_fit(tmp_path, fits):
+    path = _hybrid(tmp_path / 'HYBRID.csv')
+    df = pd.read_csv(path)
+    expected = perform_regression(df['ED'].values, df['EC'].values, recent_sample_weights(len(df)))
+    assert fitted_regression(df, 'ED', 'EC', 'recent', source=path) == pytest.approx(expected)
+    assert fitted_regression(df, 'ED', 'EC', 'recent', source=path) == pytest.approx(expected)
+    assert len(fits) == 1
+
+def test_regression_analysis_matches_the_original_fits(tmp_path):
+    path = _hybrid(tmp_path / 'HYBRID.csv')
+    df = pd.read_csv(path)
+    coef, intercept = perform_regression(df['ED'].values, df['EC'].values)
+    rev_coef, rev_intercept = perform_regression(df['EC'].values, df['ED'].values)
+    targets = np.array([4000.0, 5000.0, 9000.0])
+    table_path, filename = str(tmp_path) + os.sep, 'HYBRID.csv'
+    np.testing.assert_allclose(regression_analysis(table_path, filename, targets), coef * targets + intercept)
+    np.testing.assert_allclose(regression_analysis(table_path, filename, targets, is_forward=False),
+                               (targets - rev_intercept) / rev_coef)
+
+def test_changed_table_is_refitted_in_place(tmp_path, fits):
+    path = _hybrid(tmp_path / 'HYBRID.csv')
+    first = fitted_regression(pd.read_csv(path), 'ED', 'EC', source=path)
+    _rewrite(path, seed=1)
+    df = pd.read_csv(path)
+    second = fitted_regression(df, 'ED', 'EC', source=path)
+    assert second == pytest.approx(perform_regression(df['ED'].values, df['EC'].values))
+    assert second != pytest.approx(first)
+    assert len(fits) == 2
+    assert len(AutoPredict._REGRESSIONS) == 1
+
+def test_store_is_reused_by_a_new_process(tmp_path, fits):
+    model_path = str(tmp_path / 'MODEL')
+    path = _hybrid(tmp_path / 'HYBRID.csv')
+    use_regression_store(model_path)
+    expected = fitted_regression(pd.read_csv(path), 'ED', 'EC', source=path)
+    save_regression_store()
+
+    AutoPredict._REGRESSIONS.clear()
+    use_regression_store(model_path)
+    assert fitted_regression(pd.read_csv(path), 'ED', 'EC', source=path) == pytest.approx(expected)
+    assert len(fits) == 1
+
+def test_store_is_bounded_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(AutoPredict, 'MAX_REGRESSIONS', 2)
+    use_regression_store(str(tmp_path / 'MODEL'))
+    paths = [_hybrid(tmp_path / f'HYBRID_{i}.csv', seed=i) for i in range(3)]
+    fitted_regression(pd.read_csv(paths[0]), 'ED', 'EC', source=paths[0])
+    fitted_regression(pd.read_csv(paths[1]), 'ED', 'EC', source=paths[1])
+    fitted_regression(pd.read_csv(paths[0]), 'ED', 'EC', source=paths[0])  # Most recently used again
+    fitted_regression(pd.read_csv(paths[2]), 'ED', 'EC', source=paths[2])
+    save_regression_store()
+
+    kept = {key[0] for key in AutoPredict._REGRESSIONS}
+    assert kept == {os.path.abspath(paths[0]), os.path.abspath(paths[2])}
+    with open(tmp_path / 'MODEL' / REGRESSION_STORE_FILENAME, encoding='utf-8') as f:
+        assert {entry[0][0] for entry in json.load(f)['entries']} == kept
+
+def test_concurrent_writers_merge_their_fits(tmp_path):
+    model_path = str(tmp_path / 'MODEL')
+    first, second = _hybrid(tmp_path / 'HYBRID_1.csv', seed=1), _hybrid(tmp_path / 'HYBRID_2.csv', seed=2)
+
+    # Two workers start from the same (empty) store and each fit a different building
+    use_regression_store(model_path)
+    fitted_regression(pd.read_csv(first), 'ED', 'EC', source=first)
+    save_regression_store()
+    AutoPredict._REGRESSIONS.clear()
+    fitted_regression(pd.read_csv(second), 'ED', 'EC', source=second)
+    save_regression_store()
+
+    with open(os.path.join(model_path, REGRESSION_STORE_FILENAME), encoding='utf-8') as f:
+        stored = {entry[0][0] for entry in json.load(f)['entries']}
+    assert stored == {os.path.abspath(first), os.path.abspath(second)}
+    assert not [f for f in os.listdir(model_path) if f.endswith('.tmp')]
+
+def test_fits_are_written_when_the_store_is_saved(tmp_path):
+    model_path = str(tmp_path / 'MODEL')
+    store_file = os.path.join(model_path, REGRESSION_STORE_FILENAME)
+    use_regression_store(model_path)
+    paths = [_hybrid(tmp_path / f'HYBRID_{i}.csv', seed=i) for i in range(3)]
+    for path in paths:
+        fitted_regression(pd.read_csv(path), 'ED', 'EC', source=path)
+    assert not os.path.exists(store_file)
+
+    save_regression_store()
+    stat = os.stat(store_file)
+    fitted_regression(pd.read_csv(paths[0]), 'ED', 'EC', source=paths[0])  # Already stored
+    save_regression_store()
+    assert os.stat(store_file).st_mtime_ns == stat.st_mtime_ns
+    with open(store_file, encoding='utf-8') as f:
+        assert len(json.load(f)['entries']) == 3
+
+def _fit_and_save(model_path, path, start):
+    # One fleet worker: its own fit, saved while the other workers save theirs
+    use_regression_store(model_path)
+    fitted_regression(pd.read_csv(path), 'ED', 'EC', source=path)
+    start.wait()
+    save_regression_store()
+
+def test_processes_saving_together_keep_each_others_fits(tmp_path):
+    model_path = str(tmp_path / 'MODEL')
+    paths = [_hybrid(tmp_path / f'HYBRID_{i}.csv', seed=i) for i in range(6)]
+    context = multiprocessing.get_context('spawn')
+    start = context.Barrier(len(paths))
+    workers = [context.Process(target=_fit_and_save, args=(model_path, path, start)) for path in paths]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    with open(os.path.join(model_path, REGRESSION_STORE_FILENAME), encoding='utf-8') as f:
+        assert {entry[0][0] for entry in json.load(f)['entries']} == {os.path.abspath(path) for path in paths}
+
+def test_frames_without_a_source_are_keyed_by_content(fits):
+    df = pd.DataFrame({'ED': [1.0, 2.0, 3.0, 4.0], 'EC': [2.0, 4.1, 5.9, 8.0]})
+    assert fitted_regression(df, 'ED', 'EC') == fitted_regression(df.copy(), 'ED', 'EC')
+    assert len(fits) == 1
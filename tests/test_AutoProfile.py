@@ -0,0 +1,153 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import AutoProfile
+from AutoAlloc import allocate_energy_consumption
+from AutoProfile import (SLOTS_PER_DAY, _profile_store_file, _save_statistics, auto_profile, fold_pending_readings,
+                         load_profile_statistics, new_readings_filename, stored_profile)
+from Session import TableSession
+
+def _readings(path, start, days, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days * SLOTS_PER_DAY, freq='15min')
+    pd.DataFrame({'date': dates.strftime('%Y-%m-%d %H:%M'),
+                  'eg_value': rng.uniform(10, 100, len(dates))}).to_csv(path, index=False)
+    return str(path)
+
+def _rewrite(path, start, days, seed):
+    stat = os.stat(path)
+    _readings(path, start, days, seed)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+@pytest.fixture
+def building(tmp_path):
+    table_path = f"{tmp_path}{os.sep}"
+    fname = 'EC_MIN.csv'
+    _readings(tmp_path / fname, '2024-01-01', 14, seed=0)
+    new_file = _readings(tmp_path / new_readings_filename(fname), '2024-01-15', 7, seed=1)
+    return table_path, fname, new_file
+
+@pytest.fixture
+def folds(monkeypatch):
+    calls = []
+    original = AutoProfile.fold_new_readings
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(AutoProfile, 'fold_new_readings', counting)
+    return calls
+
+def _assert_profiles_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        np.testing.assert_allclose(a, e)
+
+def test_new_readings_filename():
+    assert new_readings_filename('EC_Minutely_A.csv') == 'NEW_EC_Minutely_A.csv'
+
+def test_stored_profile_matches_auto_profile(building, tmp_path):
+    table_path, fname, _ = building
+    _assert_profiles_equal(stored_profile(table_path, fname), auto_profile(table_path, fname))
+
+def test_folded_readings_match_a_full_rebuild(building, tmp_path):
+    table_path, fname, new_file = building
+    assert fold_pending_readings(table_path, fname, new_file)
+    combined = pd.concat([pd.read_csv(f"{table_path}{fname}"), pd.read_csv(new_file)])
+    combined.to_csv(tmp_path / 'COMBINED.csv', index=False)
+    _assert_profiles_equal(stored_profile(table_path, fname), auto_profile(table_path, 'COMBINED.csv'))
+
+def test_allocation_folds_once_per_session(building, folds):
+    table_path, fname, new_file = building
+    session = TableSession()
+    before = allocate_energy_consumption(table_path, fname, 1000.0, session=session)
+    first = allocate_energy_consumption(table_path, fname, 1000.0, session=session, new_readings_file=new_file)
+    second = allocate_energy_consumption(table_path, fname, 1000.0, session=session, new_readings_file=new_file)
+
+    assert len(folds) == 1
+    np.testing.assert_allclose(first, second)
+    assert not np.allclose(before, first)  # The session's profiles were refreshed after the fold
+    _, stamp = load_profile_statistics(table_path, fname)
+    assert [entry[0] for entry in stamp['folded']] == [os.path.basename(new_file)]
+
+def test_readings_are_not_counted_twice_across_runs(building, folds):
+    table_path, fname, new_file = building
+    assert fold_pending_readings(table_path, fname, new_file, session=TableSession())
+    assert not fold_pending_readings(table_path, fname, new_file, session=TableSession())
+    _, stamp = load_profile_statistics(table_path, fname)
+    assert len(stamp['folded']) == 1
+
+def test_rewritten_readings_are_folded_again(building, folds):
+    table_path, fname, new_file = building
+    session = TableSession()
+    allocate_energy_consumption(table_path, fname, 1000.0, session=session, new_readings_file=new_file)
+    _rewrite(new_file, '2024-01-22', 7, seed=2)
+    allocate_energy_consumption(table_path, fname, 1000.0, session=session, new_readings_file=new_file)
+
+    assert len(folds) == 2
+    stats, stamp = load_profile_statistics(table_path, fname)
+    assert len(stamp['folded']) == 2
+    assert stats['counts'].sum() == 28 * SLOTS_PER_DAY
+
+def test_missing_readings_file_is_skipped(building, folds):
+    table_path, fname, new_file = building
+    os.remove(new_file)
+    assert not fold_pending_readings(table_path, fname, new_file, session=TableSession())
+    assert not fold_pending_readings(table_path, fname, None)
+    assert folds == []
+
+def test_changed_table_rebuilds_the_store(building):
+    table_path, fname, new_file = building
+    fold_pending_readings(table_path, fname, new_file)
+    _rewrite(f"{table_path}{fname}", '2024-02-05', 14, seed=3)
+    stats, stamp = load_profile_statistics(table_path, fname)
+    assert stamp['folded'] == []
+    _assert_profiles_equal(stored_profile(table_path, fname), auto_profile(table_path, fname))
+
+def test_readings_already_in_the_table_are_not_counted(building):
+    table_path, fname, new_file = building
+    before, _ = load_profile_statistics(table_path, fname)
+    table = pd.read_csv(f"{table_path}{fname}")
+    _rewrite(new_file, '2024-01-01', 14, seed=0)  # The table's own readings, as in INPUT/NEW_EC_MIN.csv
+    pd.testing.assert_frame_equal(pd.read_csv(new_file), table)
+
+    assert not fold_pending_readings(table_path, fname, new_file)
+    stats, _ = load_profile_statistics(table_path, fname)
+    np.testing.assert_array_equal(stats['counts'], before['counts'])
+    np.testing.assert_array_equal(stats['sums'], before['sums'])
+
+def test_overlapping_readings_fold_only_the_new_rows(building, tmp_path):
+    table_path, fname, new_file = building
+    _rewrite(new_file, '2024-01-10', 10, seed=1)  # Five days the table holds and five new ones
+    assert fold_pending_readings(table_path, fname, new_file)
+
+    stats, stamp = load_profile_statistics(table_path, fname)
+    assert stats['counts'].sum() == 19 * SLOTS_PER_DAY
+    assert stamp['watermark'] == '2024-01-19 23:45'
+    new_rows = pd.read_csv(new_file).iloc[5 * SLOTS_PER_DAY:]
+    pd.concat([pd.read_csv(f"{table_path}{fname}"), new_rows]).to_csv(tmp_path / 'COMBINED.csv', index=False)
+    _assert_profiles_equal(stored_profile(table_path, fname), auto_profile(table_path, 'COMBINED.csv'))
+
+def test_rebuilt_store_does_not_fold_the_readings_again(building):
+    table_path, fname, new_file = building
+    fold_pending_readings(table_path, fname, new_file)
+    combined = pd.concat([pd.read_csv(f"{table_path}{fname}"), pd.read_csv(new_file)])
+    stat = os.stat(f"{table_path}{fname}")
+    combined.to_csv(f"{table_path}{fname}", index=False)  # The readings reached the table
+    os.utime(f"{table_path}{fname}", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert not fold_pending_readings(table_path, fname, new_file)
+    stats, stamp = load_profile_statistics(table_path, fname)
+    assert stats['counts'].sum() == 21 * SLOTS_PER_DAY
+    assert stamp['watermark'] == '2024-01-21 23:45'
+
+def test_store_without_a_watermark_is_rebuilt(building):
+    table_path, fname, new_file = building
+    stats, stamp = load_profile_statistics(table_path, fname)
+    doubled = {key: value * 2 if key in ('sums', 'counts') else value for key, value in stats.items()}
+    _save_statistics(_profile_store_file(table_path, fname), doubled, {'source': stamp['source'], 'folded': []})
+
+    stats, stamp = load_profile_statistics(table_path, fname)
+    assert stats['counts'].sum() == 14 * SLOTS_PER_DAY
+    assert stamp['watermark'] == '2024-01-14 23:45'
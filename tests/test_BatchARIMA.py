@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import BatchARIMA
+import main_batch
+from ARIMA import arima_model
+from BatchARIMA import TOLERANCE, arima_110_batch, batch_arima_forecasts, stack_daily_series
+from Session import TableSession
+
+def _series(n, seed, phi=0.5):
+    rng = np.random.default_rng(seed)
+    steps = np.zeros(n)
+    for i in range(1, n):
+        steps[i] = phi * steps[i - 1] + rng.normal(0, 10)
+    return 1000 + np.cumsum(steps)
+
+def _daily(path, values):
+    pd.DataFrame({'eg_value': values}).to_csv(path, index=False)
+    return str(path)
+
+@pytest.fixture
+def fleet(tmp_path):
+    return [_daily(tmp_path / f"EC_DAILY_{i}.csv", _series(n, seed=i)) for i, n in enumerate((400, 365, 300))]
+
+def test_batch_matches_statsmodels_within_tolerance(fleet, tmp_path):
+    forecasts = batch_arima_forecasts(fleet, 'eg_value', check_sample=0)
+    for path in fleet:
+        values = pd.read_csv(path)['eg_value'].to_numpy()
+        expected = arima_model(str(tmp_path), path, 'eg_value')
+        assert abs(forecasts[path] - expected) <= TOLERANCE * np.diff(values).std()
+
+def test_matches_stacked_batch(fleet, tmp_path):
+    series, mask = stack_daily_series(f"{tmp_path}{os.sep}", [os.path.basename(path) for path in fleet], 'eg_value')
+    expected, _, _ = arima_110_batch(series, mask)
+    forecasts = batch_arima_forecasts(fleet, 'eg_value', check_sample=0)
+    np.testing.assert_allclose([forecasts[path] for path in fleet], expected)
+
+def test_short_series_fall_back_to_statsmodels(tmp_path):
+    path = _daily(tmp_path / 'EC_DAILY_SHORT.csv', _series(8, seed=3))
+    forecasts = batch_arima_forecasts([path], 'eg_value', check_sample=0)
+    assert forecasts[path] == pytest.approx(arima_model(str(tmp_path), path, 'eg_value'))
+
+def test_unreadable_and_gapped_tables_are_left_out(fleet, tmp_path):
+    gapped = _series(200, seed=4)
+    gapped[50] = np.nan
+    paths = fleet + [str(tmp_path / 'MISSING.csv'), _daily(tmp_path / 'GAPPED.csv', gapped)]
+    forecasts = batch_arima_forecasts(paths, 'eg_value', session=TableSession(), check_sample=0)
+    assert sorted(forecasts) == sorted(fleet)
+
+def test_run_method_uses_the_batch_forecast(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("The building was fitted again.")
+    monkeypatch.setattr(main_batch, 'arima_model', fail)
+    monkeypatch.setattr(main_batch, 'allocate_energy_consumption', lambda *args, **kwargs: np.full(96, args[2] / 96))
+    config = {'Table Info': {'table_path': '', 'ec_min_table_filename': 'EC_MIN.csv'},
+              'Filepath': {'input_path': '', 'ec_min_input_filename': 'NEW_EC_MIN.csv'}, 'User Variables': {}}
+
+    result = main_batch.run_method(config, 'arima', TableSession(), arima_forecast=960.0)
+    assert result['prediction'] == 960.0
+    assert sum(result['allocation']) == pytest.approx(960.0)
+
+def test_cross_check_falls_back_on_divergence(monkeypatch, fleet):
+    monkeypatch.setattr(BatchARIMA, '_statsmodels_forecast', lambda values: values[-1] + 10 ** 6)
+    series, mask = stack_daily_series('', fleet, 'eg_value')
+    _, _, fallback = arima_110_batch(series, mask, check_sample=1)
+    assert fallback.all()
+
+def test_cross_check_falls_back_on_a_failed_reference(monkeypatch, fleet):
+    monkeypatch.setattr(BatchARIMA, '_statsmodels_forecast', lambda values: np.nan)
+    series, mask = stack_daily_series('', fleet, 'eg_value')
+    _, _, fallback = arima_110_batch(series, mask, check_sample=1)
+    assert fallback.all()
@@ -0,0 +1,196 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import DegreeHour
+from DegreeHour import (BALANCE_POINTS, OnlineDegreeHourModel, calculate_degree_hours, degree_hour_features,
+                        fit_balance_point, load_online_state, online_energy_model, predict_balance_point,
+                        train_energy_model)
+
+def _tables(tmp_path, start=0, hours=24 * 20, seed=0):
+    # Noise is drawn per hour index, so tables covering overlapping hours agree on them
+    t = np.arange(start, start + hours)
+    noise = [np.random.default_rng([seed, k]).normal(0, 1, start + hours)[start:] for k in range(2)]
+    temperature = 15 + 8 * np.sin(2 * np.pi * t / 24) + noise[0]
+    energy = 50 + 3 * np.maximum(18 - temperature, 0) + 2 * noise[1]
+    temperature_file, energy_file = tmp_path / 'TEM_HOUR.csv', tmp_path / 'EC_HOUR.csv'
+    pd.DataFrame({'Hour': t % 24, 'Temperature': temperature}).to_csv(temperature_file, index=False)
+    pd.DataFrame({'Hour': t % 24, 'eg_value': energy}).to_csv(energy_file, index=False)
+    return str(temperature_file), str(energy_file)
+
+def _rewrite(tmp_path, **kwargs):
+    stats = [os.stat(tmp_path / name) for name in ('TEM_HOUR.csv', 'EC_HOUR.csv')]
+    files = _tables(tmp_path, **kwargs)
+    for path, stat in zip(files, stats):
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    return files
+
+def _assert_matches_batch(model, temperature_file, energy_file):
+    expected = train_energy_model(calculate_degree_hours(pd.read_csv(temperature_file)), pd.read_csv(energy_file))
+    assert model.rows == len(pd.read_csv(energy_file))
+    np.testing.assert_allclose(model.coef_, expected.coef_, rtol=1e-9)
+    np.testing.assert_allclose(model.intercept_, expected.intercept_, rtol=1e-9)
+
+@pytest.fixture
+def updates(monkeypatch):
+    calls = []
+    original = OnlineDegreeHourModel.update
+
+    def counting(self, x, y):
+        calls.append(len(np.atleast_1d(x)))
+        return original(self, x, y)
+    monkeypatch.setattr(OnlineDegreeHourModel, 'update', counting)
+    return calls
+
+def test_matches_train_energy_model(tmp_path):
+    files = _tables(tmp_path)
+    _assert_matches_batch(online_energy_model(*files), *files)
+
+def test_appended_rows_are_folded_in(tmp_path, updates):
+    state_path = str(tmp_path / 'MODEL')
+    online_energy_model(*_tables(tmp_path, hours=24 * 20), state_path)
+    files = _rewrite(tmp_path, hours=24 * 21)
+    model = online_energy_model(*files, state_path)
+
+    assert updates == [24 * 20, 24]
+    _assert_matches_batch(model, *files)
+
+def test_rolled_window_of_the_same_length_is_refitted(tmp_path, updates):
+    state_path = str(tmp_path / 'MODEL')
+    online_energy_model(*_tables(tmp_path), state_path)
+    files = _rewrite(tmp_path, start=24)
+    model = online_energy_model(*files, state_path)
+
+    assert updates == [24 * 20, 24 * 20]
+    _assert_matches_batch(model, *files)
+
+def test_appended_rows_are_read_from_the_tail(tmp_path, updates, monkeypatch):
+    state_path = str(tmp_path / 'MODEL')
+    online_energy_model(*_tables(tmp_path, hours=24 * 20), state_path)
+    files = _rewrite(tmp_path, hours=24 * 20 + 3)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The whole table was read.")
+    monkeypatch.setattr(DegreeHour, 'load_data', fail)
+    model = online_energy_model(*files, state_path)
+    assert updates == [24 * 20, 3]
+    _assert_matches_batch(model, *files)
+
+    _, marks, _ = load_online_state(DegreeHour._model_state_file(state_path, files[1]))
+    for name, path in zip(('temperature', 'energy'), files):
+        assert marks[name]['rows'] == 24 * 20 + 3 and marks[name]['offset'] == os.path.getsize(path)
+
+def test_changed_last_row_is_refitted(tmp_path, updates):
+    state_path = str(tmp_path / 'MODEL')
+    temperature_file, energy_file = _tables(tmp_path)
+    online_energy_model(temperature_file, energy_file, state_path)
+    energy = pd.read_csv(energy_file)
+    energy.loc[len(energy) - 1, 'eg_value'] += 1
+    energy.loc[len(energy)] = [0, 60.0]
+    stat = os.stat(energy_file)
+    energy.to_csv(energy_file, index=False)
+    os.utime(energy_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    temperature = pd.read_csv(temperature_file)
+    temperature.loc[len(temperature)] = [0, 10.0]
+    temperature.to_csv(temperature_file, index=False)
+
+    model = online_energy_model(temperature_file, energy_file, state_path)
+    assert updates == [24 * 20, 24 * 20 + 1]
+    _assert_matches_batch(model, temperature_file, energy_file)
+
+def test_edited_history_is_refitted(tmp_path, updates):
+    state_path = str(tmp_path / 'MODEL')
+    online_energy_model(*_tables(tmp_path, hours=24 * 20), state_path)
+    files = _rewrite(tmp_path, hours=24 * 21, seed=1)
+    model = online_energy_model(*files, state_path)
+
+    assert updates == [24 * 20, 24 * 21]
+    _assert_matches_batch(model, *files)
+
+def test_unchanged_tables_are_not_read(tmp_path, monkeypatch):
+    state_path = str(tmp_path / 'MODEL')
+    files = _tables(tmp_path)
+    first = online_energy_model(*files, state_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The tables were read again.")
+    monkeypatch.setattr(DegreeHour, 'load_data', fail)
+    second = online_energy_model(*files, state_path)
+    assert second.to_dict() == first.to_dict()
+
+def test_other_settings_are_refitted(tmp_path, updates):
+    state_path = str(tmp_path / 'MODEL')
+    files = _tables(tmp_path)
+    online_energy_model(*files, state_path)
+    model = online_energy_model(*files, state_path, threshold=20)
+
+    assert updates == [24 * 20, 24 * 20]
+    assert model.threshold == 20
+
+def test_legacy_state_is_refitted(tmp_path, updates):
+    state_path = str(tmp_path / 'MODEL')
+    files = _tables(tmp_path)
+    model = online_energy_model(*files, state_path)
+    state_file = DegreeHour._model_state_file(state_path, files[1])
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(model.to_dict(), f)  # Layout written before the digest was stored
+
+    assert load_online_state(state_file) == (None, None, None)
+    _assert_matches_batch(online_energy_model(*files, state_path), *files)
+    assert updates == [24 * 20, 24 * 20]
+    assert not [name for name in os.listdir(state_path) if name.endswith('.tmp')]
+
+def _buildings(n=24 * 30, m=3, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    temperature = 17 + 10 * np.sin(2 * np.pi * t / 24) + 3 * np.sin(2 * np.pi * t / (24 * 30)) + rng.normal(0, 1, n)
+    balance = np.array([14.0, 18.0, 21.5])[:m]
+    energy = (40 + 2.5 * np.maximum(balance - temperature[:, None], 0) + 4 * np.maximum(temperature[:, None] - balance, 0)
+              + rng.normal(0, 1, (n, m)))
+    return temperature, energy
+
+def _sklearn_fits(temperature, energy, rows=slice(None)):
+    # The per-base scikit-learn loop the batched solve replaced
+    from sklearn.linear_model import LinearRegression
+    heating, cooling = degree_hour_features(temperature, BALANCE_POINTS)
+    fits = []
+    for b in range(len(BALANCE_POINTS)):
+        x = np.column_stack([heating[b], cooling[b]])[rows]
+        model = LinearRegression().fit(x, energy[rows])
+        fits.append((model.intercept_, *model.coef_, ((energy[rows] - model.predict(x)) ** 2).sum()))
+    return np.array(fits)  # (B, 4): intercept, heating, cooling, sse
+
+def test_balance_point_search_matches_sklearn_per_base():
+    temperature, energy = _buildings()
+    fit = fit_balance_point(temperature, energy)
+    for j in range(energy.shape[1]):
+        expected = _sklearn_fits(temperature, energy[:, j])
+        np.testing.assert_allclose(fit['sse'][:, j], expected[:, 3], rtol=1e-8)
+        best = np.argmin(expected[:, 3])
+        assert fit['base'][j] == BALANCE_POINTS[best]
+        np.testing.assert_allclose(fit['coef'][j, 0], expected[best, :3], rtol=1e-8)
+        assert fit['rmse'][j] == pytest.approx(np.sqrt(expected[best, 3] / len(temperature)))
+
+def test_single_building_fit_drops_the_building_axis():
+    temperature, energy = _buildings(m=1)
+    fit = fit_balance_point(temperature, energy[:, 0])
+    expected = _sklearn_fits(temperature, energy[:, 0])
+    np.testing.assert_allclose(fit['sse'], expected[:, 3], rtol=1e-8)
+    np.testing.assert_allclose(fit['coef'][0], expected[np.argmin(expected[:, 3]), :3], rtol=1e-8)
+
+def test_per_hour_fit_matches_sklearn_per_hour():
+    temperature, energy = _buildings(m=2)
+    hours = np.arange(len(temperature)) + 5
+    fit = fit_balance_point(temperature, energy, hours=hours, per_hour=True)
+    for j in range(2):
+        expected = sum(_sklearn_fits(temperature, energy[:, j], hours % 24 == hour)[:, 3] for hour in range(24))
+        np.testing.assert_allclose(fit['sse'][:, j], expected, rtol=1e-8)
+        best = np.argmin(expected)
+        for hour in (0, 7, 18):
+            np.testing.assert_allclose(fit['coef'][j, hour], _sklearn_fits(temperature, energy[:, j], hours % 24 == hour)[best, :3],
+                                       rtol=1e-6, atol=1e-8)
+
+    predicted = predict_balance_point(fit, temperature, hours)
+    assert predicted.shape == energy.shape
+    np.testing.assert_allclose(((energy - predicted) ** 2).sum(axis=0), fit['sse'][np.argmin(fit['sse'], axis=0), [0, 1]], rtol=1e-8)
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from DegreeHourETL import degree_hour_etl, read_degree_hours, station_degree_hours
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOURLY_TEMPERATURES = os.path.join(REPO, '외기온도_시간자료.csv')
+
+def _baseline(input_file, hourly_csv, daily_csv):
+    # The whole-file computation of data_analysis.py that the streaming ETL replaced
+    df = pd.read_csv(input_file)
+    df.columns = ['date', 'tem']
+    df = df.set_index('date')
+    df.index = pd.to_datetime(df.index)
+
+    df['cooling degree hour'] = np.where(df['tem'] > 18, df['tem'] - 18, 0)
+    df['heating degree hour'] = np.where(df['tem'] <= 18, 18 - df['tem'], 0)
+    df['degree hour'] = df['cooling degree hour'] + df['heating degree hour']
+    df.to_csv(hourly_csv)
+
+    df_daily = df.resample('D').sum()
+    df_daily.to_csv(daily_csv)
+
+def _gapped_record(path):
+    # Three days with a missing day and a partial last day
+    rng = np.random.default_rng(0)
+    times = pd.date_range('2023-03-01', periods=24 * 5, freq='h')
+    times = times[(times.day != 3) & ~((times.day == 5) & (times.hour > 10))]
+    pd.DataFrame({'date': times.strftime('%Y-%m-%d %H:%M'), 'tem': np.round(rng.normal(18, 6, len(times)), 1)}).to_csv(path, index=False)
+    return str(path)
+
+def _assert_identical(tmp_path, input_file, chunksize):
+    _baseline(input_file, tmp_path / 'baseline_hourly.csv', tmp_path / 'baseline_daily.csv')
+    station_degree_hours(input_file, chunksize=chunksize, hourly_csv=tmp_path / 'hourly.csv', daily_csv=tmp_path / 'daily.csv')
+    assert (tmp_path / 'hourly.csv').read_bytes() == (tmp_path / 'baseline_hourly.csv').read_bytes()
+    assert (tmp_path / 'daily.csv').read_bytes() == (tmp_path / 'baseline_daily.csv').read_bytes()
+
+@pytest.mark.parametrize('chunksize', [25, 1000, 100_000])
+def test_station_record_matches_the_baseline_byte_for_byte(tmp_path, chunksize):
+    _assert_identical(tmp_path, HOURLY_TEMPERATURES, chunksize)
+
+@pytest.mark.parametrize('chunksize', [1, 5, 24, 1000])
+def test_missing_and_partial_days_match_the_baseline(tmp_path, chunksize):
+    _assert_identical(tmp_path, _gapped_record(tmp_path / 'GAPPED.csv'), chunksize)
+
+def test_columnar_output_matches_the_csv(tmp_path):
+    input_file = _gapped_record(tmp_path / 'GAPPED.csv')
+    degree_hour_etl({'station': input_file}, str(tmp_path), chunksize=7)
+    for rollup in ('hourly', 'daily'):
+        expected = pd.read_csv(tmp_path / 'station' / f"{rollup}.csv", index_col='date', parse_dates=True)
+        columnar = read_degree_hours(str(tmp_path / 'station'), rollup)
+        np.testing.assert_array_equal(columnar['time'], expected.index.to_numpy(dtype='datetime64[s]'))
+        for column in expected.columns:
+            values = columnar[column] if column == 'tem' else columnar[column][:, 0]
+            np.testing.assert_allclose(values, expected[column])
+
+def test_each_base_matches_a_single_base_run(tmp_path):
+    input_file = _gapped_record(tmp_path / 'GAPPED.csv')
+    station_degree_hours(input_file, bases=(16, 18, 20), chunksize=5, columnar_path=str(tmp_path / 'all'))
+    combined = read_degree_hours(str(tmp_path / 'all'))
+    for j, base in enumerate((16, 18, 20)):
+        station_degree_hours(input_file, bases=(base,), columnar_path=str(tmp_path / f"base{base}"))
+        single = read_degree_hours(str(tmp_path / f"base{base}"))
+        np.testing.assert_array_equal(combined['degree hour'][:, j], single['degree hour'][:, 0])
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from FindNearest import find_nearest, find_nearest_many, k_nearest, sort_column
+
+def _brute_k_nearest(values, targets, k):
+    # Reference: rank every row by (distance, row position)
+    indices = np.full((len(targets), k), -1)
+    distances = np.full((len(targets), k), np.inf)
+    rows = np.flatnonzero(~np.isnan(values))
+    for i, target in enumerate(targets):
+        if np.isnan(target):
+            continue
+        dist = np.abs(values[rows] - target)
+        ranked = rows[np.lexsort((rows, dist))][:k]
+        indices[i, :len(ranked)] = ranked
+        distances[i, :len(ranked)] = np.abs(values[ranked] - target)
+    return indices, distances
+
+def _loop_find_nearest_many(data, target_values, column='Ed'):
+    # The per-target loop find_nearest_many replaced
+    order, sorted_values = sort_column(data[column].to_numpy())
+    targets = np.atleast_1d(np.asarray(target_values, dtype=np.float64))
+    if len(sorted_values) == 0:
+        return [data.index[:0] for _ in targets]
+
+    pos = np.searchsorted(sorted_values, targets)
+    below = sorted_values[np.maximum(pos - 1, 0)]
+    above = sorted_values[np.minimum(pos, len(sorted_values) - 1)]
+    below_dist = np.where(pos > 0, np.abs(below - targets), np.inf)
+    above_dist = np.where(pos < len(sorted_values), np.abs(above - targets), np.inf)
+    nearest = np.minimum(below_dist, above_dist)
+
+    result = []
+    for i in range(len(targets)):
+        runs = []
+        for value, dist in ((below[i], below_dist[i]), (above[i], above_dist[i])):
+            if dist == nearest[i]:
+                runs.append(order[np.searchsorted(sorted_values, value, 'left'):np.searchsorted(sorted_values, value, 'right')])
+        rows = np.unique(np.concatenate(runs))
+        result.append(data.index[rows])
+    return result
+
+def _columns():
+    rng = np.random.default_rng(0)
+    return {
+        'distinct': rng.permutation(np.arange(200, dtype=np.float64) * 3.5),
+        'duplicates': rng.integers(0, 12, 300).astype(np.float64) * 10,
+        'long runs': np.repeat([5.0, 10.0, 15.0], [40, 3, 40])[rng.permutation(83)],
+        'constant': np.full(25, 7.0),
+        'short': np.array([3.0, 1.0]),
+    }
+
+def _targets(values):
+    finite = values[~np.isnan(values)]
+    midpoints = (np.unique(finite)[:-1] + np.unique(finite)[1:]) / 2  # Equally far from two values
+    return np.concatenate([finite[:20], midpoints[:20], [finite.min() - 100, finite.max() + 100], np.linspace(-5, 130, 30)])
+
+@pytest.mark.parametrize('name', list(_columns()))
+@pytest.mark.parametrize('k', [1, 3, 8, 50])
+def test_k_nearest_matches_brute_force(name, k):
+    values = _columns()[name]
+    targets = _targets(values)
+    order, sorted_values = sort_column(values)
+    indices, distances = k_nearest(sorted_values, targets, k, order)
+    expected_indices, expected_distances = _brute_k_nearest(values, targets, k)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(distances, expected_distances)
+
+def test_k_nearest_positions_without_order():
+    values = np.sort(_columns()['duplicates'])
+    indices, distances = k_nearest(values, [35.0, 60.0], 5)
+    expected_indices, expected_distances = _brute_k_nearest(values, np.array([35.0, 60.0]), 5)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(distances, expected_distances)
+
+def test_k_nearest_skips_nan_values_and_targets():
+    values = np.array([4.0, np.nan, 1.0, 4.0, np.nan, 9.0])
+    order, sorted_values = sort_column(values)
+    indices, distances = k_nearest(sorted_values, [4.0, np.nan], 4, order)
+    np.testing.assert_array_equal(indices, [[0, 3, 2, 5], [-1, -1, -1, -1]])
+    np.testing.assert_array_equal(distances[0], [0.0, 0.0, 3.0, 5.0])
+
+def test_k_nearest_of_an_empty_column():
+    indices, distances = k_nearest(np.array([]), [1.0, 2.0], 3)
+    assert indices.shape == (2, 3) and (indices == -1).all() and np.isinf(distances).all()
+
+@pytest.mark.parametrize('name', list(_columns()))
+def test_find_nearest_many_matches_the_loop_and_find_nearest(name):
+    values = _columns()[name]
+    data = pd.DataFrame({'Ed': values}, index=pd.RangeIndex(100, 100 + len(values)))
+    targets = _targets(values)
+    result = find_nearest_many(data, targets)
+
+    for actual, looped, target in zip(result, _loop_find_nearest_many(data, targets), targets):
+        assert actual.equals(looped)
+        assert actual.equals(find_nearest(data, target))
+
+def test_find_nearest_many_with_nan():
+    data = pd.DataFrame({'Ed': [4.0, np.nan, 1.0, 4.0, 2.5]}, index=list('abcde'))
+    result = find_nearest_many(data, [4.0, 1.75, np.nan])
+    assert [list(r) for r in result] == [['a', 'd'], ['c', 'e'], []]
+    for actual, target in zip(result, [4.0, 1.75, np.nan]):
+        assert actual.equals(find_nearest(data, target))
+
+def test_find_nearest_many_of_an_empty_table():
+    result = find_nearest_many(pd.DataFrame({'Ed': []}), [1.0, 2.0])
+    assert [len(r) for r in result] == [0, 0]
@@ -0,0 +1,84 @@
+import os
+import json
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+import AutoPredict
+import Fleet
+from AutoPredict import REGRESSION_STORE_FILENAME, regression_store_path, use_regression_store
+from Prefetch import fleet_files
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(AutoPredict, '_REGRESSIONS', OrderedDict())
+    monkeypatch.setattr(AutoPredict, '_REGRESSION_STORE_FILE', None)
+    monkeypatch.setattr(AutoPredict, '_UNSAVED_REGRESSIONS', set())
+    monkeypatch.setattr(Fleet, '_WORKER_SESSION', None)
+
+def _jobs(tmp_path, n=3):
+    jobs = []
+    for i in range(n):
+        location = f"L{i % 2}"
+        jobs.append({
+            'building_id': str(i),
+            'location': location,
+            'table_path': f"{tmp_path}{os.sep}",
+            'hybrid_table_filename': f"HYBRID_{i}.csv",
+            'ed_table_filename': f"ED_{i}.csv",
+            'ec_min_table_filename': f"EC_MIN_{i}.csv",
+            'temperature_profile_storage_path': str(tmp_path / 'WD' / location / 'TEM'),
+            'humidity_profile_storage_path': str(tmp_path / 'WD' / location / 'HUM'),
+            'input_path': str(tmp_path),
+            'temperature_input_filename': f"Pred_{location}_Tem_hourly.csv",
+            'humidity_input_filename': f"Pred_{location}_Hum_hourly.csv"
+        })
+    return jobs
+
+def test_spawned_workers_use_the_parent_store(tmp_path):
+    use_regression_store(str(tmp_path))
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=Fleet._init_worker, initargs=(regression_store_path(),)) as executor:
+        assert executor.submit(regression_store_path).result() == str(tmp_path)
+
+def test_worker_fits_are_saved_when_the_worker_exits(tmp_path):
+    rng = np.random.default_rng(0)
+    ed = rng.uniform(3000, 8000, 30)
+    pd.DataFrame({'ED': ed, 'EC': 1.2 * ed + 300}).to_csv(tmp_path / 'HYBRID.csv', index=False)
+    use_regression_store(str(tmp_path / 'MODEL'))
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=Fleet._init_worker, initargs=(regression_store_path(),)) as executor:
+        executor.submit(AutoPredict.regression_analysis, f"{tmp_path}{os.sep}", 'HYBRID.csv', 5000.0).result()
+        assert not (tmp_path / 'MODEL' / REGRESSION_STORE_FILENAME).exists()
+
+    with open(tmp_path / 'MODEL' / REGRESSION_STORE_FILENAME, encoding='utf-8') as f:
+        assert [entry[0][0] for entry in json.load(f)['entries']] == [os.path.abspath(tmp_path / 'HYBRID.csv')]
+
+def test_worker_without_a_store_stays_in_memory():
+    Fleet._init_worker(None)
+    assert regression_store_path() is None
+    assert Fleet._WORKER_SESSION is not None
+
+def test_location_files_leave_out_building_tables(tmp_path):
+    jobs = _jobs(tmp_path)
+    tables, profile_dirs = fleet_files(jobs)
+    location_tables, location_dirs = fleet_files(jobs, building_tables=False)
+
+    assert location_dirs == profile_dirs
+    assert sorted(location_tables) == sorted(os.path.abspath(os.path.join(str(tmp_path), f"Pred_L{i}_{v}_hourly.csv"))
+                                             for i in range(2) for v in ('Tem', 'Hum'))
+    assert set(location_tables) < set(tables)
+    assert len(tables) == len(location_tables) + 2 * len(jobs)
+    assert not [path for path in tables if 'EC_MIN' in path]  # Allocation reads the profile store
+
+@pytest.mark.parametrize('max_workers, building_tables', [(1, True), (4, False)])
+def test_prefetch_scope_follows_the_executor(tmp_path, monkeypatch, max_workers, building_tables):
+    prefetched = []
+    monkeypatch.setattr(Fleet, 'prefetch_fleet', lambda jobs, session, max_in_flight, building_tables: prefetched.append(building_tables))
+    monkeypatch.setattr(Fleet, 'location_weather_indices', lambda jobs, session: {job['location']: OSError('no profiles') for job in jobs})
+
+    results, errors = Fleet.run_fleet(_jobs(tmp_path), max_workers=max_workers)
+    assert prefetched == [building_tables]
+    assert len(errors) == 3
@@ -0,0 +1,127 @@
+import os
+import json
+import pandas as pd
+import pytest
+import Registry
+from Config import create_config_file
+from Registry import (building_config, compile_registry, load_registry, read_building_ids, registry_cache_file,
+                      registry_config, registry_frame)
+
+BUILDINGS = {
+    'Building_ID': ['101', '102', '201'],
+    'Location': ['Seoul', 'Seoul', 'Busan'],
+    'Hybrid DB': ['HYBRID_101.csv', 'HYBRID_102.csv', 'HYBRID_201.csv'],
+    'ED DB': ['ED_101.csv', 'ED_102.csv', 'ED_201.csv'],
+    'EC Daily': ['EC_DAY_101.csv', 'EC_DAY_102.csv', 'EC_DAY_201.csv'],
+    'EC Minutely': ['EC_MIN_101.csv', 'EC_MIN_102.csv', 'EC_MIN_201.csv'],
+}
+
+def _touch(path):
+    # Move the modification time forward so the change is seen within the file system's resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+def _write_registry(path, buildings=BUILDINGS):
+    pd.DataFrame(buildings).to_excel(path, sheet_name='Sheet1', index=False)
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(Registry, '_REGISTRIES', {})
+    registry_file = str(tmp_path / 'building_ids.xlsx')
+    _write_registry(registry_file)
+    create_config_file(str(tmp_path / 'CONFIG.ini'))
+    create_config_file(str(tmp_path / 'CONFIG_COOLING.ini'))
+    return registry_file, str(tmp_path), str(tmp_path / 'WD')
+
+@pytest.fixture
+def compiles(monkeypatch):
+    calls = []
+    original = Registry.compile_registry
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+    monkeypatch.setattr(Registry, 'compile_registry', counting)
+    return calls
+
+def _load(sources):
+    return load_registry(*sources)
+
+def test_compiled_entries_match_building_config(sources):
+    registry_file, ini_path, wd_root = sources
+    registry = compile_registry(*sources)
+    config = registry['seasons']['default']['config']
+    building_data = read_building_ids(registry_file)
+    for building_id in BUILDINGS['Building_ID']:
+        assert registry_config(registry, config, building_id) == building_config(config, building_data, building_id, wd_root)
+    assert registry['locations'] == {'Seoul': ['101', '102'], 'Busan': ['201']}
+    pd.testing.assert_frame_equal(registry_frame(registry), building_data)
+
+def test_unchanged_sources_are_not_recompiled(sources, compiles):
+    first = _load(sources)
+    assert _load(sources) is first
+    assert len(compiles) == 1
+
+def test_new_process_reads_the_json_cache(sources, compiles, monkeypatch):
+    first = _load(sources)
+    monkeypatch.setattr(Registry, '_REGISTRIES', {})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The workbook was read again.")
+    monkeypatch.setattr(Registry, 'read_building_ids', fail)
+    assert _load(sources) == json.loads(json.dumps(first))
+    assert len(compiles) == 1
+
+def test_changed_workbook_is_recompiled(sources, compiles, monkeypatch):
+    registry_file = sources[0]
+    _load(sources)
+    buildings = {column: values + [values[-1]] for column, values in BUILDINGS.items()}
+    buildings['Building_ID'][-1], buildings['Location'][-1] = '301', 'Daegu'
+    _write_registry(registry_file, buildings)
+    _touch(registry_file)
+
+    registry = _load(sources)
+    assert len(compiles) == 2
+    assert registry['locations']['Daegu'] == ['301']
+
+    monkeypatch.setattr(Registry, '_REGISTRIES', {})
+    assert '301' in _load(sources)['buildings']  # The rewritten JSON cache is current
+    assert len(compiles) == 2
+
+def test_changed_or_added_ini_is_recompiled(sources, compiles):
+    ini_path = sources[1]
+    assert _load(sources)['seasons']['cooling']['setpoints']['target_value_of_energy_saving'] == 500
+
+    ini_file = os.path.join(ini_path, 'CONFIG_COOLING.ini')
+    with open(ini_file, encoding='utf-8') as f:
+        text = f.read()
+    with open(ini_file, 'w', encoding='utf-8') as f:
+        f.write(text.replace('target_value_of_energy_saving = 500', 'target_value_of_energy_saving = 800'))
+    _touch(ini_file)
+    assert _load(sources)['seasons']['cooling']['setpoints']['target_value_of_energy_saving'] == 800
+
+    create_config_file(os.path.join(ini_path, 'CONFIG_HEATING.ini'))
+    assert sorted(_load(sources)['seasons']) == ['cooling', 'default', 'heating']
+    assert len(compiles) == 3
+
+def test_other_weather_root_is_recompiled(sources, compiles):
+    registry_file, ini_path, _ = sources
+    _load(sources)
+    registry = load_registry(registry_file, ini_path, os.path.join(ini_path, 'OTHER_WD'))
+    assert registry['buildings']['101']['table_info']['temperature_profile_storage_path'] == os.path.join(ini_path, 'OTHER_WD', 'Seoul', 'TEM')
+    assert len(compiles) == 2
+
+@pytest.mark.parametrize('cache', ['corrupt', 'old version'])
+def test_unusable_json_cache_is_recompiled(sources, compiles, monkeypatch, cache):
+    cache_file = registry_cache_file(sources[0])
+    registry = _load(sources)
+    monkeypatch.setattr(Registry, '_REGISTRIES', {})
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        if cache == 'corrupt':
+            f.write('{"version": ')
+        else:
+            json.dump(dict(registry, version=Registry.REGISTRY_CACHE_VERSION - 1), f)
+
+    assert _load(sources)['version'] == Registry.REGISTRY_CACHE_VERSION
+    assert len(compiles) == 2
+    assert not [name for name in os.listdir(os.path.dirname(cache_file)) if name.endswith('.tmp')]
@@ -0,0 +1,132 @@
+import os
+import configparser
+import numpy as np
+import pandas as pd
+import pytest
+from collections import OrderedDict
+import AutoPredict
+import Service
+from AutoPredict import REGRESSION_STORE_FILENAME, regression_store_path
+from Config import create_config_file
+from Seasons import load_seasonal_config
+from Service import PipelineService, _path_signature
+from Session import TableSession
+from SimilarWD import load_profile_matrix
+from WDArchive import migrate_location
+
+def _day(path, seed):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({'hour': range(24), 'value': rng.uniform(0, 30, 24)}).to_csv(path, index=False, encoding='cp949')
+
+def _rewrite_in_place(path, seed):
+    # Keep the folder's own mtime, as an in-place rewrite on the share does
+    folder = os.path.dirname(path)
+    folder_stat, stat = os.stat(folder), os.stat(path)
+    _day(path, seed)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    os.utime(folder, ns=(folder_stat.st_atime_ns, folder_stat.st_mtime_ns))
+
+@pytest.fixture
+def location(tmp_path):
+    location_path = tmp_path / 'Seoul'
+    for var in ('TEM', 'HUM'):
+        (location_path / var).mkdir(parents=True)
+        for day_id in range(1, 4):
+            _day(location_path / var / f"{var.lower()}_{day_id}.csv", seed=day_id)
+    return str(location_path)
+
+def _service(session, tmp_path):
+    # A service around an existing session, without a configuration to load
+    service = object.__new__(PipelineService)
+    service.session = session
+    service.poll_interval = 0
+    service._signatures = {}
+    service._last_check = 0.0
+    service.config_file = str(tmp_path / 'CONFIG.ini')
+    service.registry_path = str(tmp_path / 'building_ids.xlsx')
+    service._config_signatures = [None, None]
+    return service
+
+def test_file_rewritten_in_place_changes_the_folder_signature(location):
+    tem = os.path.join(location, 'TEM')
+    before = _path_signature(tem)
+    _rewrite_in_place(os.path.join(tem, 'tem_2.csv'), seed=9)
+    assert _path_signature(tem) != before
+
+def test_added_and_removed_files_change_the_folder_signature(location):
+    tem = os.path.join(location, 'TEM')
+    before = _path_signature(tem)
+    _day(os.path.join(tem, 'tem_4.csv'), seed=4)
+    added = _path_signature(tem)
+    os.remove(os.path.join(tem, 'tem_4.csv'))
+    assert added != before
+    assert _path_signature(tem) == before
+
+def test_repacked_archive_changes_the_folder_signature(location):
+    tem = os.path.join(location, 'TEM')
+    before = _path_signature(tem)
+    migrate_location(location)
+    packed = _path_signature(tem)
+    assert packed != before
+
+    # Repacking with other content publishes a new meta.json while the day folder stays as is
+    meta_file = os.path.join(location, 'WD_ARCHIVE', 'meta.json')
+    stat = os.stat(meta_file)
+    os.utime(meta_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert _path_signature(tem) != packed
+
+def test_refresh_drops_profiles_of_a_rewritten_day(location, tmp_path):
+    session = TableSession()
+    service = _service(session, tmp_path)
+    tem = os.path.join(location, 'TEM')
+    load_profile_matrix(tem, '.csv', session)
+    assert service.refresh(force=True) == []
+
+    _rewrite_in_place(os.path.join(tem, 'tem_2.csv'), seed=9)
+    assert os.path.abspath(tem) in service.refresh(force=True)
+    assert ('wd_matrix', os.path.abspath(tem)) not in session.keys()
+    _, matrix, _ = load_profile_matrix(tem, '.csv', session)
+    np.testing.assert_allclose(matrix[1], pd.read_csv(os.path.join(tem, 'tem_2.csv'), encoding='cp949')['value'])
+
+def test_unchanged_files_keep_the_session(location, tmp_path):
+    session = TableSession()
+    service = _service(session, tmp_path)
+    tem = os.path.join(location, 'TEM')
+    load_profile_matrix(tem, '.csv', session)
+    service.refresh(force=True)
+    assert service.refresh(force=True) == []
+    assert ('wd_matrix', os.path.abspath(tem)) in session.keys()
+
+def test_refresh_syncs_the_archive_of_a_rewritten_day(location, tmp_path):
+    migrate_location(location)
+    session = TableSession()
+    service = _service(session, tmp_path)
+    tem = os.path.join(location, 'TEM')
+    load_profile_matrix(tem, '.csv', session)
+    service.refresh(force=True)
+
+    _rewrite_in_place(os.path.join(tem, 'tem_2.csv'), seed=9)
+    assert os.path.abspath(tem) in service.refresh(force=True)
+    _, matrix, _ = load_profile_matrix(tem, '.csv', session)
+    np.testing.assert_allclose(matrix[1], pd.read_csv(os.path.join(tem, 'tem_2.csv'), encoding='cp949')['value'])
+
+@pytest.mark.parametrize('season', [None, 'cooling'])
+def test_service_selects_the_configured_store(tmp_path, monkeypatch, season):
+    monkeypatch.setattr(AutoPredict, '_REGRESSIONS', OrderedDict())
+    monkeypatch.setattr(AutoPredict, '_REGRESSION_STORE_FILE', None)
+    monkeypatch.setattr(AutoPredict, '_UNSAVED_REGRESSIONS', set())
+    monkeypatch.setattr(Service, 'load_registry', lambda *args: {'buildings': {}})
+    config_file = tmp_path / ('CONFIG.ini' if season is None else f'CONFIG_{season.upper()}.ini')
+    create_config_file(str(config_file))
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    model_path = str(tmp_path / 'MODEL')
+    config['Modelpath']['ai_model_path'] = model_path
+    with open(config_file, 'w', encoding='utf-8') as f:
+        config.write(f)
+
+    if season is not None:
+        assert load_seasonal_config(season, str(tmp_path))['Modelpath']['ai_model_path'] == model_path
+        assert regression_store_path() is None  # Loading a configuration leaves the store alone
+    PipelineService(str(tmp_path), season=season, registry_file=str(tmp_path / 'building_ids.xlsx'))
+    assert regression_store_path() == model_path
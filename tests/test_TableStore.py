@@ -0,0 +1,85 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from TableStore import (SIDECAR_VERSION, file_signature, read_sidecar_columns, read_table, sidecar_path,
+                        write_generation, read_generation)
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / 'HYBRID.csv'
+    pd.DataFrame({'ED': [1.5, 2.25, 3.0, np.nan], 'EC': [10, 20, 30, 40], 'Tem': [1, 2, 3, 4],
+                  'name': ['a', 'b', 'c', 'd']}).to_csv(path, index=False)
+    return str(path)
+
+def _rewrite(path, df):
+    stat = os.stat(path)
+    df.to_csv(path, index=False)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))  # Filesystems with coarse timestamps
+
+def test_warm_read_matches_csv(table):
+    cold = read_table(table)
+    assert read_sidecar_columns(table) is not None
+    warm = read_table(table)
+    pd.testing.assert_frame_equal(warm, pd.read_csv(table))
+    pd.testing.assert_frame_equal(warm, cold)
+
+def test_changed_source_invalidates_sidecar(table):
+    read_table(table)
+    _rewrite(table, pd.DataFrame({'ED': [9.0], 'EC': [1], 'Tem': [7], 'name': ['z']}))
+    assert read_sidecar_columns(table) is None
+    pd.testing.assert_frame_equal(read_table(table), pd.read_csv(table))
+    assert read_sidecar_columns(table)[0]['rows'] == 1
+
+def test_rewrite_publishes_a_single_generation(table):
+    read_table(table)
+    _rewrite(table, pd.DataFrame({'ED': [9.0, 8.0], 'EC': [1, 2], 'Tem': [7, 8], 'name': ['z', 'y']}))
+    read_table(table)
+    directory = sidecar_path(table)
+    meta, generation_dir = read_generation(directory)
+    assert meta['version'] == SIDECAR_VERSION
+    assert sorted(os.listdir(directory)) == sorted(['meta.json', meta['generation']])
+    assert not [f for f in os.listdir(generation_dir) if '.tmp' in f]
+
+def test_incomplete_generation_is_not_trusted(table):
+    read_table(table)
+    meta, generation_dir = read_generation(sidecar_path(table))
+
+    # A column of another length, as a reader racing a writer without generations could see
+    np.save(os.path.join(generation_dir, 'c0.npy'), np.zeros(2))
+    assert read_sidecar_columns(table) is None
+    pd.testing.assert_frame_equal(read_table(table), pd.read_csv(table))
+
+    # A published generation that was removed under the reader
+    meta, generation_dir = read_generation(sidecar_path(table))
+    os.remove(os.path.join(generation_dir, 'c1.npy'))
+    assert read_sidecar_columns(table) is None
+    pd.testing.assert_frame_equal(read_table(table), pd.read_csv(table))
+
+def test_meta_is_published_after_the_arrays(tmp_path, monkeypatch):
+    directory = str(tmp_path / 'store')
+    write_generation(directory, 'g1', {'a': np.arange(3)}, {'rows': 3})
+
+    def failing_save(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(np, 'save', failing_save)
+    with pytest.raises(OSError):
+        write_generation(directory, 'g2', {'a': np.arange(5)}, {'rows': 5})
+
+    meta, generation_dir = read_generation(directory)
+    assert meta == {'rows': 3, 'generation': 'g1'}
+    assert np.load(os.path.join(generation_dir, 'a.npy')).tolist() == [0, 1, 2]
+
+def test_signature_tracks_size_and_mtime(table):
+    before = file_signature(table)
+    _rewrite(table, pd.read_csv(table))
+    assert file_signature(table) != before
+
+def test_concurrent_cold_reads_agree(table):
+    from concurrent.futures import ThreadPoolExecutor
+    expected = pd.read_csv(table)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        frames = list(executor.map(lambda _: read_table(table), range(32)))
+    for df in frames:
+        pd.testing.assert_frame_equal(df, expected)
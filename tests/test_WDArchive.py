@@ -0,0 +1,141 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from SimilarWD import load_profile_matrix
+import WDArchive
+from WDArchive import (ARCHIVE_DIRNAME, VARIABLES, append_days, archive_path, migrate_location, open_archive,
+                       refresh_archive, sync_archive)
+
+def _write_day(location, variable, day_id, values):
+    folder = location / variable
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / f"{variable.lower()}_n_{day_id:03d}.csv"
+    existed = path.exists()
+    stat = os.stat(path) if existed else None
+    pd.DataFrame({'hour': np.arange(len(values)), variable.lower(): values}).to_csv(path, index=False)
+    if existed:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))  # Filesystems with coarse timestamps
+
+@pytest.fixture
+def location(tmp_path):
+    location = tmp_path / 'Seoul'
+    rng = np.random.default_rng(0)
+    for day_id in range(1, 6):
+        for variable in VARIABLES:
+            _write_day(location, variable, day_id, np.round(rng.uniform(0, 30, 24), 2))
+    return location
+
+def _csv_matrix(location, variable):
+    folder = location / variable
+    files = sorted(os.listdir(folder))
+    return np.stack([pd.read_csv(folder / f).iloc[:, 1].to_numpy(dtype=np.float64) for f in files if f.endswith('.csv')])
+
+def test_archive_matches_the_day_files(location):
+    expected = {variable: load_profile_matrix(str(location / variable)) for variable in VARIABLES}
+    migrate_location(str(location))
+    for variable in VARIABLES:
+        ids, matrix, sq_norms = load_profile_matrix(str(location / variable))
+        np.testing.assert_array_equal(ids, expected[variable][0])
+        np.testing.assert_array_equal(matrix, expected[variable][1])
+        np.testing.assert_allclose(sq_norms, expected[variable][2])
+
+def test_days_added_after_migration_are_folded_in(location):
+    migrate_location(str(location))
+    for variable in VARIABLES:
+        _write_day(location, variable, 6, np.full(24, 7.0))
+
+    ids, matrix, _ = load_profile_matrix(str(location / 'TEM'))
+    assert ids.tolist() == [1, 2, 3, 4, 5, 6]
+    np.testing.assert_array_equal(matrix, _csv_matrix(location, 'TEM'))
+    assert open_archive(str(location))[2]['days'] == 6
+    assert sync_archive(str(location)) == 0
+
+def test_rewritten_day_replaces_the_archived_profile(location):
+    migrate_location(str(location))
+    _write_day(location, 'HUM', 3, np.full(24, 55.0))
+    assert sync_archive(str(location)) == 1
+    ids, matrix, _ = load_profile_matrix(str(location / 'HUM'))
+    np.testing.assert_array_equal(matrix, _csv_matrix(location, 'HUM'))
+    np.testing.assert_array_equal(load_profile_matrix(str(location / 'TEM'))[1], _csv_matrix(location, 'TEM'))
+
+def test_unpackable_day_falls_back_to_the_day_files(location):
+    migrate_location(str(location))
+    _write_day(location, 'TEM', 6, np.full(24, 7.0))  # No HUM profile for day 6 yet
+    ids, matrix, _ = load_profile_matrix(str(location / 'TEM'))
+    assert ids.tolist() == [1, 2, 3, 4, 5, 6]
+    np.testing.assert_array_equal(matrix, _csv_matrix(location, 'TEM'))
+
+def test_appended_days_survive_a_sync(location):
+    migrate_location(str(location))
+    append_days(str(location), np.full(24, 1.0), np.full(24, 2.0), day_ids=[40])
+    for variable in VARIABLES:
+        _write_day(location, variable, 6, np.full(24, 7.0))
+    assert sync_archive(str(location)) == 1
+    ids, profiles, _ = open_archive(str(location))
+    assert ids.tolist() == [1, 2, 3, 4, 5, 6, 40]
+    np.testing.assert_array_equal(profiles[-1], [np.full(24, 1.0), np.full(24, 2.0)])
+
+def test_archive_without_day_files_is_used_as_is(location):
+    migrate_location(str(location))
+    expected = load_profile_matrix(str(location / 'TEM'))[1]
+    for variable in VARIABLES:
+        for f in os.listdir(location / variable):
+            if f.endswith('.csv'):
+                os.remove(location / variable / f)
+    np.testing.assert_array_equal(load_profile_matrix(str(location / 'TEM'))[1], expected)
+
+def test_legacy_archive_is_read_and_upgraded(location):
+    directory = location / ARCHIVE_DIRNAME
+    directory.mkdir()
+    ids = np.arange(1, 6, dtype=np.int32)
+    profiles = np.stack([_csv_matrix(location, variable) for variable in VARIABLES], axis=1)
+    np.save(directory / 'ids.npy', ids)
+    np.save(directory / 'profiles.npy', profiles)
+    with open(directory / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'variables': list(VARIABLES), 'days': 5, 'hours': 24}, f)
+
+    np.testing.assert_array_equal(open_archive(str(location))[1], profiles)
+    assert sync_archive(str(location)) == 5  # No recorded signatures: every day file is read once
+    ids_after, profiles_after, meta = open_archive(str(location))
+    np.testing.assert_array_equal(profiles_after, profiles)
+    assert set(meta['sources']) == set(VARIABLES)
+
+def test_sync_publishes_one_generation(location):
+    migrate_location(str(location))
+    for variable in VARIABLES:
+        _write_day(location, variable, 6, np.full(24, 7.0))
+    sync_archive(str(location))
+    entries = os.listdir(archive_path(str(location)))
+    assert len([e for e in entries if e != 'meta.json']) == 1
+
+def test_unchanged_folders_are_not_listed(location, monkeypatch):
+    migrate_location(str(location))
+    expected = _csv_matrix(location, 'TEM')
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The day files were listed.")
+    monkeypatch.setattr(WDArchive, 'source_files', fail)
+    monkeypatch.setattr(WDArchive, 'profile_files', fail)
+    np.testing.assert_array_equal(load_profile_matrix(str(location / 'TEM'))[1], expected)
+    assert refresh_archive(str(location)) == 0
+
+def test_folder_times_are_recorded_by_a_sync(location):
+    migrate_location(str(location))
+    folder = location / 'TEM'
+    stat = os.stat(folder)
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))  # Touched without a change to the days
+    assert refresh_archive(str(location)) == 0
+    assert open_archive(str(location))[2]['folders'] == WDArchive.folder_signatures(str(location))
+
+def test_rewrite_in_place_waits_for_an_explicit_sync(location):
+    migrate_location(str(location))
+    before = _csv_matrix(location, 'HUM')
+    folder_stat = os.stat(location / 'HUM')
+    _write_day(location, 'HUM', 3, np.full(24, 55.0))
+    os.utime(location / 'HUM', ns=(folder_stat.st_atime_ns, folder_stat.st_mtime_ns))
+
+    np.testing.assert_array_equal(load_profile_matrix(str(location / 'HUM'))[1], before)
+    assert sync_archive(str(location)) == 1
+    np.testing.assert_array_equal(load_profile_matrix(str(location / 'HUM'))[1], _csv_matrix(location, 'HUM'))